@@ -1,27 +1,281 @@
-from flask import Flask, render_template, request, jsonify
-from game_logic import process_command
+import os
+import json
+import time
+from flask import Flask, Response, render_template, request, jsonify
+import game_logic
+import tracing
+from game_logic import GameState, start_game_state, capture_output, print_slow, command_verb
+from content_compiler import Content, compile_builtin, read_bundle
+from content_pack import load_pack
+from journal import CommandJournal
+from metrics import Metrics, merge, render
+from quests import QUESTS
+from savegame import SaveError
+from sessions import Session, SessionStore
+from shards import ShardRouter, pack_session, unpack_session, session_id_for
+from world_overlay import WorldOverlay
+
+try:
+    from flask_sock import Sock
+except ImportError:  # WebSockets are optional; clients fall back to POST /command
+    Sock = None
 
 app = Flask(__name__)
 
-# Inisialisasi game_state dengan current_location
-game_state = {"current_location": "start"}  
-world = {"start": {"description": "You are in a dark room."}}  # Tambahkan lokasi awal
-items = {}
-npcs = {}
-enemies_dict = {}
+SESSION_COOKIE = "aq_session"
+
+# Content that never changes is shared by every session. With a content
+# pack the world is paged in from disk as players reach it and the built-in
+# quests are played, since packs carry no quests; otherwise the content is
+# compiled, so a broken reference stops the server at startup.
+if os.environ.get("GAME_CONTENT_PACK"):
+    base_world, items, npcs, enemies_dict = load_pack(
+        os.environ["GAME_CONTENT_PACK"],
+        max_regions=int(os.environ.get("GAME_MAX_REGIONS", 64))
+    )
+else:
+    if os.environ.get("GAME_CONTENT_BUNDLE"):
+        content = read_bundle(os.environ["GAME_CONTENT_BUNDLE"])
+    else:
+        content = Content(compile_builtin())
+    base_world = content.world
+    items = content.items
+    npcs = content.npcs
+    enemies_dict = content.enemies
+    QUESTS.reset(content.quests)
+
+# Every accepted command is journaled so sessions survive a worker restart
+journal = CommandJournal(
+    os.environ.get("GAME_JOURNAL_DIR", "journal"),
+    snapshot_every=int(os.environ.get("GAME_SNAPSHOT_EVERY", 100))
+)
+
+# Counters and latency histograms served at /metrics. Each worker process
+# keeps its own; the front process merges them.
+metrics = Metrics()
+
+# Span tracing is off unless GAME_TRACE names a file to write traces to
+if os.environ.get("GAME_TRACE"):
+    tracing.enable(
+        os.environ["GAME_TRACE"],
+        sample_rate=float(os.environ.get("GAME_TRACE_SAMPLE", 0.01)),
+        min_duration_ms=float(os.environ.get("GAME_TRACE_SLOW_MS", 0))
+    )
+
+# Looked up on the module each time, so tracing can wrap it
+def run_command(command, game_state, world):
+    return game_logic.play_command(command, game_state, world, items, npcs, enemies_dict)
+
+# Every new game starts in the same state, so its journal snapshot is
+# encoded once here instead of for each session
+journal.set_new_game(start_game_state(), WorldOverlay(base_world))
+
+# Every player gets their own GameState and an overlay holding their world
+# changes; the content they play is shared by reference
+def create_session(session_id):
+    session = Session(session_id, start_game_state(), WorldOverlay(base_world))
+    journal.start(session)
+    return session
+
+# Rebuild a session we don't hold (after a restart or eviction) from its journal
+def restore_session(session_id):
+    session = Session(session_id, GameState(), WorldOverlay(base_world))
+    try:
+        if journal.load(session, run_command):
+            return session
+    except (ValueError, KeyError, SaveError):
+        app.logger.exception("Could not restore session %s", session_id)
+    return None
+
+def make_store(new_id=None):
+    return SessionStore(
+        create_session,
+        max_sessions=int(os.environ.get("GAME_MAX_SESSIONS", 5000)),
+        ttl=int(os.environ.get("GAME_SESSION_TTL", 30 * 60)),
+        loader=restore_session,
+        new_id=new_id
+    )
+
+sessions = make_store()
+
+# With GAME_WORKERS set, sessions live in that many worker processes and
+# this process only routes requests to them
+router = None
+
+# The session token comes from the cookie, or from a header for clients that
+# can't rely on cookies (non-browser clients, the page's POST fallback)
+def session_token():
+    return request.cookies.get(SESSION_COOKIE) or request.headers.get("X-Session-Token")
+
+# Run one player command. Returns (output lines, session id, created), each
+# line a (text, delay) pair with the typewriter delay it was written with.
+# This is where a session's state changes, whichever process holds it.
+# Commands on one session run one at a time under its lock; a session that
+# was ended or handed off while we waited is looked up again.
+def handle_command(token, user_input):
+    while True:
+        session, created = sessions.get_or_create(token)
+        with session.lock:
+            if sessions.peek(session.session_id) is session:
+                return run_session_command(session, created, user_input)
+
+# The body of handle_command, with the session's lock held
+def run_session_command(session, created, user_input):
+    game_state = session.game_state
+    seed = journal.new_seed()
+    game_state.rng_seed = seed
+
+    verb = command_verb(user_input, game_state) or "unknown"
+    combat = game_state.combat
+    mutations = session.world.mutations
+    started = time.perf_counter_ns()
+
+    # Collect the engine's output instead of typing it out on the server
+    with capture_output() as output:
+        try:
+            result = run_command(user_input, game_state, session.world)
+        except Exception:
+            metrics.command(verb, time.perf_counter_ns() - started)
+            metrics.error(verb)
+            raise
+        # A turn ends the fight or moves its turn counter on
+        turns = 0
+        if combat is not None:
+            turns = 1 if game_state.combat is None else game_state.combat.turn - combat.turn
+        metrics.command(verb, time.perf_counter_ns() - started, combat_turns=turns,
+                        world_mutations=session.world.mutations - mutations)
+        if result == "quit":
+            print_slow("Thank you for playing Adventure Quest!")
+        elif game_state.player['health'] <= 0:
+            print_slow("You have been defeated! Game Over!")
+
+    if result == "quit" or game_state.player['health'] <= 0:
+        sessions.discard(session.session_id)
+        journal.discard(session.session_id)
+    else:
+        journal.append(session, user_input, seed)
+    return output.lines, session.session_id, created
+
+# Give up a session for another worker to take over; None if we don't hold
+# it. Taken under its lock so no command is half-run when it leaves, and
+# marked as handed off so this worker won't restore it from its journal.
+def export_session(session_id):
+    session = sessions.peek(session_id)
+    if session is None:
+        return None
+    with session.lock:
+        if sessions.peek(session_id) is not session:
+            return None
+        data = pack_session(session)
+        sessions.hand_off(session_id)
+        return data
+
+def import_session(data):
+    session = unpack_session(data, GameState(), WorldOverlay(base_world))
+    journal.snapshot(session)
+    sessions.add(session)
+
+# Runs in each worker process: a store of its own, minting ids that hash to it
+def worker_setup(index, count):
+    global sessions
+    sessions = make_store(lambda: session_id_for(index, count))
+    return {
+        "command": handle_command,
+        "export": export_session,
+        "import": import_session,
+        "clear_handoff": sessions.clear_handoff,
+        "sessions": lambda session_id=None: sessions.session_ids(),
+        "stats": lambda session_id=None: sessions.stats(),
+        "metrics": lambda session_id=None: metrics.snapshot(len(sessions))
+    }
 
 @app.route('/')
 def home():
     return render_template("index.html")
 
+# Run a command in whichever process holds the session
+def dispatch(token, user_input):
+    if router is not None:
+        return router.call(token, "command", user_input)
+    return handle_command(token, user_input)
+
+# Output as server-sent events: a "line" event per line with its delay in
+# seconds per character, then "done" with the session id and whether it is
+# a new session. The command has already run, so the whole stream is written
+# at once and the client does the pacing.
+def event_stream(lines, session_id, created):
+    events = [f"event: line\ndata: {json.dumps({'text': text, 'delay': delay})}\n\n" for text, delay in lines]
+    events.append(f"event: done\ndata: {json.dumps({'session': session_id, 'created': created})}\n\n")
+    return "".join(events)
+
+def wants_stream(data):
+    return bool(data.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
+
 @app.route('/command', methods=['POST'])
 def command():
     data = request.json
     user_input = data.get("command", "")
-    
-    response = process_command(user_input, game_state, world, items, npcs, enemies_dict)
-    
-    return jsonify({"response": response})
+
+    lines, session_id, created = dispatch(session_token(), user_input)
+    started = time.perf_counter_ns()
+    if wants_stream(data):
+        resp = Response(event_stream(lines, session_id, created), mimetype="text/event-stream")
+        resp.headers["Cache-Control"] = "no-cache"
+        metrics.response("stream", time.perf_counter_ns() - started)
+    else:
+        resp = jsonify({"response": "\n".join(text for text, delay in lines), "session": session_id})
+        metrics.response("json", time.perf_counter_ns() - started)
+    if created:
+        resp.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="Lax")
+    return resp
+
+# A long-lived channel carrying commands one way and structured events the
+# other, so a command doesn't pay for a new HTTP request. The client may
+# first send {"session": token} with the token it stored, then sends
+# {"command": ...}; each answer is {"type": "output", "lines": [[text,
+# delay], ...], "session": id, "created": bool}, or {"type": "error",
+# "message": ...}.
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/ws')
+    def channel(ws):
+        token = session_token()
+        while True:
+            try:
+                message = json.loads(ws.receive())
+                if "session" in message and "command" not in message:
+                    token = message["session"] or token
+                    continue
+                user_input = str(message.get("command", ""))
+            except (ValueError, AttributeError, TypeError):
+                ws.send(json.dumps({"type": "error", "message": "Expected {\"command\": ...}"}))
+                continue
+            lines, token, created = dispatch(token, user_input)
+            started = time.perf_counter_ns()
+            frame = json.dumps({"type": "output", "lines": lines, "session": token, "created": created})
+            metrics.response("websocket", time.perf_counter_ns() - started)
+            ws.send(frame)
+
+@app.route('/stats')
+def stats():
+    if router is not None:
+        return jsonify(router.stats())
+    return jsonify(sessions.stats())
+
+@app.route('/metrics')
+def metrics_page():
+    if router is not None:
+        snapshot = merge([metrics.snapshot()] + [worker.call("metrics") for worker in router.workers])
+    else:
+        snapshot = metrics.snapshot(len(sessions))
+    return Response(render(snapshot), mimetype="text/plain; version=0.0.4")
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    workers = int(os.environ.get("GAME_WORKERS", 0))
+    if workers > 1:
+        router = ShardRouter(worker_setup, workers)
+        # The reloader would start a second set of workers
+        app.run(debug=True, use_reloader=False, threaded=True)
+    else:
+        app.run(debug=True)
@@ -0,0 +1,242 @@
+import argparse
+import http.client
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+from game_logic import create_game_world, create_game_items
+
+# Load generator: scripted players hammering a running server's /command.
+# Each bot keeps its own session and connection and plays with a weighted
+# random policy: it walks the world graph, picks up items, equips gear,
+# drinks potions when hurt and fights what it finds. Concurrency follows a
+# ramp profile of stages; each stage reports sustained commands/sec,
+# p50/p95/p99 latency and error rate, so the knee where throughput stops
+# growing shows where a server configuration saturates.
+#
+# Bots run as threads in one process, so a fast server can outrun them;
+# run the generator from another machine, or several of them, to be sure
+# it is the server that saturates.
+
+# What a bot does outside a fight, by weight
+POLICY = {"go": 40, "look": 10, "take": 15, "inventory": 5, "equip": 5, "use": 5, "attack": 20}
+# Combat actions by weight: attack, special, defend, potion, flee
+COMBAT_POLICY = {"1": 55, "2": 25, "3": 10, "4": 5, "5": 5}
+
+LOCATION = re.compile(r"Location: (\w+)")
+HEALTH = re.compile(r"Health:? (\d+)/(\d+)")
+
+# Latencies and errors of one stage, shared by every bot
+class StageStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.latencies.append(seconds)
+            if not ok:
+                self.errors += 1
+
+class Bot:
+    def __init__(self, runner, rng):
+        self.runner = runner
+        self.rng = rng
+        self.stop = threading.Event()
+        self.conn = None
+        self.session = None
+        self.location = "village"
+        self.in_combat = False
+        self.health = 100
+        self.max_health = 100
+        self.carried = set()
+
+    def connect(self):
+        runner = self.runner
+        self.conn = http.client.HTTPConnection(runner.host, runner.port, timeout=runner.timeout)
+
+    # Send one command; returns the response text, or None on an error
+    def send(self, command):
+        headers = {"Content-Type": "application/json"}
+        if self.session:
+            headers["X-Session-Token"] = self.session
+        started = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.connect()
+            self.conn.request("POST", "/command", json.dumps({"command": command}), headers)
+            response = self.conn.getresponse()
+            body = response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            self.conn = None
+            ok = False
+        self.runner.stats.record(time.perf_counter() - started, ok)
+        if not ok:
+            return None
+        data = json.loads(body)
+        if data["session"] != self.session:
+            # New session (first command, or the last one died): start over
+            self.session = data["session"]
+            self.location = "village"
+            self.carried = set()
+            self.in_combat = False
+        return data["response"]
+
+    # Keep a rough idea of where the bot is from what the server said
+    def observe(self, text):
+        match = LOCATION.search(text)
+        if match:
+            self.location = match.group(1)
+        health = HEALTH.findall(text)
+        if health:
+            self.health, self.max_health = (int(value) for value in health[-1])
+        self.in_combat = "5. Flee" in text
+
+    def next_command(self):
+        rng = self.rng
+        if self.in_combat:
+            if self.health < self.max_health // 3 and "health_potion" in self.carried:
+                return "4"
+            return rng.choices(list(COMBAT_POLICY), weights=list(COMBAT_POLICY.values()))[0]
+        location = self.runner.world.get(self.location)
+        if location is None:
+            return "look"
+        action = rng.choices(list(POLICY), weights=list(POLICY.values()))[0]
+        if action == "go" and location["connections"]:
+            return "go " + rng.choice(location["connections"])
+        if action == "take" and location["items"]:
+            item_id = rng.choice(location["items"])
+            self.carried.add(item_id)
+            return "take " + item_id.replace("_", " ")
+        if action == "equip":
+            gear = [item_id for item_id in self.carried if self.runner.items[item_id].item_type in ("weapon", "armor")]
+            if gear:
+                return "equip " + rng.choice(gear).replace("_", " ")
+        if action == "use" and self.health < self.max_health:
+            return "use health potion"
+        if action == "attack" and location["enemies"]:
+            return "attack " + rng.choice(location["enemies"])
+        if action == "inventory":
+            return "inventory"
+        return "look"
+
+    def run(self):
+        while not self.stop.is_set() and not self.runner.done.is_set():
+            text = self.send(self.next_command())
+            if text is not None:
+                self.observe(text)
+            elif self.runner.think_time == 0:
+                time.sleep(0.01)  # don't spin on a server that is down
+            if self.runner.think_time:
+                time.sleep(self.rng.expovariate(1 / self.runner.think_time))
+
+class LoadRunner:
+    def __init__(self, url, seed=1, timeout=10.0, think_time=0.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.think_time = think_time  # mean seconds a bot waits between commands
+        self.world = create_game_world()  # the built-in world the server plays
+        self.items = create_game_items()
+        self.rng = random.Random(seed)
+        self.stats = StageStats()
+        self.done = threading.Event()
+        self.bots = []
+
+    # Run the stages in order: (concurrency, seconds) pairs. Bots carry over
+    # from one stage to the next, keeping their sessions.
+    def run(self, stages, report=None):
+        results = []
+        for concurrency, seconds in stages:
+            while len(self.bots) < concurrency:
+                bot = Bot(self, random.Random(self.rng.getrandbits(64)))
+                thread = threading.Thread(target=bot.run, daemon=True)
+                self.bots.append((bot, thread))
+                thread.start()
+            while len(self.bots) > concurrency:
+                bot, thread = self.bots.pop()
+                bot.stop.set()
+            self.stats = StageStats()
+            started = time.perf_counter()
+            time.sleep(seconds)
+            stats = self.stats
+            result = summarize(concurrency, time.perf_counter() - started, stats)
+            results.append(result)
+            if report is not None:
+                report(result)
+        self.done.set()
+        for bot, thread in self.bots:
+            thread.join(timeout=self.timeout)
+        return results
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else None
+
+def summarize(concurrency, seconds, stats):
+    latencies = list(stats.latencies)
+    count = len(latencies)
+    ms = lambda value: value * 1000 if value is not None else None
+    return {
+        "concurrency": concurrency,
+        "seconds": seconds,
+        "commands": count,
+        "commands_per_sec": count / seconds,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "error_rate": stats.errors / count if count else 0.0
+    }
+
+# The first stage where adding bots no longer bought at least `gain` more
+# throughput, or None if throughput kept growing
+def find_knee(results, gain=0.10):
+    for previous, result in zip(results, results[1:]):
+        if result["concurrency"] > previous["concurrency"] and \
+                result["commands_per_sec"] < previous["commands_per_sec"] * (1 + gain):
+            return result["concurrency"]
+    return None
+
+# "1:10,4:10,16:10" -> [(1, 10.0), (4, 10.0), (16, 10.0)]
+def parse_profile(profile):
+    stages = []
+    for stage in profile.split(","):
+        concurrency, seconds = stage.split(":")
+        stages.append((int(concurrency), float(seconds)))
+    return stages
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive a running server with scripted players")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="server to load")
+    parser.add_argument("--profile", default="1:10,2:10,4:10,8:10,16:10,32:10",
+                        help="ramp stages as concurrency:seconds, comma-separated")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between a bot's commands")
+    parser.add_argument("--timeout", type=float, default=10.0, help="request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    def report(r):
+        if not args.json:
+            p = lambda value: f"{value:8.1f}" if value is not None else "     n/a"
+            print(f"{r['concurrency']:>5} bots: {r['commands_per_sec']:9.1f} cmds/s   p50 {p(r['p50_ms'])}ms"
+                  f"   p95 {p(r['p95_ms'])}ms   p99 {p(r['p99_ms'])}ms   errors {r['error_rate']:.2%}")
+
+    runner = LoadRunner(args.url, args.seed, args.timeout, args.think_time)
+    results = runner.run(parse_profile(args.profile), report)
+    knee = find_knee(results)
+    if args.json:
+        print(json.dumps({"url": args.url, "profile": args.profile, "think_time": args.think_time,
+                          "stages": results, "knee_concurrency": knee}, indent=2))
+    elif knee is not None:
+        print(f"Throughput stopped growing at {knee} bots")
+    else:
+        print("Throughput was still growing at the last stage")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import gc
+import json
+import tracemalloc
+import combat_engine
+from game_logic import start_game_state, create_game_world, create_game_items, create_game_enemies
+from sessions import Session
+from world_overlay import FrozenWorld, WorldOverlay
+
+# Heap cost of the objects the server keeps per player: a fresh session
+# (GameState plus an empty WorldOverlay) and an active fight (CombatState).
+# Allocations are traced while `count` of them are built and kept alive,
+# and the total is divided by count.
+
+def traced_bytes_per(build, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(n) for n in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure heap bytes per session and per active combat")
+    parser.add_argument("--count", type=int, default=10000, help="objects built per measurement")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    base_world = FrozenWorld(create_game_world())
+    items = create_game_items()
+    enemies = create_game_enemies()
+    player = start_game_state("Bench").player
+
+    results = {
+        "count": args.count,
+        "session_bytes": traced_bytes_per(
+            lambda n: Session(str(n), start_game_state("Bench"), WorldOverlay(base_world)), args.count),
+        "game_state_bytes": traced_bytes_per(lambda n: start_game_state("Bench"), args.count),
+        "combat_bytes": traced_bytes_per(
+            lambda n: combat_engine.new_combat(player, "wolf", enemies["wolf"], items), args.count)
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"session (GameState + overlay): {results['session_bytes']:8.0f} bytes")
+    print(f"GameState alone:               {results['game_state_bytes']:8.0f} bytes")
+    print(f"active combat (CombatState):   {results['combat_bytes']:8.0f} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import gc
+import json
+import os
+import random
+import time
+from content_compiler import compile_content
+from game_logic import (play_command, start_game_state, capture_output, NullSink, create_game_items,
+                        create_game_npcs, create_game_enemies, create_game_quests)
+from routing import route_graph
+from world_overlay import FrozenWorld, WorldOverlay
+from worldgen import generate_world
+
+# How build time, memory and command latency grow with the size of the world.
+# For each size: generate a world, freeze it, compile-check it and build its
+# route graph, then time each verb through play_command the way the server
+# runs it, with output thrown away.
+
+# Resident memory of this process in bytes, or None where /proc isn't available
+def resident_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+# Time one command; returns microseconds
+def timed(command, game_state, world, items, npcs, enemies):
+    started = time.perf_counter_ns()
+    play_command(command, game_state, world, items, npcs, enemies)
+    return (time.perf_counter_ns() - started) / 1000
+
+# Per-verb latency samples, in microseconds, on one world
+def measure_verbs(base_world, items, npcs, enemies, repeat, rng):
+    ids = list(base_world)
+    with_items = [location_id for location_id in ids if base_world[location_id]["items"]]
+    with_enemies = [location_id for location_id in ids if base_world[location_id]["enemies"]]
+    samples = {verb: [] for verb in ("look", "go", "travel", "take", "inventory", "attack", "combat turn")}
+
+    game_state = start_game_state("Bench")
+    world = WorldOverlay(base_world)
+    for item_id, item in items.items():
+        if item.item_type == "key_item":
+            game_state.player['inventory'].add(item_id)
+    game_state.visited_locations.update(rng.sample(ids, min(len(ids), 50)))
+    with capture_output(NullSink()):
+        for _ in range(repeat):
+            samples["look"].append(timed("look", game_state, world, items, npcs, enemies))
+
+            connections = world[game_state.current_location]["connections"]
+            if connections:
+                target = connections[rng.randrange(len(connections))]
+                samples["go"].append(timed(f"go {target}", game_state, world, items, npcs, enemies))
+
+            destination = rng.choice(sorted(game_state.visited_locations))
+            samples["travel"].append(timed(f"travel {destination}", game_state, world, items, npcs, enemies))
+
+            if with_items:
+                game_state.current_location = rng.choice(with_items)
+                if world[game_state.current_location]["items"]:
+                    samples["take"].append(timed("take", game_state, world, items, npcs, enemies))
+
+            samples["inventory"].append(timed("inventory", game_state, world, items, npcs, enemies))
+
+            if with_enemies:
+                game_state.current_location = rng.choice(with_enemies)
+                if world[game_state.current_location]["enemies"]:
+                    game_state.player['health'] = game_state.player['max_health'] = 10 ** 9
+                    samples["attack"].append(timed("attack", game_state, world, items, npcs, enemies))
+                    while game_state.combat is not None:
+                        samples["combat turn"].append(timed("1", game_state, world, items, npcs, enemies))
+    return samples
+
+def run_size(size, seed, branching, gate_density, repeat):
+    items = create_game_items()
+    npcs = create_game_npcs()
+    enemies = create_game_enemies()
+    gc.collect()
+    memory_before = resident_bytes()
+
+    started = time.perf_counter()
+    world = generate_world(size, seed, branching, gate_density)
+    generate_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    compile_content(world, items, npcs, enemies, create_game_quests())
+    compile_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    base_world = FrozenWorld(world)
+    freeze_seconds = time.perf_counter() - started
+    del world
+
+    started = time.perf_counter()
+    route_graph(base_world)
+    routes_seconds = time.perf_counter() - started
+
+    gc.collect()
+    memory_after = resident_bytes()
+    samples = measure_verbs(base_world, items, npcs, enemies, repeat, random.Random(seed))
+
+    result = {
+        "locations": size,
+        "generate_seconds": generate_seconds,
+        "compile_seconds": compile_seconds,
+        "freeze_seconds": freeze_seconds,
+        "route_graph_seconds": routes_seconds,
+        "memory_bytes": memory_after - memory_before if memory_before is not None else None,
+        "verbs": {}
+    }
+    for verb, values in samples.items():
+        if values:
+            result["verbs"][verb] = {"count": len(values), "p50_us": percentile(values, 0.5),
+                                     "p99_us": percentile(values, 0.99)}
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how the engine scales with world size")
+    parser.add_argument("--sizes", default="100,1000,10000,100000",
+                        help="comma-separated world sizes, e.g. 100,1e4,1e6")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--branching", type=float, default=3.0)
+    parser.add_argument("--gate-density", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=200, help="commands timed per verb")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes.split(","):
+        results.append(run_size(int(float(size)), args.seed, args.branching, args.gate_density, args.repeat))
+        if not args.json:
+            r = results[-1]
+            memory = f"{r['memory_bytes'] / 2 ** 20:.1f}MB" if r["memory_bytes"] is not None else "n/a"
+            print(f"{r['locations']:>9} locations: generate {r['generate_seconds']:.2f}s, "
+                  f"compile {r['compile_seconds']:.2f}s, freeze {r['freeze_seconds']:.2f}s, "
+                  f"routes {r['route_graph_seconds']:.2f}s, memory {memory}")
+            for verb, stats in r["verbs"].items():
+                print(f"    {verb:<12} p50 {stats['p50_us']:>9.1f}us   p99 {stats['p99_us']:>9.1f}us")
+
+    if args.json:
+        print(json.dumps({"seed": args.seed, "branching": args.branching,
+                          "gate_density": args.gate_density, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import combat_engine
+from game_logic import (GameState, start_game_state, process_command, handle_enemy_defeat, capture_output, NullSink,
+                        create_game_world, create_game_items, create_game_npcs, create_game_enemies,
+                        create_game_quests)
+from sessions import Session
+from world_overlay import FrozenWorld, WorldOverlay
+
+# Benchmarks for the engine's hot paths, run through the entry points the
+# game itself uses. Each benchmark builds fresh state in an untimed setup,
+# then times one operation on it, so commands that change the world (take,
+# attack) measure the same work every time. Results are ops/sec, p50/p99
+# latency of single operations, speed relative to a reference loop and what
+# one operation allocates; --save stores them as a baseline and --compare fails when a
+# later run is slower or allocates more.
+
+class Benchmark:
+    def __init__(self, name, setup, run):
+        self.name = name
+        self.setup = setup  # () -> state for one run, not timed
+        self.run = run  # (state) -> None, timed
+
+# The engine benchmarks, on the built-in content
+def engine_benchmarks():
+    base_world = FrozenWorld(create_game_world())
+    items = create_game_items()
+    npcs = create_game_npcs()
+    enemies = create_game_enemies()
+
+    # A fresh player and world at a location, with seeded combat randomness
+    def player_at(location_id, *inventory):
+        game_state = start_game_state("Bench")
+        game_state.current_location = location_id
+        game_state.visited_locations.add(location_id)
+        game_state.rng = random.Random(1)
+        for item_id in inventory:
+            game_state.player['inventory'].add(item_id)
+        return game_state, WorldOverlay(base_world)
+
+    def command(verb, location_id, text, *inventory, hurt=False):
+        def setup():
+            game_state, world = player_at(location_id, *inventory)
+            if hurt:
+                game_state.player['health'] = 40
+            return game_state, world
+        return Benchmark(f"command {verb}", setup,
+                         lambda state: process_command(text, state[0], state[1], items, npcs, enemies))
+
+    # A fight against the wolf that has just started
+    def in_combat():
+        game_state, world = player_at("forest_path")
+        game_state.combat = combat_engine.new_combat(game_state.player, "wolf", enemies["wolf"], items)
+        return game_state, world
+
+    def call(function):
+        return lambda state: function()
+
+    benchmarks = [
+        command("go", "village", "go forest"),
+        command("look", "village", "look"),
+        command("take", "blacksmith", "take iron sword"),
+        command("inventory", "village", "inventory", "iron_sword", "leather_armor", "health_potion"),
+        command("equip", "village", "equip iron sword", "iron_sword"),
+        command("use", "village", "use health potion", hurt=True),
+        command("talk", "village", "talk village elder"),
+        command("attack", "forest_path", "attack wolf"),
+        Benchmark("combat turn (command)", in_combat,
+                  lambda state: process_command("1", state[0], state[1], items, npcs, enemies)),
+        Benchmark("combat turn (engine)", lambda: (in_combat()[0].combat, random.Random(1)),
+                  lambda state: combat_engine.step(state[0], combat_engine.ATTACK, state[1])),
+        Benchmark("handle_enemy_defeat", lambda: player_at("forest_path"),
+                  lambda state: handle_enemy_defeat(state[0], enemies["wolf"], state[1], "wolf", items)),
+        Benchmark("session create", lambda: None,
+                  lambda state: Session("bench", start_game_state("Bench"), WorldOverlay(base_world))),
+        Benchmark("GameState()", lambda: None, call(GameState))
+    ]
+    for factory in (create_game_world, create_game_items, create_game_npcs, create_game_enemies,
+                    create_game_quests):
+        benchmarks.append(Benchmark(f"{factory.__name__}()", lambda: None, call(factory)))
+    return benchmarks
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+# How many runs to time as one sample: the smallest of 1, 2, 5, 10, 20, ...
+# whose batch takes at least target_ns, as timeit's autorange picks it.
+# Timing a batch instead of a single microsecond call keeps clock
+# resolution and timer overhead out of the result.
+def batch_size(benchmark, target_ns):
+    number = 1
+    while True:
+        for multiple in (1, 2, 5):
+            n = number * multiple
+            if time_batch(benchmark, n) >= target_ns or n >= 1000000:
+                return n
+        number *= 10
+
+# Nanoseconds taken by n runs, each on its own state. The states are all
+# set up before the clock starts, and the collector is paused while it
+# runs, as timeit does.
+def time_batch(benchmark, n):
+    states = [benchmark.setup() for _ in range(n)]
+    run = benchmark.run
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter_ns()
+        for state in states:
+            run(state)
+        return time.perf_counter_ns() - started
+    finally:
+        gc.enable()
+
+# Nanoseconds that two back-to-back perf_counter_ns reads take, the median
+# of many tries. Single-operation timings have this taken off.
+def timer_overhead_ns(tries=10001):
+    clock = time.perf_counter_ns
+    gaps = []
+    for _ in range(tries):
+        started = clock()
+        gaps.append(clock() - started)
+    return percentile(gaps, 0.5)
+
+# Microseconds taken by one run on a fresh state, less the timer overhead,
+# with the collector paused as for a batch
+def time_single(benchmark, overhead_ns):
+    state = benchmark.setup()
+    run = benchmark.run
+    gc.disable()
+    try:
+        started = time.perf_counter_ns()
+        run(state)
+        elapsed = time.perf_counter_ns() - started
+    finally:
+        gc.enable()
+    return max(0, elapsed - overhead_ns) / 1000
+
+# A fixed piece of plain Python, timed around every round of every
+# benchmark. On a machine whose speed drifts (shared or throttled CPUs) the
+# drift hits both alike, so their ratio holds still where raw times don't.
+def _reference_loop():
+    total = 0
+    for n in range(1000):
+        total += n
+    return total
+
+REFERENCE = Benchmark("reference loop", lambda: None, lambda state: _reference_loop())
+
+# Time and trace benchmarks. Each batch sample is the mean over a batch of
+# runs sized by batch_size, taken twice so a stall while sizing doesn't
+# leave a tiny batch. Samples come in rounds, and rounds of different
+# benchmarks are interleaved, so each benchmark's rounds are spread over the
+# whole run. Every round also times single runs, one per clock reading.
+# - batch_mean_us is the lowest round median of batch means, the steadiest
+#   figure for the cost of one run; ops_per_sec is derived from it.
+# - p50_us and p99_us are percentiles of the single runs, less the timer
+#   overhead, so they include the jitter a caller sees. Runs much shorter
+#   than the timer's resolution read as coarse steps.
+# - "relative" is the median over rounds of the round's batch median
+#   divided by the reference loop's time around it; it is what --compare
+#   gates on.
+# The allocation figures come from separate single runs under tracemalloc: the
+# median over those runs of the peak bytes in use above the starting point
+# and of the memory blocks still held afterwards.
+def measure(benchmarks, samples, single_samples, warmup, alloc_samples, rounds=10, target_ns=2000000):
+    overhead_ns = timer_overhead_ns()
+    numbers = []
+    for benchmark in benchmarks:
+        for _ in range(warmup):
+            benchmark.run(benchmark.setup())
+        numbers.append(max(batch_size(benchmark, target_ns), batch_size(benchmark, target_ns)))
+    reference_number = max(batch_size(REFERENCE, target_ns), batch_size(REFERENCE, target_ns))
+
+    def reference():
+        return time_batch(REFERENCE, reference_number) / reference_number / 1000
+
+    timings = [[] for _ in benchmarks]
+    singles = [[] for _ in benchmarks]
+    medians = [[] for _ in benchmarks]
+    ratios = [[] for _ in benchmarks]
+    for _ in range(rounds):
+        for n, (benchmark, number) in enumerate(zip(benchmarks, numbers)):
+            before = reference()
+            round_timings = [time_batch(benchmark, number) / number / 1000
+                             for _ in range(max(1, samples // rounds))]
+            after = reference()
+            median = percentile(round_timings, 0.5)
+            medians[n].append(median)
+            ratios[n].append(median / ((before + after) / 2))
+            timings[n].extend(round_timings)
+            singles[n].extend(time_single(benchmark, overhead_ns) for _ in range(max(1, single_samples // rounds)))
+
+    results = {}
+    for n, benchmark in enumerate(benchmarks):
+        peaks = []
+        blocks = []
+        tracemalloc.start()
+        for _ in range(alloc_samples):
+            state = benchmark.setup()
+            gc.collect()
+            tracemalloc.reset_peak()
+            before_bytes = tracemalloc.get_traced_memory()[0]
+            before_blocks = sys.getallocatedblocks()
+            benchmark.run(state)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before_bytes)
+            blocks.append(sys.getallocatedblocks() - before_blocks)
+            del state
+        tracemalloc.stop()
+
+        batch_mean = min(medians[n])
+        results[benchmark.name] = {
+            "samples": len(timings[n]),
+            "batch": numbers[n],
+            "single_samples": len(singles[n]),
+            "ops_per_sec": 1e6 / batch_mean if batch_mean else None,
+            "batch_mean_us": batch_mean,
+            "p50_us": percentile(singles[n], 0.5),
+            "p99_us": percentile(singles[n], 0.99),
+            "relative": percentile(ratios[n], 0.5),
+            "alloc_peak_bytes": percentile(peaks, 0.5),
+            "alloc_blocks": percentile(blocks, 0.5)
+        }
+    return results, overhead_ns
+
+# Benchmarks that got worse than the baseline: slower relative to the
+# reference loop by more than threshold, or allocating more by more than threshold (plus a
+# little slack for allocator noise). Returns (name, what, baseline, now) tuples.
+def regressions(results, baseline, threshold):
+    found = []
+    for name, now in results["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        if now["relative"] > before["relative"] * (1 + threshold):
+            found.append((name, "relative", before["relative"], now["relative"]))
+        if now["alloc_peak_bytes"] > before["alloc_peak_bytes"] * (1 + threshold) + 64:
+            found.append((name, "alloc_peak_bytes", before["alloc_peak_bytes"], now["alloc_peak_bytes"]))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the engine's hot paths")
+    parser.add_argument("--samples", type=int, default=50, help="timed batches of runs per benchmark")
+    parser.add_argument("--single-samples", type=int, default=1000, help="single runs timed per benchmark")
+    parser.add_argument("--warmup", type=int, default=200, help="untimed runs before timing")
+    parser.add_argument("--alloc-samples", type=int, default=50, help="traced runs per benchmark")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--save", metavar="PATH", help="write results to PATH as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare with a saved baseline; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown or allocation growth before flagging, as a fraction; "
+                             "relative speed varies by up to 15%% between runs on a busy machine")
+    args = parser.parse_args()
+
+    results = {"python": platform.python_version(), "machine": platform.machine(), "benchmarks": {}}
+    with capture_output(NullSink()):
+        benchmarks = [benchmark for benchmark in engine_benchmarks() if args.filter in benchmark.name]
+        results["benchmarks"], results["timer_overhead_ns"] = measure(
+            benchmarks, args.samples, args.single_samples, args.warmup, args.alloc_samples)
+
+    found = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.threshold)
+        results["regressions"] = [{"benchmark": name, "metric": metric, "baseline": before, "now": now}
+                                  for name, metric, before, now in found]
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'benchmark':<28}{'ops/sec':>12}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'relative':>10}"
+              f"{'alloc B':>10}{'blocks':>8}")
+        for name, r in results["benchmarks"].items():
+            print(f"{name:<28}{r['ops_per_sec']:>12.0f}{r['batch_mean_us']:>10.1f}{r['p50_us']:>10.1f}"
+                  f"{r['p99_us']:>10.1f}{r['relative']:>10.3f}{r['alloc_peak_bytes']:>10}{r['alloc_blocks']:>8}")
+        print(f"\nbatch mean: per run, from timed batches; p50/p99: single runs, less "
+              f"{results['timer_overhead_ns']}ns timer overhead")
+        if args.compare:
+            if found:
+                print(f"\n{len(found)} regression(s) against {args.compare}:")
+                for name, metric, before, now in found:
+                    print(f"- {name}: {metric} {before:.3g} -> {now:.3g}")
+            else:
+                print(f"\nNo regressions against {args.compare}")
+    if found:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# Combat actions
+ATTACK = "attack"
+SPECIAL = "special"
+DEFEND = "defend"
+USE_ITEM = "use"
+FLEE = "flee"
+
+# How a fight ended
+VICTORY = "victory"
+DEFEAT = "defeat"
+FLED = "fled"
+
+BARE_HANDS_DAMAGE = 2
+
+# Everything a fight needs, with no reference to GameState, input or output.
+# step() never mutates a state: it returns a new one.
+class CombatState:
+    __slots__ = ("enemy_id", "enemy_name", "enemy_health", "enemy_damage", "player_health", "player_max_health",
+                 "weapon", "weapon_damage", "armor", "potions", "player_status", "enemy_status", "turn", "outcome")
+    
+    def __init__(self, enemy_id, enemy_name, enemy_health, enemy_damage,
+                 player_health, player_max_health, weapon=None, weapon_damage=BARE_HANDS_DAMAGE,
+                 armor=0, potions=None):
+        self.enemy_id = enemy_id
+        self.enemy_name = enemy_name
+        self.enemy_health = enemy_health
+        self.enemy_damage = enemy_damage
+        self.player_health = player_health
+        self.player_max_health = player_max_health
+        self.weapon = weapon  # item id of the equipped weapon, or None for fists
+        self.weapon_damage = weapon_damage
+        self.armor = armor
+        self.potions = potions if potions else {}  # item_id -> (count, heal amount)
+        self.player_status = {"bleeding": 0, "poisoned": 0, "strengthened": 0}
+        self.enemy_status = {"bleeding": 0, "poisoned": 0, "weakened": 0}
+        self.turn = 1
+        self.outcome = None  # VICTORY, DEFEAT or FLED once the fight is over
+
+    def copy(self):
+        state = CombatState.__new__(CombatState)
+        for field in CombatState.__slots__:
+            setattr(state, field, getattr(self, field))
+        state.potions = dict(self.potions)
+        state.player_status = dict(self.player_status)
+        state.enemy_status = dict(self.enemy_status)
+        return state
+
+# Build the starting state for a fight from the player's gear and an enemy template
+def new_combat(player, enemy_id, enemy, items):
+    weapon = player['equipped_weapon']
+    weapon_damage = BARE_HANDS_DAMAGE
+    if weapon and weapon in items:
+        weapon_damage = items[weapon].value
+
+    armor = 0
+    if player['equipped_armor'] and player['equipped_armor'] in items:
+        armor = items[player['equipped_armor']].value
+
+    return CombatState(
+        enemy_id, enemy.name, enemy.health, enemy.damage,
+        player['health'], player['max_health'],
+        weapon, weapon_damage, armor,
+        usable_potions(player['inventory'], items)
+    )
+
+# Potions in an Inventory, as item_id -> (count, heal amount)
+def usable_potions(inventory, items):
+    potions = {}
+    for item_id, count in inventory.items():
+        if item_id in items and items[item_id].item_type == "potion":
+            potions[item_id] = (count, items[item_id].value)
+    return potions
+
+# Resolve one combat turn. action is ATTACK, SPECIAL, DEFEND, FLEE or
+# (USE_ITEM, item_id); anything else wastes the turn. rng needs random(),
+# randint() and choice() - the random module or a random.Random.
+# Returns the new state and the list of events that happened, in order.
+def step(state, action, rng):
+    if state.outcome is not None:
+        raise ValueError("The fight is already over")
+
+    state = state.copy()
+    events = []
+    item_id = None
+    if isinstance(action, tuple):
+        action, item_id = action
+
+    # Apply status effects at start of turn
+    player_status = state.player_status
+    enemy_status = state.enemy_status
+    if player_status["bleeding"] > 0:
+        damage = rng.randint(1, 3)
+        state.player_health -= damage
+        events.append(("player_status_damage", "bleeding", damage))
+        player_status["bleeding"] -= 1
+
+    if player_status["poisoned"] > 0:
+        damage = rng.randint(2, 4)
+        state.player_health -= damage
+        events.append(("player_status_damage", "poisoned", damage))
+        player_status["poisoned"] -= 1
+
+    if enemy_status["bleeding"] > 0:
+        damage = rng.randint(1, 3)
+        state.enemy_health -= damage
+        events.append(("enemy_status_damage", "bleeding", damage))
+        enemy_status["bleeding"] -= 1
+
+    if enemy_status["poisoned"] > 0:
+        damage = rng.randint(2, 4)
+        state.enemy_health -= damage
+        events.append(("enemy_status_damage", "poisoned", damage))
+        enemy_status["poisoned"] -= 1
+
+    # Check if either combatant died from status effects
+    if state.player_health <= 0:
+        events.append(("defeat", "wounds"))
+        state.outcome = DEFEAT
+        return state, events
+
+    if state.enemy_health <= 0:
+        events.append(("victory", "wounds"))
+        state.outcome = VICTORY
+        return state, events
+
+    # Player's action
+    defending = False
+    damage_modifier = 1.5 if player_status["strengthened"] > 0 else 1.0
+
+    if action == ATTACK:
+        events.append(("attack", state.weapon))
+        damage = max(1, int((state.weapon_damage + rng.randint(-2, 2)) * damage_modifier))
+        if enemy_status["weakened"] > 0:
+            damage = int(damage * 1.5)
+        state.enemy_health -= damage
+        events.append(("hit", damage))
+
+        # 10% chance to cause bleeding
+        if rng.random() < 0.1:
+            enemy_status["bleeding"] = 3
+            events.append(("enemy_status", "bleeding"))
+
+    elif action == SPECIAL:
+        events.append(("special",))
+
+        # 70% chance to hit, but higher damage
+        if rng.random() < 0.7:
+            damage = max(1, int((state.weapon_damage * 2 + rng.randint(-1, 3)) * damage_modifier))
+            if enemy_status["weakened"] > 0:
+                damage = int(damage * 1.5)
+            state.enemy_health -= damage
+            events.append(("special_hit", damage))
+
+            # 25% chance to cause bleeding or weaken
+            if rng.random() < 0.25:
+                effect = rng.choice(["bleeding", "weakened"])
+                enemy_status[effect] = 3
+                events.append(("enemy_status", effect))
+        else:
+            events.append(("special_miss",))
+
+    elif action == DEFEND:
+        events.append(("defend",))
+        defending = True
+
+        # 25% chance to gain strength next turn
+        if rng.random() < 0.25:
+            player_status["strengthened"] = 2
+            events.append(("player_status", "strengthened"))
+
+    elif action == USE_ITEM:
+        if item_id in state.potions:
+            count, heal_amount = state.potions[item_id]
+            if count > 1:
+                state.potions[item_id] = (count - 1, heal_amount)
+            else:
+                del state.potions[item_id]
+            state.player_health = min(state.player_health + heal_amount, state.player_max_health)
+            events.append(("potion", item_id, heal_amount))
+
+            # Using an item skips the enemy's turn
+            _end_turn(state)
+            return state, events
+        events.append(("no_items",))
+
+    elif action == FLEE:
+        events.append(("flee",))
+
+        # Calculate flee chance (higher at lower health)
+        flee_chance = 0.4 + (1 - state.player_health / state.player_max_health) * 0.3
+        if rng.random() < flee_chance:
+            events.append(("fled",))
+            state.outcome = FLED
+            return state, events
+        events.append(("flee_failed",))
+
+    # Check if enemy is defeated after player action
+    if state.enemy_health <= 0:
+        events.append(("victory", "attack"))
+        state.outcome = VICTORY
+        return state, events
+
+    # Enemy's turn
+    events.append(("enemy_attack",))
+    damage = max(1, state.enemy_damage + rng.randint(-2, 2) - state.armor)
+    if defending:
+        damage = max(1, int(damage * 0.5))
+        events.append(("defended",))
+    state.player_health -= damage
+    events.append(("enemy_hit", damage))
+
+    # 15% chance for status effect
+    if rng.random() < 0.15:
+        effect = rng.choice(["bleeding", "poisoned"])
+        player_status[effect] = 3
+        events.append(("player_status", effect))
+
+    if state.player_health <= 0:
+        events.append(("defeat", "attack"))
+        state.outcome = DEFEAT
+        return state, events
+
+    _end_turn(state)
+    return state, events
+
+# Only bleeding and poison count down; strength and weakness last until
+# the fight ends
+def _end_turn(state):
+    state.turn += 1
+
+# Turn events into the lines the player reads
+def describe_events(state, events, items=None):
+    items = items if items is not None else {}
+    name = state.enemy_name
+    lines = []
+    for event in events:
+        kind = event[0]
+        if kind == "player_status_damage":
+            lines.append(f"You take {event[2]} {'bleeding' if event[1] == 'bleeding' else 'poison'} damage.")
+        elif kind == "enemy_status_damage":
+            lines.append(f"{name} takes {event[2]} {'bleeding' if event[1] == 'bleeding' else 'poison'} damage.")
+        elif kind == "attack":
+            weapon = event[1].replace('_', ' ') if event[1] else 'fists'
+            lines.append(f"You attack {name} with your {weapon}!")
+        elif kind == "hit":
+            lines.append(f"You deal {event[1]} damage to {name}.")
+        elif kind == "enemy_status":
+            if event[1] == "bleeding":
+                lines.append(f"Your attack causes {name} to bleed!")
+            else:
+                lines.append(f"Your special attack causes {name} to be {event[1]}!")
+        elif kind == "special":
+            lines.append("You prepare a special attack!")
+        elif kind == "special_hit":
+            lines.append(f"Your special attack hits for {event[1]} damage!")
+        elif kind == "special_miss":
+            lines.append("Your special attack misses!")
+        elif kind == "defend":
+            lines.append("You take a defensive stance.")
+        elif kind == "potion":
+            item_name = items[event[1]].name if event[1] in items else event[1].replace('_', ' ')
+            lines.append(f"You used {item_name} and recovered {event[2]} health points.")
+        elif kind == "no_items":
+            lines.append("You don't have any usable items!")
+        elif kind == "flee":
+            lines.append("You attempt to flee from combat!")
+        elif kind == "fled":
+            lines.append("You successfully escape!")
+        elif kind == "flee_failed":
+            lines.append("You failed to escape!")
+        elif kind == "enemy_attack":
+            lines.append(f"\n{name} attacks you!")
+        elif kind == "defended":
+            lines.append("Your defensive stance reduces the damage!")
+        elif kind == "enemy_hit":
+            lines.append(f"{name} deals {event[1]} damage to you.")
+        elif kind == "player_status":
+            if event[1] == "strengthened":
+                lines.append("You find an opening in the enemy's attack pattern!")
+            else:
+                lines.append(f"The attack causes you to be {event[1]}!")
+        elif kind == "defeat":
+            lines.append("You have been defeated by your wounds!" if event[1] == "wounds" else "You have been defeated!")
+        elif kind == "victory":
+            if event[1] == "wounds":
+                lines.append(f"{name} collapses from its wounds!")
+    return lines
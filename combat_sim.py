@@ -0,0 +1,252 @@
+import argparse
+import json
+import time
+import numpy as np
+from combat_engine import BARE_HANDS_DAMAGE
+from game_logic import create_game_items, create_game_enemies
+
+# Batch Monte Carlo version of combat_engine.step for balance work.
+# Every fight in a batch is one slot in a set of NumPy arrays, and one loop
+# iteration resolves a turn of every fight that is still going. The rules
+# are the same as combat_engine: status ticks, the 70% special attack,
+# defend halving damage, the health-scaled flee chance, and strength and
+# weakness lasting until the fight ends.
+# Potions are not modelled.
+
+# How the simulated player picks actions
+class Policy:
+    def __init__(self, special_rate=0.0, defend_rate=0.0, flee_below=0.0):
+        self.special_rate = special_rate  # share of turns spent on special attacks
+        self.defend_rate = defend_rate  # share of turns spent defending
+        self.flee_below = flee_below  # try to flee when health drops below this fraction
+
+    def as_dict(self):
+        return {"special_rate": self.special_rate, "defend_rate": self.defend_rate, "flee_below": self.flee_below}
+
+# Outcome codes
+FIGHTING = 0
+WON = 1
+LOST = 2
+FLED = 3
+TIMED_OUT = 4
+
+# Simulate fights. weapon_damage, armor, enemy_health and enemy_damage are
+# arrays with one entry per fight. Returns (outcome, turns, player_health),
+# one entry per fight.
+def simulate(weapon_damage, armor, enemy_health, enemy_damage, policy, rng,
+             player_health=100, max_turns=500):
+    n = len(weapon_damage)
+    outcome = np.zeros(n, dtype=np.int8)
+    turns = np.zeros(n, dtype=np.int32)
+    final_health = np.zeros(n, dtype=np.int32)
+
+    # State of the fights still in progress; idx maps them back to their slot
+    idx = np.arange(n)
+    wd = np.asarray(weapon_damage, dtype=np.int16).copy()
+    ar = np.asarray(armor, dtype=np.int16).copy()
+    ed = np.asarray(enemy_damage, dtype=np.int16).copy()
+    eh = np.asarray(enemy_health, dtype=np.int16).copy()
+    ph = np.full(n, player_health, dtype=np.int16)
+    live = np.ones(n, dtype=bool)  # fights in the working set that have not finished
+    p_bleed = np.zeros(n, dtype=np.int8)
+    p_poison = np.zeros(n, dtype=np.int8)
+    p_strong = np.zeros(n, dtype=np.int8)
+    e_bleed = np.zeros(n, dtype=np.int8)
+    e_poison = np.zeros(n, dtype=np.int8)
+    e_weak = np.zeros(n, dtype=np.int8)
+
+    for turn in range(1, max_turns + 1):
+        m = len(idx)
+        if m == 0:
+            break
+        done = np.where(live, FIGHTING, -1).astype(np.int8)
+
+        # The player picks an action before status effects tick, as in the game
+        draw = rng.random(m, dtype=np.float32)
+        flee = ph < policy.flee_below * player_health
+        special = ~flee & (draw < policy.special_rate)
+        defend = ~flee & ~special & (draw < policy.special_rate + policy.defend_rate)
+        attack = ~flee & ~special & ~defend
+
+        # Status effects at start of turn
+        ticking = p_bleed > 0
+        ph -= np.where(ticking, rng.integers(1, 4, m, dtype=np.int16), 0)
+        p_bleed -= ticking
+        ticking = p_poison > 0
+        ph -= np.where(ticking, rng.integers(2, 5, m, dtype=np.int16), 0)
+        p_poison -= ticking
+        ticking = e_bleed > 0
+        eh -= np.where(ticking, rng.integers(1, 4, m, dtype=np.int16), 0)
+        e_bleed -= ticking
+        ticking = e_poison > 0
+        eh -= np.where(ticking, rng.integers(2, 5, m, dtype=np.int16), 0)
+        e_poison -= ticking
+
+        done[(done == FIGHTING) & (ph <= 0)] = LOST
+        done[(done == FIGHTING) & (eh <= 0)] = WON
+        active = done == FIGHTING
+        flee &= active
+        special &= active
+        defend &= active
+        attack &= active
+
+        modifier = np.where(p_strong > 0, np.float32(1.5), np.float32(1.0))
+        weakened = e_weak > 0
+
+        # Basic attack, 10% chance to cause bleeding
+        damage = np.maximum(1, ((wd + rng.integers(-2, 3, m, dtype=np.int16)) * modifier).astype(np.int16))
+        damage = np.where(weakened, (damage * 1.5).astype(np.int16), damage)
+        eh -= np.where(attack, damage, 0)
+        e_bleed[attack & (rng.random(m, dtype=np.float32) < 0.1)] = 3
+
+        # Special attack: 70% to hit, then 25% to cause bleeding or weakness
+        hit = special & (rng.random(m, dtype=np.float32) < 0.7)
+        damage = np.maximum(1, ((wd * 2 + rng.integers(-1, 4, m, dtype=np.int16)) * modifier).astype(np.int16))
+        damage = np.where(weakened, (damage * 1.5).astype(np.int16), damage)
+        eh -= np.where(hit, damage, 0)
+        effect = hit & (rng.random(m, dtype=np.float32) < 0.25)
+        bleeding = rng.random(m, dtype=np.float32) < 0.5
+        e_bleed[effect & bleeding] = 3
+        e_weak[effect & ~bleeding] = 3
+
+        # Defend: 25% chance to gain strength
+        p_strong[defend & (rng.random(m, dtype=np.float32) < 0.25)] = 2
+
+        # Flee: more likely at low health
+        flee_chance = 0.4 + (1 - ph / player_health) * 0.3
+        done[flee & (rng.random(m, dtype=np.float32) < flee_chance)] = FLED
+
+        done[(done == FIGHTING) & (eh <= 0)] = WON
+        active = done == FIGHTING
+
+        # Enemy's turn
+        damage = np.maximum(1, ed + rng.integers(-2, 3, m, dtype=np.int16) - ar)
+        damage = np.where(defend, np.maximum(1, (damage * 0.5).astype(np.int16)), damage)
+        ph -= np.where(active, damage, 0)
+        effect = active & (rng.random(m, dtype=np.float32) < 0.15)
+        bleeding = rng.random(m, dtype=np.float32) < 0.5
+        p_bleed[effect & bleeding] = 3
+        p_poison[effect & ~bleeding] = 3
+
+        done[active & (ph <= 0)] = LOST
+
+        # Record finished fights. Compacting the working set costs a copy of
+        # every array, so only do it once half of it is finished.
+        finished = done > FIGHTING
+        slots = idx[finished]
+        outcome[slots] = done[finished]
+        turns[slots] = turn
+        final_health[slots] = np.maximum(ph[finished], 0)
+        live &= ~finished
+        remaining = np.count_nonzero(live)
+        if remaining == 0:
+            idx = idx[:0]
+        elif remaining < m // 2:
+            keep = live
+            live = live[keep]
+            idx = idx[keep]
+            wd, ar, ed, eh, ph = wd[keep], ar[keep], ed[keep], eh[keep], ph[keep]
+            p_bleed, p_poison, p_strong = p_bleed[keep], p_poison[keep], p_strong[keep]
+            e_bleed, e_poison, e_weak = e_bleed[keep], e_poison[keep], e_weak[keep]
+
+    if len(idx):
+        idx, ph = idx[live], ph[live]
+        outcome[idx] = TIMED_OUT
+        turns[idx] = max_turns
+        final_health[idx] = np.maximum(ph, 0)
+    return outcome, turns, final_health
+
+# Summary statistics for one batch of fights
+def summarize(outcome, turns, final_health):
+    n = len(outcome)
+    won = outcome == WON
+    summary = {
+        "fights": n,
+        "win_rate": float(won.mean()),
+        "loss_rate": float((outcome == LOST).mean()),
+        "flee_rate": float((outcome == FLED).mean()),
+        "timeout_rate": float((outcome == TIMED_OUT).mean())
+    }
+    if won.any():
+        win_turns = turns[won]
+        win_health = final_health[won]
+        summary["turns_to_kill"] = {
+            "mean": float(win_turns.mean()),
+            "p10": float(np.percentile(win_turns, 10)),
+            "p50": float(np.percentile(win_turns, 50)),
+            "p90": float(np.percentile(win_turns, 90))
+        }
+        summary["hp_remaining"] = {
+            "mean": float(win_health.mean()),
+            "p10": float(np.percentile(win_health, 10)),
+            "p50": float(np.percentile(win_health, 50)),
+            "p90": float(np.percentile(win_health, 90))
+        }
+    return summary
+
+# Run every weapon x armor x enemy combination. Combinations are packed into
+# batches of about batch_size fights so memory stays bounded.
+def run_matrix(items, enemies, fights=20000, policy=None, seed=None, batch_size=2000000):
+    policy = policy if policy is not None else Policy()
+    rng = np.random.default_rng(seed)
+
+    weapons = [(None, BARE_HANDS_DAMAGE)] + [(item_id, item.value) for item_id, item in items.items() if item.item_type == "weapon"]
+    armors = [(None, 0)] + [(item_id, item.value) for item_id, item in items.items() if item.item_type == "armor"]
+    combos = [(weapon, armor, enemy_id)
+              for weapon in weapons for armor in armors for enemy_id in enemies]
+
+    results = []
+    per_batch = max(1, batch_size // fights)
+    for start in range(0, len(combos), per_batch):
+        batch = combos[start:start + per_batch]
+        wd = np.repeat([weapon[1] for weapon, armor, enemy_id in batch], fights)
+        ar = np.repeat([armor[1] for weapon, armor, enemy_id in batch], fights)
+        eh = np.repeat([enemies[enemy_id].health for weapon, armor, enemy_id in batch], fights)
+        ed = np.repeat([enemies[enemy_id].damage for weapon, armor, enemy_id in batch], fights)
+        outcome, turns, final_health = simulate(wd, ar, eh, ed, policy, rng)
+
+        for i, (weapon, armor, enemy_id) in enumerate(batch):
+            part = slice(i * fights, (i + 1) * fights)
+            summary = summarize(outcome[part], turns[part], final_health[part])
+            summary.update({"weapon": weapon[0] or "fists", "armor": armor[0] or "none", "enemy": enemy_id})
+            results.append(summary)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo combat balance simulator")
+    parser.add_argument("--fights", type=int, default=20000, help="fights per weapon/armor/enemy combination")
+    parser.add_argument("--special-rate", type=float, default=0.0)
+    parser.add_argument("--defend-rate", type=float, default=0.0)
+    parser.add_argument("--flee-below", type=float, default=0.0, help="flee when health falls below this fraction")
+    parser.add_argument("--weapon", help="only this weapon id ('fists' for none)")
+    parser.add_argument("--armor", help="only this armor id ('none' for none)")
+    parser.add_argument("--enemy", help="only this enemy id")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    items = create_game_items()
+    enemies = create_game_enemies()
+    if args.enemy:
+        enemies = {args.enemy: enemies[args.enemy]}
+    policy = Policy(args.special_rate, args.defend_rate, args.flee_below)
+
+    started = time.perf_counter()
+    results = run_matrix(items, enemies, args.fights, policy, args.seed)
+    elapsed = time.perf_counter() - started
+    results = [r for r in results
+               if (not args.weapon or r["weapon"] == args.weapon) and (not args.armor or r["armor"] == args.armor)]
+
+    if args.json:
+        print(json.dumps({"policy": policy.as_dict(), "seconds": elapsed, "results": results}, indent=2))
+        return
+
+    print(f"{'weapon':<16} {'armor':<14} {'enemy':<14} {'win':>6} {'flee':>6} {'turns p50':>9} {'hp p50':>7}")
+    for r in results:
+        turns = r.get("turns_to_kill", {}).get("p50", float("nan"))
+        health = r.get("hp_remaining", {}).get("p50", float("nan"))
+        print(f"{r['weapon']:<16} {r['armor']:<14} {r['enemy']:<14} {r['win_rate']:>6.1%} {r['flee_rate']:>6.1%} {turns:>9.0f} {health:>7.0f}")
+    print(f"\n{len(results)} combinations in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
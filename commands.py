@@ -0,0 +1,66 @@
+# Key under which a trie node stores what its prefix resolves to
+_MATCH = ""
+
+# Maps command verbs and aliases to handlers.
+# Exact verbs are a single dict lookup. Prefixes ("inv" -> "inventory") are
+# resolved through a trie built at registration time, so the cost of a lookup
+# depends on the length of the word, not on how many commands exist.
+class CommandRegistry:
+    def __init__(self):
+        self.handlers = {}  # verb or alias -> handler
+        self.canonical = {}  # verb or alias -> first verb it was registered with
+        self.help_entries = []  # (verbs, usage, description) in registration order
+        self._trie = {}
+
+    def register(self, verbs, handler, usage="", description=""):
+        canonical = verbs[0]
+        for verb in verbs:
+            if verb in self.handlers:
+                raise ValueError(f"Command '{verb}' is already registered")
+            self.handlers[verb] = handler
+            self.canonical[verb] = canonical
+            self._insert(verb, canonical)
+        if description:
+            self.help_entries.append((verbs, usage, description))
+        return handler
+
+    # Decorator form of register
+    def command(self, *verbs, usage="", description=""):
+        def decorator(handler):
+            return self.register(verbs, handler, usage, description)
+        return decorator
+
+    # Every node on the path remembers which verbs lie below it. A node whose
+    # verbs all belong to one command resolves to that command.
+    def _insert(self, verb, canonical):
+        node = self._trie
+        for char in verb:
+            node = node.setdefault(char, {})
+            owner, verbs = node.get(_MATCH, (canonical, ()))
+            if owner != canonical:
+                owner = None
+            node[_MATCH] = (owner, verbs + (verb,))
+
+    def _node(self, word):
+        node = self._trie
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    # Resolve a typed word or unambiguous prefix to its command verb, or None
+    def resolve(self, word):
+        if word in self.canonical:
+            return self.canonical[word]
+        node = self._node(word)
+        if node is None or _MATCH not in node:
+            return None
+        return node[_MATCH][0]
+
+    # Verbs starting with word, to explain an ambiguous prefix
+    def candidates(self, word):
+        node = self._node(word)
+        if node is None or _MATCH not in node:
+            return ()
+        return node[_MATCH][1]
@@ -0,0 +1,173 @@
+import argparse
+import sys
+from array import array
+from game_logic import (GameState, Item, Enemy, NPC, create_game_world, create_game_items,
+                        create_game_npcs, create_game_enemies)
+from quests import Quest, create_game_quests, ENEMY_DEFEATED, ITEM_ACQUIRED, LOCATION_ENTERED
+from routing import Adjacency, RouteGraph, route_columns
+from savegame import header, check_header, record, iter_records, decode, SaveError
+from world_overlay import FrozenWorld
+
+# Compiled content bundle: the save-file framing with its own magic and a
+# single record holding all of the checked content. Locations, items, NPCs,
+# enemies and quests are stored in the form the engine plays them - keyed
+# by id, referring to each other by id - so loading builds them directly.
+# Locations are also numbered, in world order, and the connections and
+# gates stored as number columns that the route graph uses as they are.
+BUNDLE_MAGIC = b"AQCB"
+CONTENT = ord("C")
+
+# What the key of each quest event refers to
+EVENT_KINDS = {ENEMY_DEFEATED: "enemy", ITEM_ACQUIRED: "item", LOCATION_ENTERED: "location"}
+
+# Content that refers to things that don't exist. Holds every problem found,
+# not just the first.
+class ContentError(Exception):
+    def __init__(self, problems):
+        super().__init__("Invalid content:\n" + "\n".join(f"- {problem}" for problem in problems))
+        self.problems = problems
+
+# Check every cross-reference in the content and number the locations.
+# Returns the bundle contents, or raises ContentError.
+def compile_content(world, items, npcs, enemies, quests):
+    problems = []
+    known = {"location": world, "item": items, "npc": npcs, "enemy": enemies}
+
+    # Record a problem for a reference to an id that doesn't exist
+    def check(kind, entity_id, where):
+        if entity_id not in known[kind]:
+            problems.append(f"{where} refers to unknown {kind} '{entity_id}'")
+
+    start = GameState().current_location
+    if start not in world:
+        problems.append(f"start location '{start}' does not exist")
+
+    locations = {}
+    for location_id, location in world.items():
+        where = f"location '{location_id}'"
+        for connection in location["connections"]:
+            check("location", connection, where)
+        for enemy_id in location["enemies"]:
+            check("enemy", enemy_id, where)
+        for npc_id in location["npcs"]:
+            check("npc", npc_id, where)
+        for item_id in location["items"]:
+            check("item", item_id, where)
+        if location.get("requires_item") is not None:
+            check("item", location["requires_item"], where)
+        locations[location_id] = {key: list(value) if isinstance(value, tuple) else value
+                                  for key, value in location.items()}
+
+    item_records = {item_id: {"name": item.name, "description": item.description,
+                              "item_type": item.item_type, "value": item.value}
+                    for item_id, item in items.items()}
+
+    enemy_records = {}
+    for enemy_id, enemy in enemies.items():
+        for item_id in enemy.loot:
+            check("item", item_id, f"loot of enemy '{enemy_id}'")
+        enemy_records[enemy_id] = {"name": enemy.name, "description": enemy.description, "health": enemy.health,
+                                   "damage": enemy.damage, "loot": list(enemy.loot), "respawn": enemy.respawn}
+
+    npc_records = {}
+    for npc_id, npc in npcs.items():
+        for trade in npc.trades:
+            check("item", trade["give"], f"trades of NPC '{npc_id}'")
+        if npc.quest:
+            check("item", npc.quest["reward"], f"quest reward of NPC '{npc_id}'")
+        npc_records[npc_id] = {"name": npc.name, "description": npc.description, "dialogue": npc.dialogue,
+                               "trades": npc.trades, "quest": npc.quest}
+
+    quest_records = {}
+    for quest_id, quest in quests.items():
+        check("item", quest.reward, f"reward of quest '{quest_id}'")
+        for objective, (event, key) in quest.triggers.items():
+            where = f"objective '{objective}' of quest '{quest_id}'"
+            if objective not in quest.objectives:
+                problems.append(f"{where} is not one of the quest's objectives")
+            if event not in EVENT_KINDS:
+                problems.append(f"{where} waits for unknown event '{event}'")
+                continue
+            check(EVENT_KINDS[event], key, where)
+        for objective, required in quest.prerequisites.items():
+            for name in (objective, required):
+                if name not in quest.objectives:
+                    problems.append(f"prerequisite '{name}' of quest '{quest_id}' is not one of the quest's objectives")
+        quest_records[quest_id] = {"name": quest.name, "description": quest.description,
+                                   "objectives": list(quest.objectives), "reward": quest.reward,
+                                   "triggers": dict(quest.triggers), "prerequisites": dict(quest.prerequisites)}
+
+    if problems:
+        raise ContentError(problems)
+
+    location_ids = list(world)
+    numbers = {location_id: number for number, location_id in enumerate(location_ids)}
+    connections, gates, gate_items = route_columns(world, location_ids, numbers)
+    forward = Adjacency.from_lists(connections)
+    backward = forward.reversed()
+    routes = {"forward": [list(forward.offsets), list(forward.targets)],
+              "backward": [list(backward.offsets), list(backward.targets)],
+              "gates": list(gates), "gate_items": gate_items}
+    return {"world": locations, "items": item_records, "enemies": enemy_records,
+            "npcs": npc_records, "quests": quest_records, "routes": routes}
+
+def write_bundle(path, tables):
+    data = header(BUNDLE_MAGIC)
+    data += record(CONTENT, tables)
+    with open(path, "wb") as f:
+        f.write(data)
+
+# Load a bundle with one read
+def read_bundle(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    check_header(data, BUNDLE_MAGIC)
+    for kind, payload, end in iter_records(data):
+        if kind == CONTENT:
+            tables, _ = decode(payload)
+            return Content(tables)
+    raise SaveError("Content bundle is damaged")
+
+# Runtime view of compiled content: the catalogs the engine uses and a
+# FrozenWorld whose route graph comes from the stored number columns
+# instead of being built on the first travel.
+class Content:
+    def __init__(self, tables):
+        self.tables = tables
+        self.items = {item_id: Item(**fields) for item_id, fields in tables["items"].items()}
+        self.enemies = {enemy_id: Enemy(**fields) for enemy_id, fields in tables["enemies"].items()}
+        self.npcs = {npc_id: NPC(**fields) for npc_id, fields in tables["npcs"].items()}
+        # Triggers are (event, key) pairs, which the encoding stores as lists
+        self.quests = {}
+        for quest_id, fields in tables["quests"].items():
+            triggers = {objective: tuple(trigger) for objective, trigger in fields["triggers"].items()}
+            self.quests[quest_id] = Quest(**dict(fields, triggers=triggers))
+
+        self.world = FrozenWorld(tables["world"])
+        routes = tables["routes"]
+        location_ids = list(self.world)
+        numbers = {location_id: number for number, location_id in enumerate(location_ids)}
+        forward = Adjacency(*(array("I", column) for column in routes["forward"]))
+        backward = Adjacency(*(array("I", column) for column in routes["backward"]))
+        self.world.derived["routes"] = RouteGraph(location_ids, numbers, forward, backward,
+                                                  array("I", routes["gates"]), routes["gate_items"])
+
+# Compile the built-in content
+def compile_builtin():
+    return compile_content(create_game_world(), create_game_items(), create_game_npcs(),
+                           create_game_enemies(), create_game_quests())
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the built-in game content and compile it into a bundle")
+    parser.add_argument("path", nargs="?", help="bundle file to write; omit to only check the content")
+    args = parser.parse_args()
+    try:
+        tables = compile_builtin()
+    except ContentError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if args.path:
+        write_bundle(args.path, tables)
+
+if __name__ == "__main__":
+    main()
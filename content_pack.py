@@ -0,0 +1,333 @@
+import argparse
+import mmap
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Mapping, Sequence
+from game_logic import (Item, NPC, Enemy, create_game_world, create_game_items,
+                        create_game_npcs, create_game_enemies)
+from routing import Adjacency, RouteGraph, route_columns
+from savegame import encode, decode, SaveError
+from world_overlay import freeze_location
+
+# Content pack layout (all offsets are from the start of the file):
+#   MAGIC, one version byte, three padding bytes, then the header:
+#     location count, region count, id table offset, region table offset,
+#     catalog offset, catalog length, routes offset, connection count,
+#     gate item list length
+#   id table: one (string offset, string length, region) entry per location,
+#     sorted by the UTF-8 bytes of the location id, then the id strings
+#   region table: one (offset, length) entry per region
+#   regions: each an encoded {location_id: location} dict
+#   catalogs: an encoded {"items": ..., "npcs": ..., "enemies": ...} dict
+#   routes, 8-byte aligned: uint32 columns indexed by a location's position
+#     in the id table (its number): forward offsets and targets, backward
+#     offsets and targets (see routing.Adjacency), the gate number of each
+#     location, then the encoded list of gate items
+# Opening a pack reads only the header. Locations are found by binary search
+# over the id table and decoded a region at a time, straight from the
+# mapping. The route columns are used in place the first time a route is
+# planned.
+PACK_MAGIC = b"AQPK"
+PACK_VERSION = 1
+
+_HEADER = struct.Struct("<IIQQQQQQQ")
+_HEADER_OFFSET = 8
+_ID_ENTRY = struct.Struct("<III")
+_REGION_ENTRY = struct.Struct("<QQ")
+
+# World locations paged in from a content pack, a region at a time.
+# Behaves like FrozenWorld: read-only locations and a derived cache for
+# WorldOverlay. At most max_regions regions stay decoded; the least
+# recently used one is dropped when another is needed.
+class PagedWorld(Mapping):
+    def __init__(self, path, max_regions=64):
+        self.path = path
+        self.max_regions = max_regions
+        self.derived = {}  # caches computed from the base world, shared by all overlays
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:4] != PACK_MAGIC:
+            raise SaveError("Not a content pack")
+        version = self._data[4]
+        if version != PACK_VERSION:
+            raise SaveError(f"Unsupported content pack version {version}")
+        (self._count, self._region_count, self._ids_at, self._regions_at,
+         self._catalog_at, self._catalog_length, self._routes_at, self._edge_count,
+         self._gate_items_length) = _HEADER.unpack_from(self._data, _HEADER_OFFSET)
+        self._regions = OrderedDict()  # region -> location ids, least recently used first
+        self._locations = {}  # location_id -> (region, location) for resident regions
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def close(self):
+        # The route graph's columns are views of the mapping
+        self.derived.pop("routes", None)
+        self._data.close()
+        self._file.close()
+
+    def __getitem__(self, location_id):
+        with self._lock:
+            entry = self._locations.get(location_id)
+            if entry is not None:
+                self._regions.move_to_end(entry[0])
+                return entry[1]
+            region = self.region_of(location_id)
+            if region is None:
+                raise KeyError(location_id)
+            self._load(region)
+            return self._locations[location_id][1]
+
+    def __contains__(self, location_id):
+        return location_id in self._locations or self.region_of(location_id) is not None
+
+    # Location ids in id order, read from the id table without paging anything in
+    def __iter__(self):
+        for number in range(self._count):
+            yield self.location_id(number)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def resident_regions(self):
+        return len(self._regions)
+
+    # The region a location is stored in, or None if the pack doesn't have it
+    def region_of(self, location_id):
+        number = self.location_number(location_id)
+        if number is None:
+            return None
+        return _ID_ENTRY.unpack_from(self._data, self._ids_at + number * _ID_ENTRY.size)[2]
+
+    # The id of the location at this position in the id table
+    def location_id(self, number):
+        offset, length, region = _ID_ENTRY.unpack_from(self._data, self._ids_at + number * _ID_ENTRY.size)
+        return self._data[offset:offset + length].decode("utf-8")
+
+    # Binary search of the id table. Returns the location's position in it
+    # (its number), or None.
+    def location_number(self, location_id):
+        if not isinstance(location_id, str):
+            return None
+        key = location_id.encode("utf-8")
+        data = self._data
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, region = _ID_ENTRY.unpack_from(data, self._ids_at + middle * _ID_ENTRY.size)
+            probe = data[offset:offset + length]
+            if probe == key:
+                return middle
+            if probe < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _load(self, region):
+        offset, length = _REGION_ENTRY.unpack_from(self._data, self._regions_at + region * _REGION_ENTRY.size)
+        locations, _ = decode(memoryview(self._data)[offset:offset + length])
+        for location_id, location in locations.items():
+            self._locations[location_id] = (region, freeze_location(location))
+        self._regions[region] = tuple(locations)
+        self.loads += 1
+        while len(self._regions) > self.max_regions:
+            self._evict(*self._regions.popitem(last=False))
+
+    # Forget a cold region, and anything derived from its locations
+    def _evict(self, region, location_ids):
+        targets = self.derived.get("targets")
+        for location_id in location_ids:
+            del self._locations[location_id]
+            if targets:
+                for key in ("items", "npcs", "enemies"):
+                    targets.pop((location_id, key), None)
+        self.evictions += 1
+
+    # The items, NPCs and enemies stored with the world, as plain fields
+    def catalogs(self):
+        start = self._catalog_at
+        catalogs, _ = decode(memoryview(self._data)[start:start + self._catalog_length])
+        return catalogs
+
+    # The route graph stored with the world. Its columns are used in place
+    # and location ids are looked up in the id table, so building it pages
+    # in no region and its heap cost doesn't grow with the world.
+    def route_graph(self):
+        count, edges = self._count, self._edge_count
+        start = self._routes_at
+        columns = []
+        for length in (count + 1, edges, count + 1, edges, count):
+            columns.append(self._uint32s(start, length))
+            start += 4 * length
+        forward_offsets, forward_targets, backward_offsets, backward_targets, gates = columns
+        gate_items, _ = decode(memoryview(self._data)[start:start + self._gate_items_length])
+        return RouteGraph(_LocationIds(self), _LocationNumbers(self),
+                          Adjacency(forward_offsets, forward_targets),
+                          Adjacency(backward_offsets, backward_targets), gates, gate_items)
+
+    # A little-endian uint32 column, viewed in place where the machine's
+    # byte order allows it
+    def _uint32s(self, start, length):
+        view = memoryview(self._data)[start:start + 4 * length]
+        if sys.byteorder == "little":
+            return view.cast("I")
+        column = array("I")
+        column.frombytes(view)
+        column.byteswap()
+        return column
+
+# A pack's id table as RouteGraph sees it: ids by number, and numbers by
+# id, answered from the mapping instead of a list and dict of every id
+class _LocationIds(Sequence):
+    def __init__(self, world):
+        self._world = world
+
+    def __len__(self):
+        return len(self._world)
+
+    def __getitem__(self, number):
+        if not 0 <= number < len(self._world):
+            raise IndexError(number)
+        return self._world.location_id(number)
+
+class _LocationNumbers(Mapping):
+    def __init__(self, world):
+        self._world = world
+
+    def __getitem__(self, location_id):
+        number = self._world.location_number(location_id)
+        if number is None:
+            raise KeyError(location_id)
+        return number
+
+    def __iter__(self):
+        return iter(self._world)
+
+    def __len__(self):
+        return len(self._world)
+
+# Split a world into regions of about region_size locations. Locations with
+# a "region" field are grouped by it; the rest are taken in breadth-first
+# order so neighbouring locations tend to share a region.
+def assign_regions(world, region_size=256):
+    named = {}
+    order = []
+    seen = set()
+    for start in world:
+        if start in seen:
+            continue
+        seen.add(start)
+        queue = deque([start])
+        while queue:
+            location_id = queue.popleft()
+            region_name = world[location_id].get("region")
+            if region_name is not None:
+                named.setdefault(region_name, []).append(location_id)
+            else:
+                order.append(location_id)
+            for connection in world[location_id]["connections"]:
+                if connection in world and connection not in seen:
+                    seen.add(connection)
+                    queue.append(connection)
+
+    regions = list(named.values())
+    regions += [order[i:i + region_size] for i in range(0, len(order), region_size)]
+    return regions
+
+# A slotted catalog object's constructor arguments, by name
+def fields(entity):
+    return {field: getattr(entity, field) for field in type(entity).__slots__}
+
+# Write world and catalogs (item/npc/enemy id -> object) as a content pack
+def write_pack(path, world, items, npcs, enemies, region_size=256):
+    regions = assign_regions(world, region_size)
+    region_of = {}
+    for region, location_ids in enumerate(regions):
+        for location_id in location_ids:
+            region_of[location_id] = region
+
+    ids = sorted((location_id.encode("utf-8"), location_id) for location_id in world)
+    ids_at = _HEADER_OFFSET + _HEADER.size
+    strings_at = ids_at + len(ids) * _ID_ENTRY.size
+    id_table = bytearray()
+    strings = bytearray()
+    for raw, location_id in ids:
+        id_table += _ID_ENTRY.pack(strings_at + len(strings), len(raw), region_of[location_id])
+        strings += raw
+
+    regions_at = strings_at + len(strings)
+    blobs_at = regions_at + len(regions) * _REGION_ENTRY.size
+    region_table = bytearray()
+    blobs = bytearray()
+    for location_ids in regions:
+        blob = encode({location_id: {key: list(value) if isinstance(value, tuple) else value
+                                     for key, value in world[location_id].items()}
+                       for location_id in location_ids})
+        region_table += _REGION_ENTRY.pack(blobs_at + len(blobs), len(blob))
+        blobs += blob
+
+    catalogs = encode({
+        "items": {item_id: fields(item) for item_id, item in items.items()},
+        "npcs": {npc_id: fields(npc) for npc_id, npc in npcs.items()},
+        "enemies": {enemy_id: fields(enemy) for enemy_id, enemy in enemies.items()}
+    })
+    catalog_at = blobs_at + len(blobs)
+
+    # Routing numbers locations by their place in the id table
+    location_ids = [location_id for raw, location_id in ids]
+    numbers = {location_id: number for number, location_id in enumerate(location_ids)}
+    connections, gates, gate_items = route_columns(world, location_ids, numbers)
+    forward = Adjacency.from_lists(connections)
+    backward = forward.reversed()
+    routes = bytearray()
+    for column in (forward.offsets, forward.targets, backward.offsets, backward.targets, gates):
+        routes += _uint32_bytes(column)
+    gate_list = encode(gate_items)
+    routes += gate_list
+    padding = -(catalog_at + len(catalogs)) % 8
+    routes_at = catalog_at + len(catalogs) + padding
+
+    with open(path, "wb") as f:
+        f.write(PACK_MAGIC + bytes([PACK_VERSION, 0, 0, 0]))
+        f.write(_HEADER.pack(len(ids), len(regions), ids_at, regions_at, catalog_at, len(catalogs),
+                             routes_at, len(forward.targets), len(gate_list)))
+        f.write(id_table)
+        f.write(strings)
+        f.write(region_table)
+        f.write(blobs)
+        f.write(catalogs)
+        f.write(bytes(padding))
+        f.write(routes)
+
+def _uint32_bytes(column):
+    if sys.byteorder != "little":
+        column = array("I", column)
+        column.byteswap()
+    return column.tobytes()
+
+# Open a content pack: (world, items, npcs, enemies). The world pages
+# itself in and reads its route graph the first time travel needs it; the
+# catalogs are small and are built right away.
+def load_pack(path, max_regions=64):
+    world = PagedWorld(path, max_regions)
+    catalogs = world.catalogs()
+    items = {item_id: Item(**fields) for item_id, fields in catalogs["items"].items()}
+    npcs = {npc_id: NPC(**fields) for npc_id, fields in catalogs["npcs"].items()}
+    enemies = {enemy_id: Enemy(**fields) for enemy_id, fields in catalogs["enemies"].items()}
+    return world, items, npcs, enemies
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the built-in game content as a content pack")
+    parser.add_argument("path", help="pack file to write")
+    parser.add_argument("--region-size", type=int, default=256, help="locations per region")
+    args = parser.parse_args()
+    write_pack(args.path, create_game_world(), create_game_items(), create_game_npcs(),
+               create_game_enemies(), args.region_size)
+
+if __name__ == "__main__":
+    main()
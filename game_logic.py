@@ -1,31 +1,92 @@
 import time
 import random
 import os
+import contextvars
+from contextlib import contextmanager
+import combat_engine
+from commands import CommandRegistry
+from inventory import Inventory
+from quests import Quest, QUESTS, create_game_quests, ENEMY_DEFEATED, ITEM_ACQUIRED, LOCATION_ENTERED
+from routing import route_graph
+from savegame import SaveFile, SaveError
+from scheduler import TimerWheel
+from target_index import TargetIndex
+from world_overlay import FrozenWorld, WorldOverlay
+
+# The player character. Slotted, but it keeps the dict-style access the
+# rest of the game uses: player['health'], player['inventory'] = Inventory()
+class Player:
+    __slots__ = ("name", "health", "max_health", "inventory", "equipped_weapon", "equipped_armor")
+    FIELDS = frozenset(__slots__)
+    
+    def __init__(self):
+        self.name = ""
+        self.health = 100
+        self.max_health = 100
+        self.inventory = Inventory()
+        self.equipped_weapon = None
+        self.equipped_armor = None
+    
+    def __getitem__(self, key):
+        if key not in Player.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key not in Player.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
 
 # Game state
 class GameState:
+    __slots__ = ("player", "current_location", "visited_locations", "quest_progress", "game_time",
+                 "enemies_defeated", "quests", "inventory_index", "combat", "save_path", "rng", "rng_seed",
+                 "timers")
+    
     def __init__(self):
-        self.player = {
-            "name": "",
-            "health": 100,
-            "max_health": 100,
-            "inventory": [],
-            "equipped_weapon": None,
-            "equipped_armor": None
-        }
+        self.player = Player()
         self.current_location = "village"
         self.visited_locations = set()
         self.quest_progress = {
             "main_quest": 0,
-            "forest_cleared": False,
-            "mines_cleared": False,
             "castle_key": False
         }
         self.game_time = 0  # in minutes (in-game time)
         self.enemies_defeated = 0
+        self.quests = {}  # quest_id -> this player's progress, for quests they have made progress on
+        self.inventory_index = None  # TargetIndex over the inventory, built on first use
+        self.combat = None  # CombatState while a fight is on
+        self.save_path = None  # save slot this game is written to, if any
+        self.rng = None  # randomness used by combat, created on first use
+        self.rng_seed = None  # seed for this turn, applied when rng is first needed
+        self.timers = None  # TimerWheel of pending time-driven effects, created on first use
+
+# Add an item to the player's inventory, keeping the target index in step.
+# The index holds each kind of item once, so it only changes when a stack
+# appears or runs out.
+def add_to_inventory(game_state, item_id):
+    inventory = game_state.player['inventory']
+    inventory.add(item_id)
+    if game_state.inventory_index is not None and inventory.count(item_id) == 1:
+        game_state.inventory_index.add(item_id)
+
+# Remove an item from the player's inventory, keeping the target index in step
+def remove_from_inventory(game_state, item_id):
+    inventory = game_state.player['inventory']
+    inventory.remove(item_id)
+    if game_state.inventory_index is not None and not inventory.has(item_id):
+        game_state.inventory_index.remove(item_id)
+
+# Index for resolving what the player typed against their inventory
+def inventory_index(game_state, items):
+    if game_state.inventory_index is None:
+        game_state.inventory_index = TargetIndex(game_state.player['inventory'], items)
+    return game_state.inventory_index
 
 # Items in the game
 class Item:
+    __slots__ = ("name", "description", "item_type", "value")
+    
     def __init__(self, name, description, item_type, value):
         self.name = name
         self.description = description
@@ -55,12 +116,15 @@ def create_game_items():
 
 # Create enemies
 class Enemy:
-    def __init__(self, name, description, health, damage, loot=None):
+    __slots__ = ("name", "description", "health", "damage", "loot", "respawn")
+    
+    def __init__(self, name, description, health, damage, loot=None, respawn=None):
         self.name = name
         self.description = description
         self.health = health
         self.damage = damage
         self.loot = loot if loot else []
+        self.respawn = respawn  # minutes until a defeated one returns; None if it stays dead
 
 # Define locations in the game
 def create_game_world():
@@ -73,12 +137,167 @@ def create_game_world():
             "npcs": ["village_elder", "farmer", "merchant"],
             "items": ["village_map"]
         },
-        # ... (rest of the locations)
+        "village_inn": {
+            "name": "The Drunken Dragon Inn",
+            "description": "A cozy inn with a warm fireplace and the smell of stew in the air.",
+            "connections": ["village"],
+            "enemies": [],
+            "npcs": ["innkeeper", "traveler"],
+            "items": ["health_potion"]
+        },
+        "blacksmith": {
+            "name": "Grimforge Smithy",
+            "description": "The village blacksmith's shop, filled with weapons and the sound of hammering.",
+            "connections": ["village"],
+            "enemies": [],
+            "npcs": ["blacksmith"],
+            "items": ["iron_sword", "leather_armor"]
+        },
+        "village_square": {
+            "name": "Village Square",
+            "description": "The central gathering place, with a fountain and market stalls.",
+            "connections": ["village", "east_road"],
+            "enemies": [],
+            "npcs": ["village_guard", "merchant"],
+            "items": []
+        },
+        "forest_path": {
+            "name": "Forest Path",
+            "description": "A winding path leading into the dense forest.",
+            "connections": ["village", "deep_forest", "forest_clearing"],
+            "enemies": ["wolf"],
+            "npcs": [],
+            "items": []
+        },
+        "deep_forest": {
+            "name": "Deep Forest",
+            "description": "The thick canopy blocks most of the sunlight, creating an eerie atmosphere.",
+            "connections": ["forest_path", "ancient_ruins"],
+            "enemies": ["wolf", "bandit"],
+            "npcs": [],
+            "items": ["health_potion"]
+        },
+        "forest_clearing": {
+            "name": "Forest Clearing",
+            "description": "A peaceful clearing bathed in sunlight, with wildflowers growing.",
+            "connections": ["forest_path", "hermit_hut"],
+            "enemies": [],
+            "npcs": ["wandering_bard"],
+            "items": []
+        },
+        "hermit_hut": {
+            "name": "Hermit's Hut",
+            "description": "A small, secluded hut made of branches and mud, covered in moss.",
+            "connections": ["forest_clearing"],
+            "enemies": [],
+            "npcs": ["hermit"],
+            "items": ["ancient_amulet"]
+        },
+        "ancient_ruins": {
+            "name": "Ancient Ruins",
+            "description": "Crumbling stone structures from a forgotten civilization.",
+            "connections": ["deep_forest", "hidden_chamber"],
+            "enemies": ["skeleton"],
+            "npcs": [],
+            "items": []
+        },
+        "hidden_chamber": {
+            "name": "Hidden Chamber",
+            "description": "A secret room within the ruins, untouched for centuries.",
+            "connections": ["ancient_ruins"],
+            "enemies": ["skeleton_mage"],
+            "npcs": [],
+            "items": ["enchanted_blade", "greater_health_potion"]
+        },
+        "east_road": {
+            "name": "East Road",
+            "description": "A wide dirt road leading east from the village.",
+            "connections": ["village_square", "crossroads", "abandoned_mines"],
+            "enemies": ["bandit"],
+            "npcs": ["traveling_merchant"],
+            "items": []
+        },
+        "crossroads": {
+            "name": "Crossroads",
+            "description": "A junction where several paths meet, marked by a weathered signpost.",
+            "connections": ["east_road", "castle_road"],
+            "enemies": ["bandit"],
+            "npcs": [],
+            "items": []
+        },
+        "abandoned_mines": {
+            "name": "Abandoned Mines",
+            "description": "The entrance to old mines, dark and foreboding.",
+            "connections": ["east_road", "mine_depths"],
+            "enemies": ["giant_rat"],
+            "npcs": [],
+            "items": ["mine_key"]
+        },
+        "mine_depths": {
+            "name": "Mine Depths",
+            "description": "Deep tunnels carved into the mountain, filled with danger.",
+            "connections": ["abandoned_mines", "treasure_chamber"],
+            "enemies": ["giant_rat", "kobold"],
+            "requires_item": "mine_key",
+            "npcs": [],
+            "items": ["health_potion"]
+        },
+        "treasure_chamber": {
+            "name": "Treasure Chamber",
+            "description": "A hidden room in the mines, containing forgotten riches.",
+            "connections": ["mine_depths"],
+            "enemies": ["mine_guardian"],
+            "npcs": [],
+            "items": ["chainmail", "castle_key", "greater_health_potion"]
+        },
+        "castle_road": {
+            "name": "Castle Road",
+            "description": "A grand paved road leading to the castle on the hill.",
+            "connections": ["crossroads", "castle_gates"],
+            "enemies": ["castle_guard"],
+            "npcs": [],
+            "items": []
+        },
+        "castle_gates": {
+            "name": "Castle Gates",
+            "description": "Massive iron gates marking the entrance to the royal castle.",
+            "connections": ["castle_road", "castle_courtyard"],
+            "enemies": ["royal_guard"],
+            "requires_item": "castle_key",
+            "npcs": [],
+            "items": []
+        },
+        "castle_courtyard": {
+            "name": "Castle Courtyard",
+            "description": "An elegant courtyard with statues and well-kept gardens.",
+            "connections": ["castle_gates", "castle_hall"],
+            "enemies": ["royal_guard"],
+            "npcs": [],
+            "items": ["knight_armor"]
+        },
+        "castle_hall": {
+            "name": "Castle Great Hall",
+            "description": "The grand hall of the castle, with high ceilings and tapestries.",
+            "connections": ["castle_courtyard", "throne_room"],
+            "enemies": ["elite_guard"],
+            "npcs": ["castle_steward"],
+            "items": []
+        },
+        "throne_room": {
+            "name": "Throne Room",
+            "description": "The opulent throne room, where the final confrontation awaits.",
+            "connections": ["castle_hall"],
+            "enemies": ["dark_knight"],
+            "npcs": [],
+            "items": []
+        }
     }
     return world
 
 # Create NPCs
 class NPC:
+    __slots__ = ("name", "description", "dialogue", "trades", "quest")
+    
     def __init__(self, name, description, dialogue, trades=None, quest=None):
         self.name = name
         self.description = description
@@ -104,7 +323,95 @@ def create_game_npcs():
                 "reward": "greater_health_potion"
             }
         ),
-        # ... (rest of the NPCs)
+        "blacksmith": NPC(
+            "Gorn Ironhammer", 
+            "A burly man with massive arms and a soot-covered apron.",
+            {
+                "greeting": "Need some steel, do ya? I've got the finest blades in the region.",
+                "shop": "Take a look at my wares. Quality guaranteed or your money back!",
+                "quest": "If you're heading to the mines, be careful. My brother went there and never returned."
+            },
+            trades=[
+                {"give": "iron_sword", "cost": 50},
+                {"give": "leather_armor", "cost": 40}
+            ]
+        ),
+        "farmer": NPC(
+            "Farmer Bram",
+            "A weathered man leaning on a pitchfork, his boots caked in mud.",
+            {
+                "greeting": "Wolves took two of my sheep last week. Nobody goes down the forest path after dark anymore."
+            }
+        ),
+        "merchant": NPC(
+            "Lysa the Merchant",
+            "A sharp-eyed woman behind a stall of bottles and bundles.",
+            {
+                "greeting": "Potions, bandages, a little luck in a bottle. Everything an adventurer needs!"
+            },
+            trades=[
+                {"give": "health_potion", "cost": 20}
+            ]
+        ),
+        "innkeeper": NPC(
+            "Marta Hollis",
+            "The stout, cheerful owner of the Drunken Dragon.",
+            {
+                "greeting": "Come in out of the cold! Sit by the fire, the stew's nearly ready."
+            }
+        ),
+        "traveler": NPC(
+            "Weary Traveler",
+            "A dusty stranger nursing a mug of ale in the corner.",
+            {
+                "greeting": "I came up the castle road. Whatever sits on the throne now, it isn't the king."
+            }
+        ),
+        "village_guard": NPC(
+            "Guard Aldric",
+            "A village guard in a dented helmet, watching the east road.",
+            {
+                "greeting": "Bandits have been working the east road. Keep your blade close if you head that way."
+            }
+        ),
+        "wandering_bard": NPC(
+            "Wandering Bard",
+            "A cheerful bard in a patched cloak, tuning a lute.",
+            {
+                "greeting": "They say the old hermit keeps something of the royal line hidden in his hut. Makes a fine song, doesn't it?"
+            }
+        ),
+        "hermit": NPC(
+            "Old Hermit",
+            "A stooped old man with a tangled beard and piercing eyes.",
+            {
+                "greeting": "Few find their way here. Perhaps the forest meant for you to come.",
+                "quest": "That amulet belonged to the royal family. Take it to the castle before the darkness spreads."
+            },
+            quest={
+                "name": "The Royal Amulet",
+                "description": "Find the ancient amulet and bring it to the castle to help stop the darkness.",
+                "reward": "enchanted_blade"
+            }
+        ),
+        "traveling_merchant": NPC(
+            "Traveling Merchant",
+            "A merchant with a heavily laden mule and a wide-brimmed hat.",
+            {
+                "greeting": "Rare goods from distant lands! Prices are fair, mostly."
+            },
+            trades=[
+                {"give": "greater_health_potion", "cost": 60},
+                {"give": "chainmail", "cost": 90}
+            ]
+        ),
+        "castle_steward": NPC(
+            "Steward Edric",
+            "The castle's steward, pale and trembling but still at his post.",
+            {
+                "greeting": "You made it past the guards? Then there may be hope. The Dark Knight waits in the throne room."
+            }
+        )
     }
     return npcs
 
@@ -115,56 +422,208 @@ def create_game_enemies():
             "Wolf", 
             "A fierce wolf with matted gray fur and sharp teeth.",
             20, 8, 
-            loot=["health_potion"]
+            loot=["health_potion"],
+            respawn=120
+        ),
+        "bandit": Enemy(
+            "Bandit",
+            "A rough-looking thug armed with a crude weapon.",
+            30, 10,
+            loot=["health_potion", "rusty_sword"],
+            respawn=180
+        ),
+        "skeleton": Enemy(
+            "Skeleton",
+            "A reanimated skeleton clutching a rusty blade.",
+            25, 12,
+            loot=["health_potion"],
+            respawn=240
         ),
-        # ... (rest of the enemies)
+        "skeleton_mage": Enemy(
+            "Skeleton Mage",
+            "A skeleton wearing tattered robes, emanating dark magic.",
+            40, 15,
+            loot=["greater_health_potion"]
+        ),
+        "giant_rat": Enemy(
+            "Giant Rat",
+            "An unusually large rat with glowing red eyes.",
+            15, 5,
+            loot=[],
+            respawn=60
+        ),
+        "kobold": Enemy(
+            "Kobold",
+            "A small, reptilian humanoid carrying makeshift weapons.",
+            20, 7,
+            loot=["health_potion"],
+            respawn=120
+        ),
+        "mine_guardian": Enemy(
+            "Mine Guardian",
+            "A massive construct of stone and metal, guarding ancient treasures.",
+            60, 15,
+            loot=["greater_health_potion"]
+        ),
+        "castle_guard": Enemy(
+            "Corrupted Guard",
+            "A guard with glowing red eyes, no longer serving the kingdom.",
+            35, 12,
+            loot=["health_potion"],
+            respawn=240
+        ),
+        "royal_guard": Enemy(
+            "Royal Guard",
+            "An elite guard wearing ornate armor, corrupted by dark magic.",
+            45, 14,
+            loot=["health_potion"],
+            respawn=300
+        ),
+        "elite_guard": Enemy(
+            "Elite Royal Guard",
+            "A powerful guard captain with enchanted weapons and armor.",
+            55, 16,
+            loot=["greater_health_potion"]
+        ),
+        "dark_knight": Enemy(
+            "Dark Knight",
+            "A towering figure in black armor, emanating dark power.",
+            100, 20,
+            loot=["enchanted_blade", "knight_armor"]
+        )
     }
     return enemies
 
+# Terminal output: clears the screen and types text out character by character
+class TypewriterSink:
+    def write(self, text, delay=0):
+        if not delay:
+            print(text)
+            return
+        for char in text:
+            print(char, end='', flush=True)
+            time.sleep(delay)
+        print()
+    
+    def clear(self):
+        os.system('cls' if os.name == 'nt' else 'clear')
+
+# Collects output lines instead of printing them, for the web server.
+# Each line keeps the delay it was written with so a client can pace it.
+class BufferedSink:
+    def __init__(self):
+        self.lines = []  # (text, delay) pairs
+    
+    def write(self, text, delay=0):
+        self.lines.append((text, delay))
+    
+    def clear(self):
+        pass
+    
+    def text(self):
+        return "\n".join(text for text, delay in self.lines)
+
+# Throws output away, for replaying commands nobody will read
+class NullSink:
+    def write(self, text, delay=0):
+        pass
+    
+    def clear(self):
+        pass
+
+# The sink the engine writes to. A context variable, so every server
+# thread can capture its own output while the terminal keeps the default.
+output_sink = contextvars.ContextVar("output_sink", default=TypewriterSink())
+
+# Send everything the engine writes inside the block to sink
+@contextmanager
+def capture_output(sink=None):
+    sink = sink if sink is not None else BufferedSink()
+    token = output_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        output_sink.reset(token)
+
 # Game function to clear the screen
 def clear_screen():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    output_sink.get().clear()
 
 # Typewriter effect for text
 def print_slow(text, delay=0.03):
-    for char in text:
-        print(char, end='', flush=True)
-        time.sleep(delay)
-    print()
+    output_sink.get().write(text, delay)
+
+# Write a line without the typewriter effect
+def say(text=""):
+    output_sink.get().write(text)
 
 # Display game header
 def display_header(game_state):
     clear_screen()
-    print("=" * 80)
-    print(f"ADVENTURES OF {game_state.player['name'].upper()}")
-    print(f"Health: {game_state.player['health']}/{game_state.player['max_health']} | " +
+    say("=" * 80)
+    say(f"ADVENTURES OF {game_state.player['name'].upper()}")
+    say(f"Health: {game_state.player['health']}/{game_state.player['max_health']} | " +
           f"Location: {game_state.current_location} | " +
           f"Time: {game_state.game_time // 60}h {game_state.game_time % 60}m")
-    print("=" * 80)
-    print()
+    say("=" * 80)
+    say()
 
 # Start a new game
 def new_game():
-    game_state = GameState()
-    
     clear_screen()
     print_slow("Welcome to ADVENTURE QUEST!", 0.05)
     print_slow("A text-based adventure game full of exploration and danger.", 0.03)
-    print()
+    say()
     
     name = input("Enter your character's name: ")
-    game_state.player["name"] = name if name else "Adventurer"
+    game_state = start_game_state(name)
     
     print_slow(f"\nWelcome, {game_state.player['name']}! Your adventure begins in the village of Oakvale.")
     time.sleep(1)
     
+    return game_state
+
+# Create a fresh character without prompting (used by the web server)
+def start_game_state(name=""):
+    game_state = GameState()
+    game_state.player["name"] = name if name else "Adventurer"
+    # Players know their way back to where they started, whether or not it
+    # has been displayed yet (web sessions start without a look)
+    game_state.visited_locations.add(game_state.current_location)
+    
     # Give the player some starting items
-    game_state.player["inventory"].append("rusty_sword")
+    add_to_inventory(game_state, "rusty_sword")
     game_state.player["equipped_weapon"] = "rusty_sword"
-    game_state.player["inventory"].append("health_potion")
+    add_to_inventory(game_state, "health_potion")
     
     return game_state
 
+# Content shared by every game in the process. Games read the world through
+# their own WorldOverlay and never change the catalogs, so a new game only
+# allocates its per-player parts.
+class ContentTemplate:
+    __slots__ = ("world", "items", "npcs", "enemies")
+    
+    def __init__(self, world, items, npcs, enemies):
+        self.world = world  # FrozenWorld
+        self.items = items
+        self.npcs = npcs
+        self.enemies = enemies
+    
+    # A fresh world for one game
+    def new_world(self):
+        return WorldOverlay(self.world)
+
+_builtin_content = None
+
+# The built-in content, built on first use and kept for the life of the process
+def builtin_content():
+    global _builtin_content
+    if _builtin_content is None:
+        _builtin_content = ContentTemplate(FrozenWorld(create_game_world()), create_game_items(),
+                                           create_game_npcs(), create_game_enemies())
+    return _builtin_content
+
 # Display location information
 def display_location(game_state, world, npcs, enemies_dict):
     location = world[game_state.current_location]
@@ -175,38 +634,41 @@ def display_location(game_state, world, npcs, enemies_dict):
         print_slow(location['description'], 0.03)
         game_state.visited_locations.add(game_state.current_location)
     else:
-        print(f"You are at {location['name']}.")
-        print(location['description'])
+        say(f"You are at {location['name']}.")
+        say(location['description'])
     
-    print("\nYou can go to:")
+    say("\nYou can go to:")
     for connection in location['connections']:
         connected_location = world[connection]
         # Check if this connection requires an item
-        if 'requires_item' in connected_location and connected_location['requires_item'] not in game_state.player['inventory']:
-            print(f"- {connected_location['name']} (locked)")
+        if 'requires_item' in connected_location and not game_state.player['inventory'].has(connected_location['requires_item']):
+            say(f"- {connected_location['name']} (locked)")
         else:
-            print(f"- {connected_location['name']}")
+            say(f"- {connected_location['name']}")
     
     if location['npcs']:
-        print("\nPeople here:")
+        say("\nPeople here:")
         for npc_id in location['npcs']:
             npc = npcs.get(npc_id)
             if npc:
-                print(f"- {npc.name} ({npc_id})")
+                say(f"- {npc.name} ({npc_id})")
     
     if location['enemies']:
-        print("\nEnemies here:")
+        say("\nEnemies here:")
         for enemy_id in location['enemies']:
             enemy = enemies_dict.get(enemy_id)
             if enemy:
-                print(f"- {enemy.name}")
+                say(f"- {enemy.name}")
     
     if location['items']:
-        print("\nItems here:")
+        say("\nItems here:")
         for item_id in location['items']:
-            print(f"- {item_id}")
+            say(f"- {item_id}")
     
-    print("\nWhat would you like to do?")
+    say("\nWhat would you like to do?")
+
+# Registry of every command the player can type
+COMMANDS = CommandRegistry()
 
 # Process player command
 def process_command(command, game_state, world, items, npcs, enemies_dict):
@@ -219,440 +681,449 @@ def process_command(command, game_state, world, items, npcs, enemies_dict):
     action = words[0]
     target = " ".join(words[1:]) if len(words) > 1 else ""
     
-    current_location = world.get(game_state.current_location)
-    
-    if current_location is None:
+    if game_state.current_location not in world:
         return "Invalid location."
-
-    # Movement commands
-    if action in ["go", "move", "travel"]:
-        for connection in current_location.get('connections', []):
-            connected_location = world[connection]
-            if target.lower() in connection.lower() or target.lower() in connected_location['name'].lower():
-                # Check if location requires an item
-                if 'requires_item' in connected_location:
-                    required_item = connected_location['requires_item']
-                    if required_item not in game_state.player['inventory']:
-                        print_slow(f"You need a {required_item.replace('_', ' ')} to enter {connected_location['name']}.")
-                        return
-                
-                game_state.current_location = connection
-                game_state.game_time += 10  # Travel takes time
-                return
-        print_slow("You can't go there from here.")
-    
-    # Look command
-    elif action in ["look", "examine"]:
-        if not target:
-            print_slow(current_location['description'])
+    
+    if game_state.combat is not None:
+        return combat_command(command, game_state, world, items, enemies_dict)
+    
+    verb = COMMANDS.resolve(action)
+    if verb is None:
+        candidates = COMMANDS.candidates(action)
+        if candidates:
+            print_slow(f"Did you mean: {', '.join(candidates)}?")
         else:
-            for item_id in current_location['items']:
-                if target.lower() in item_id.lower() or (item_id in items and target.lower() in items[item_id].name.lower()):
-                    if item_id in items:
-                        print_slow(f"{items[item_id].name}: {items[item_id].description}")
-                        return
-            
-            for npc_id in current_location['npcs']:
-                if target.lower() in npc_id.lower() or (npc_id in npcs and target.lower() in npcs[npc_id].name.lower()):
-                    if npc_id in npcs:
-                        print_slow(f"{npcs[npc_id].name}: {npcs[npc_id].description}")
-                        return
-            
-            for enemy_id in current_location['enemies']:
-                if target.lower() in enemy_id.lower() or (enemy_id in enemies_dict and target.lower() in enemies_dict[enemy_id].name.lower()):
-                    if enemy_id in enemies_dict:
-                        print_slow(f"{enemies_dict[enemy_id].name}: {enemies_dict[enemy_id].description}")
-                        return
+            print_slow("I don't understand that command. Type 'help' for a list of commands.")
+        return
+    
+    return COMMANDS.handlers[verb](target, game_state, world, items, npcs, enemies_dict)
+
+# The verb process_command will run for a command: "combat" during a fight,
+# otherwise the resolved verb, or None if nothing matches. For metrics.
+def command_verb(command, game_state):
+    if game_state.combat is not None:
+        return "combat"
+    words = command.split(None, 1)
+    return COMMANDS.resolve(words[0].lower()) if words else None
+
+# Run one command the way the web server does: the command itself, then a
+# look at the new location if the player moved. Journal replay goes through
+# here too, so both paths change the game state identically.
+def play_command(command, game_state, world, items, npcs, enemies_dict):
+    previous_location = game_state.current_location
+    result = process_command(command, game_state, world, items, npcs, enemies_dict)
+    if result != "quit" and game_state.player['health'] > 0:
+        run_timers(game_state, world)
+        if game_state.current_location != previous_location:
+            display_location(game_state, world, npcs, enemies_dict)
+    return result
+
+# What a pending timer does when it comes due, by kind. Handlers are called
+# as handler(game_state, world, due, now, *args): due is the game time the
+# timer was set for, now the time being caught up to, which may be hours later.
+TIMERS = {}
+
+def timer(kind):
+    def register(handler):
+        TIMERS[kind] = handler
+        return handler
+    return register
+
+# Set a timer for game time `due`
+def schedule(game_state, due, kind, *args):
+    if game_state.timers is None:
+        game_state.timers = TimerWheel(game_state.game_time)
+    game_state.timers.schedule(due, (kind,) + args)
+
+# Bring time-driven effects up to the current game time. This runs after a
+# command instead of on a clock, so a session nobody is playing costs
+# nothing, and however long it has been, each pending timer fires once.
+def run_timers(game_state, world):
+    if game_state.combat is not None:
+        return  # caught up once the fight is over
+    player = game_state.player
+    if player['health'] < player['max_health'] and not (game_state.timers and game_state.timers.scheduled("regen")):
+        schedule(game_state, (game_state.game_time // REGEN_INTERVAL + 1) * REGEN_INTERVAL, "regen")
+    timers = game_state.timers
+    if timers is not None:
+        for due, event in timers.advance(game_state.game_time):
+            TIMERS[event[0]](game_state, world, due, game_state.game_time, *event[1:])
+
+# Minutes of game time per point of health regained
+REGEN_INTERVAL = 10
+
+# Heal one point for every interval that has passed since the timer was due
+@timer("regen")
+def regen_timer(game_state, world, due, now):
+    player = game_state.player
+    intervals = (now - due) // REGEN_INTERVAL + 1
+    player['health'] = min(player['health'] + intervals, player['max_health'])
+    if player['health'] < player['max_health']:
+        schedule(game_state, due + intervals * REGEN_INTERVAL, "regen")
+
+# A defeated enemy returns to where it was
+@timer("respawn")
+def respawn_timer(game_state, world, due, now, location_id, enemy_id):
+    world.restore(location_id, 'enemies', enemy_id)
+
+# Movement commands
+@COMMANDS.command("go", "move", usage="[location]", description="Move to a connected location")
+def go_command(target, game_state, world, items, npcs, enemies_dict):
+    current_location = world[game_state.current_location]
+    for connection in current_location['connections']:
+        connected_location = world[connection]
+        if target.lower() in connection.lower() or target.lower() in connected_location['name'].lower():
+            # Check if location requires an item
+            if 'requires_item' in connected_location:
+                required_item = connected_location['requires_item']
+                if not game_state.player['inventory'].has(required_item):
+                    print_slow(f"You need a {required_item.replace('_', ' ')} to enter {connected_location['name']}.")
+                    return
+                world.unlock(connection)
             
-            print_slow("You don't see that here.")
-    
-    # Take command
-    elif action in ["take", "get", "pickup"]:
-        for item_id in current_location['items'][:]:  # Create a copy to safely modify the original
-            if target.lower() in item_id.lower() or (item_id in items and target.lower() in items[item_id].name.lower()):
-                current_location['items'].remove(item_id)
-                game_state.player['inventory'].append(item_id)
-                if item_id in items:
-                    print_slow(f"You picked up {items[item_id].name}.")
-                else:
-                    print_slow(f"You picked up {item_id.replace('_', ' ')}.")
-                return
+            game_state.current_location = connection
+            game_state.game_time += 10  # Travel takes time
+            publish(game_state, LOCATION_ENTERED, connection)
+            return
+    print_slow("You can't go there from here.")
+
+# Travel command: follow the shortest route to a place visited before,
+# one hop at a time, opening any gates the player has the keys for
+@COMMANDS.command("travel", usage="[location]", description="Travel to a place you have been before")
+def travel_command(target, game_state, world, items, npcs, enemies_dict):
+    destination = find_visited_location(target, game_state, world)
+    if destination is None:
+        print_slow("You don't know the way there.")
+        return
+    if destination == game_state.current_location:
+        print_slow(f"You are already at {world[destination]['name']}.")
+        return
+    
+    graph = route_graph(world)
+    path = graph.route(game_state.current_location, destination,
+                       graph.key(game_state.player['inventory'], world.unlocked))
+    if path is None:
+        print_slow(f"You can't find a way to {world[destination]['name']} from here.")
+        return
+    
+    for location_id in path[1:]:
+        if 'requires_item' in world[location_id]:
+            world.unlock(location_id)
+        game_state.current_location = location_id
+        game_state.visited_locations.add(location_id)
+        game_state.game_time += 10  # Travel takes time
+    hops = len(path) - 1
+    print_slow(f"You travel to {world[destination]['name']} ({hops} {'step' if hops == 1 else 'steps'}, {hops * 10} minutes).")
+    for location_id in path[1:]:
+        publish(game_state, LOCATION_ENTERED, location_id)
+
+# The visited location target names: an exact id or name first, then the
+# first partial match. Sorted so replaying a journal picks the same one.
+def find_visited_location(target, game_state, world):
+    target = target.strip().lower()
+    if not target:
+        return None
+    exact_id = target.replace(" ", "_")
+    if exact_id in game_state.visited_locations:
+        return exact_id
+    partial = None
+    for location_id in sorted(game_state.visited_locations):
+        if location_id not in world:
+            continue
+        name = world[location_id]['name'].lower()
+        if name == target:
+            return location_id
+        if partial is None and (target in location_id or target in name):
+            partial = location_id
+    return partial
+
+# Look command
+@COMMANDS.command("look", "examine", usage="[object/person]", description="Look at something or someone")
+def look_command(target, game_state, world, items, npcs, enemies_dict):
+    current_location = world[game_state.current_location]
+    if not target:
+        print_slow(current_location['description'])
+        return
+    
+    for key, catalog in (('items', items), ('npcs', npcs), ('enemies', enemies_dict)):
+        entity_id = world.index(game_state.current_location, key, catalog).resolve(target)
+        if entity_id in catalog:
+            print_slow(f"{catalog[entity_id].name}: {catalog[entity_id].description}")
+            return
+    
+    print_slow("You don't see that here.")
+
+# Take command
+@COMMANDS.command("take", "get", "pickup", usage="[item]", description="Pick up an item")
+def take_command(target, game_state, world, items, npcs, enemies_dict):
+    item_id = world.index(game_state.current_location, 'items', items).resolve(target)
+    if item_id is None:
         print_slow("You don't see that here.")
+        return
+    
+    world.remove(game_state.current_location, 'items', item_id)
+    add_to_inventory(game_state, item_id)
+    if item_id in items:
+        print_slow(f"You picked up {items[item_id].name}.")
+    else:
+        print_slow(f"You picked up {item_id.replace('_', ' ')}.")
+    publish(game_state, ITEM_ACQUIRED, item_id)
+
+# Inventory command
+@COMMANDS.command("inventory", "i", "items", description="Check your inventory")
+def inventory_command(target, game_state, world, items, npcs, enemies_dict):
+    if not game_state.player['inventory']:
+        print_slow("Your inventory is empty.")
+        return
     
-    # Inventory command
-    elif action in ["inventory", "i", "items"]:
-        if not game_state.player['inventory']:
-            print_slow("Your inventory is empty.")
+    print_slow("You are carrying:")
+    for item_id, count in game_state.player['inventory'].items():
+        stack = f" x{count}" if count > 1 else ""
+        if item_id in items:
+            equipped = ""
+            if game_state.player['equipped_weapon'] == item_id:
+                equipped = " (equipped weapon)"
+            elif game_state.player['equipped_armor'] == item_id:
+                equipped = " (equipped armor)"
+            say(f"- {items[item_id].name}{stack}{equipped}")
         else:
-            print_slow("You are carrying:")
-            for item_id in game_state.player['inventory']:
-                if item_id in items:
-                    equipped = ""
-                    if game_state.player['equipped_weapon'] == item_id:
-                        equipped = " (equipped weapon)"
-                    elif game_state.player['equipped_armor'] == item_id:
-                        equipped = " (equipped armor)"
-                    print(f"- {items[item_id].name}{equipped}")
-                else:
-                    print(f"- {item_id.replace('_', ' ')}")
-    
-    # Equip command
-    elif action in ["equip", "wear", "wield"]:
-        for item_id in game_state.player['inventory']:
-            if target.lower() in item_id.lower() or (item_id in items and target.lower() in items[item_id].name.lower()):
-                if item_id in items:
-                    if items[item_id].item_type == "weapon":
-                        game_state.player['equipped_weapon'] = item_id
-                        print_slow(f"You equipped {items[item_id].name} as your weapon.")
-                    elif items[item_id].item_type == "armor":
-                        game_state.player['equipped_armor'] = item_id
-                        print_slow(f"You equipped {items[item_id].name} as your armor.")
-                    else:
-                        print_slow(f"You can't equip {items[item_id].name}.")
-                return
+            say(f"- {item_id.replace('_', ' ')}{stack}")
+
+# Equip command
+@COMMANDS.command("equip", "wear", "wield", usage="[item]", description="Equip a weapon or armor")
+def equip_command(target, game_state, world, items, npcs, enemies_dict):
+    item_id = inventory_index(game_state, items).resolve(target)
+    if item_id is None:
         print_slow("You don't have that item.")
+        return
     
-    # Use command
-    elif action in ["use", "drink", "consume"]:
-        for item_id in game_state.player['inventory'][:]:  # Create a copy to safely modify
-            if target.lower() in item_id.lower() or (item_id in items and target.lower() in items[item_id].name.lower()):
-                if item_id in items:
-                    if items[item_id].item_type == "potion":
-                        game_state.player['inventory'].remove(item_id)
-                        heal_amount = items[item_id].value
-                        game_state.player['health'] = min(game_state.player['health'] + heal_amount, game_state.player['max_health'])
-                        print_slow(f"You used {items[item_id].name} and recovered {heal_amount} health points.")
-                    else:
-                        print_slow(f"You can't use {items[item_id].name} that way.")
-                return
+    if item_id in items:
+        if items[item_id].item_type == "weapon":
+            game_state.player['equipped_weapon'] = item_id
+            print_slow(f"You equipped {items[item_id].name} as your weapon.")
+        elif items[item_id].item_type == "armor":
+            game_state.player['equipped_armor'] = item_id
+            print_slow(f"You equipped {items[item_id].name} as your armor.")
+        else:
+            print_slow(f"You can't equip {items[item_id].name}.")
+
+# Use command
+@COMMANDS.command("use", "drink", "consume", usage="[item]", description="Use an item like a potion")
+def use_command(target, game_state, world, items, npcs, enemies_dict):
+    item_id = inventory_index(game_state, items).resolve(target)
+    if item_id is None:
         print_slow("You don't have that item.")
+        return
     
-    # Talk command
-    elif action in ["talk", "speak"]:
-        for npc_id in current_location['npcs']:
-            if target.lower() in npc_id.lower() or (npc_id in npcs and target.lower() in npcs[npc_id].name.lower()):
-                if npc_id in npcs:
-                    npc = npcs[npc_id]
-                    print_slow(f"{npc.name}: \"{npc.dialogue['greeting']}\"")
-                    
-                    # Check if NPC has a quest
-                    if npc.quest:
-                        print_slow(f"\n{npc.name} has a quest for you: {npc.quest['name']}")
-                        print_slow(npc.quest['description'])
-                        
-                        # Quest logic would go here
-                    
-                    # Check if NPC has trades
-                    if npc.trades:
-                        print_slow(f"\n{npc.name} can trade with you:")
-                        for trade in npc.trades:
-                            print(f"- {items[trade['give']].name} (costs {trade['cost']} gold)")
-                return
+    if item_id in items:
+        if items[item_id].item_type == "potion":
+            remove_from_inventory(game_state, item_id)
+            heal_amount = items[item_id].value
+            game_state.player['health'] = min(game_state.player['health'] + heal_amount, game_state.player['max_health'])
+            print_slow(f"You used {items[item_id].name} and recovered {heal_amount} health points.")
+        else:
+            print_slow(f"You can't use {items[item_id].name} that way.")
+
+# Talk command
+@COMMANDS.command("talk", "speak", usage="[person]", description="Talk to an NPC")
+def talk_command(target, game_state, world, items, npcs, enemies_dict):
+    npc_id = world.index(game_state.current_location, 'npcs', npcs).resolve(target)
+    if npc_id is None:
         print_slow("There's no one by that name here.")
+        return
     
-    # Attack command
-    elif action in ["attack", "fight"]:
-        for enemy_id in current_location['enemies'][:]:  # Create a copy to safely modify
-            if target.lower() in enemy_id.lower() or (enemy_id in enemies_dict and target.lower() in enemies_dict[enemy_id].name.lower()):
-                if enemy_id in enemies_dict:
-                    enemy = enemies_dict[enemy_id]
-                    enhanced_combat(game_state, enemy, current_location, enemy_id, items)
-                return
+    if npc_id in npcs:
+        npc = npcs[npc_id]
+        print_slow(f"{npc.name}: \"{npc.dialogue['greeting']}\"")
+        
+        # Check if NPC has a quest
+        if npc.quest:
+            print_slow(f"\n{npc.name} has a quest for you: {npc.quest['name']}")
+            print_slow(npc.quest['description'])
+            
+            # Quest logic would go here
+        
+        # Check if NPC has trades
+        if npc.trades:
+            print_slow(f"\n{npc.name} can trade with you:")
+            for trade in npc.trades:
+                say(f"- {items[trade['give']].name} (costs {trade['cost']} gold)")
+
+# Attack command
+@COMMANDS.command("attack", "fight", usage="[enemy]", description="Attack an enemy")
+def attack_command(target, game_state, world, items, npcs, enemies_dict):
+    enemy_id = world.index(game_state.current_location, 'enemies', enemies_dict).resolve(target)
+    if enemy_id is None:
         print_slow("There's no enemy by that name here.")
+        return
     
-    # Help command
-    elif action in ["help", "commands"]:
-        print_slow("Available commands:")
-        print_slow("- go/move/travel [location]: Move to a connected location")
-        print_slow("- look/examine [object/person]: Look at something or someone")
-        print_slow("- take/get/pickup [item]: Pick up an item")
-        print_slow("- inventory/i/items: Check your inventory")
-        print_slow("- equip/wear/wield [item]: Equip a weapon or armor")
-        print_slow("- use/drink/consume [item]: Use an item like a potion")
-        print_slow("- talk/speak [person]: Talk to an NPC")
-        print_slow("- attack/fight [enemy]: Attack an enemy")
-        print_slow("- help/commands: Show this help message")
-        print_slow("- quit/exit: Exit the game")
-    
-    # Quit command
-    elif action in ["quit", "exit"]:
-        return "quit"
+    if enemy_id in enemies_dict:
+        enemy = enemies_dict[enemy_id]
+        enhanced_combat(game_state, enemy, world, enemy_id, items)
+
+# Help command
+@COMMANDS.command("help", "commands", description="Show this help message")
+def help_command(target, game_state, world, items, npcs, enemies_dict):
+    print_slow("Available commands:")
+    for verbs, usage, description in COMMANDS.help_entries:
+        usage = f" {usage}" if usage else ""
+        print_slow(f"- {'/'.join(verbs)}{usage}: {description}")
+
+# Save command
+@COMMANDS.command("save", description="Save your game")
+def save_command(target, game_state, world, items, npcs, enemies_dict):
+    if game_state.save_path is None:
+        print_slow("This game can't be saved here.")
+        return
+    save_game(game_state, world)
+
+# Quit command
+@COMMANDS.command("quit", "exit", description="Exit the game")
+def quit_command(target, game_state, world, items, npcs, enemies_dict):
+    return "quit"
+
+# Typed input -> combat action, while a fight is on
+COMBAT_ACTIONS = {
+    "1": combat_engine.ATTACK, "attack": combat_engine.ATTACK, "fight": combat_engine.ATTACK,
+    "2": combat_engine.SPECIAL, "special": combat_engine.SPECIAL,
+    "3": combat_engine.DEFEND, "defend": combat_engine.DEFEND,
+    "4": combat_engine.USE_ITEM, "use": combat_engine.USE_ITEM, "drink": combat_engine.USE_ITEM,
+    "5": combat_engine.FLEE, "flee": combat_engine.FLEE, "run": combat_engine.FLEE
+}
+
+# Enhanced combat system: start a fight. Until it ends, the player's
+# commands are combat actions handled by combat_command.
+def enhanced_combat(game_state, enemy, world, enemy_id, items):
+    game_state.combat = combat_engine.new_combat(game_state.player, enemy_id, enemy, items)
+    print_slow(f"You engage in combat with {enemy.name}!")
+    display_combat(game_state, items)
+
+# Show the state of the current fight and the available actions
+def display_combat(game_state, items):
+    combat = game_state.combat
+    say(f"=== COMBAT: TURN {combat.turn} ===")
+    say(f"You: Health {game_state.player['health']}/{game_state.player['max_health']}")
+    say(f"{combat.enemy_name}: Health {max(0, combat.enemy_health)}")
     
-    else:
-        print_slow("I don't understand that command. Type 'help' for a list of commands.")
-
-# Enhanced combat system
-def enhanced_combat(game_state, enemy, location, enemy_id, items):
-    enemy_instance = Enemy(
-        enemy.name,
-        enemy.description,
-        enemy.health,
-        enemy.damage,
-        enemy.loot.copy() if enemy.loot else []
-    )
-    
-    print_slow(f"You engage in combat with {enemy_instance.name}!")
-    
-    player_weapon_damage = 2  # Bare hands
-    if game_state.player['equipped_weapon'] and game_state.player['equipped_weapon'] in items:
-        player_weapon_damage = items[game_state.player['equipped_weapon']].value
-    
-    player_armor = 0
-    if game_state.player['equipped_armor'] and game_state.player['equipped_armor'] in items:
-        player_armor = items[game_state.player['equipped_armor']].value
-    
-    # Combat status effects
-    player_status = {
-        "bleeding": 0,
-        "poisoned": 0,
-        "strengthened": 0
-    }
+    # Show status effects
+    status_text = ", ".join(f"{status.title()} ({duration})" for status, duration in combat.player_status.items() if duration > 0)
+    if status_text:
+        say(f"Your status: {status_text}")
     
-    enemy_status = {
-        "bleeding": 0,
-        "poisoned": 0,
-        "weakened": 0
-    }
+    enemy_status_text = ", ".join(f"{status.title()} ({duration})" for status, duration in combat.enemy_status.items() if duration > 0)
+    if enemy_status_text:
+        say(f"Enemy status: {enemy_status_text}")
     
-    turn = 1
+    say("\nActions:")
+    say("1. Attack - Basic attack with your weapon")
+    say("2. Special Attack - Stronger attack with a chance to miss")
+    say("3. Defend - Reduce incoming damage this turn")
+    say("4. Use Item - Use a potion or other item")
+    say("5. Flee - Attempt to escape combat")
+
+# The random generator for this turn. A journaled turn carries a seed so it
+# can be replayed; seeding is deferred until something needs randomness,
+# because reseeding costs far more than most commands. The generator itself
+# is a few kilobytes, so sessions that never fight never get one.
+def turn_rng(game_state):
+    if game_state.rng is None:
+        game_state.rng = random.Random()
+    if game_state.rng_seed is not None:
+        game_state.rng.seed(game_state.rng_seed)
+        game_state.rng_seed = None
+    return game_state.rng
+
+# Resolve one combat turn from what the player typed
+def combat_command(command, game_state, world, items, enemies_dict):
+    words = command.split()
+    action = COMBAT_ACTIONS.get(words[0])
+    target = " ".join(words[1:])
+    combat = game_state.combat
     
-    while enemy_instance.health > 0 and game_state.player['health'] > 0:
-        clear_screen()
-        print(f"=== COMBAT: TURN {turn} ===")
-        print(f"You: Health {game_state.player['health']}/{game_state.player['max_health']}")
-        print(f"{enemy_instance.name}: Health {max(0, enemy_instance.health)}")
-        
-        # Show status effects
-        status_text = ""
-        for status, duration in player_status.items():
-            if duration > 0:
-                status_text += f"{status.title()} ({duration}), "
-        if status_text:
-            print(f"Your status: {status_text[:-2]}")
-        
-        enemy_status_text = ""
-        for status, duration in enemy_status.items():
-            if duration > 0:
-                enemy_status_text += f"{status.title()} ({duration}), "
-        if enemy_status_text:
-            print(f"Enemy status: {enemy_status_text[:-2]}")
-        
-        print("\nActions:")
-        print("1. Attack - Basic attack with your weapon")
-        print("2. Special Attack - Stronger attack with a chance to miss")
-        print("3. Defend - Reduce incoming damage this turn")
-        print("4. Use Item - Use a potion or other item")
-        print("5. Flee - Attempt to escape combat")
-        
-        choice = input("\nChoose your action (1-5): ")
-        
-        # Apply status effects at start of turn
-        if player_status["bleeding"] > 0:
-            bleed_damage = random.randint(1, 3)
-            game_state.player['health'] -= bleed_damage
-            print_slow(f"You take {bleed_damage} bleeding damage.")
-            player_status["bleeding"] -= 1
-        
-        if player_status["poisoned"] > 0:
-            poison_damage = random.randint(2, 4)
-            game_state.player['health'] -= poison_damage
-            print_slow(f"You take {poison_damage} poison damage.")
-            player_status["poisoned"] -= 1
-        
-        if enemy_status["bleeding"] > 0:
-            bleed_damage = random.randint(1, 3)
-            enemy_instance.health -= bleed_damage
-            print_slow(f"{enemy_instance.name} takes {bleed_damage} bleeding damage.")
-            enemy_status["bleeding"] -= 1
-        
-        if enemy_status["poisoned"] > 0:
-            poison_damage = random.randint(2, 4)
-            enemy_instance.health -= poison_damage
-            print_slow(f"{enemy_instance.name} takes {poison_damage} poison damage.")
-            enemy_status["poisoned"] -= 1
-        
-        # Check if either combatant died from status effects
-        if game_state.player['health'] <= 0:
-            print_slow("You have been defeated by your wounds!")
-            return
-        
-        if enemy_instance.health <= 0:
-            print_slow(f"Your {player_status} caused {enemy_instance.name} to collapse!")
-            handle_enemy_defeat(game_state, enemy_instance, location, enemy_id, items)
-            return
-        
-        # Player's action
-        defending = False
-        
-        if choice == "1":  # Basic attack
-            print_slow(f"You attack {enemy_instance.name} with your {game_state.player['equipped_weapon'].replace('_', ' ') if game_state.player['equipped_weapon'] else 'fists'}!")
-            
-            # Calculate damage with some randomness and status effects
-            damage_modifier = 1.5 if player_status["strengthened"] > 0 else 1.0
-            player_damage = max(1, int((player_weapon_damage + random.randint(-2, 2)) * damage_modifier))
-            
-            # Apply enemy weakened status
-            if enemy_status["weakened"] > 0:
-                player_damage = int(player_damage * 1.5)
-            
-            enemy_instance.health -= player_damage
-            print_slow(f"You deal {player_damage} damage to {enemy_instance.name}.")
-            
-            # 10% chance to cause bleeding
-            if random.random() < 0.1:
-                enemy_status["bleeding"] = 3
-                print_slow(f"Your attack causes {enemy_instance.name} to bleed!")
-        
-        elif choice == "2":  # Special attack
-            print_slow(f"You prepare a special attack!")
-            
-            # 70% chance to hit, but higher damage
-            if random.random() < 0.7:
-                damage_modifier = 1.5 if player_status["strengthened"] > 0 else 1.0
-                player_damage = max(1, int((player_weapon_damage * 2 + random.randint(-1, 3)) * damage_modifier))
-                
-                # Apply enemy weakened status
-                if enemy_status["weakened"] > 0:
-                    player_damage = int(player_damage * 1.5)
-                
-                enemy_instance.health -= player_damage
-                print_slow(f"Your special attack hits for {player_damage} damage!")
-                
-                # 25% chance to cause bleeding or weaken
-                if random.random() < 0.25:
-                    effect = random.choice(["bleeding", "weakened"])
-                    enemy_status[effect] = 3
-                    print_slow(f"Your special attack causes {enemy_instance.name} to be {effect}!")
-            else:
-                print_slow("Your special attack misses!")
-        
-        elif choice == "3":  # Defend
-            print_slow("You take a defensive stance.")
-            defending = True
-            
-            # 25% chance to gain strength next turn
-            if random.random() < 0.25:
-                player_status["strengthened"] = 2
-                print_slow("You find an opening in the enemy's attack pattern!")
-        
-        elif choice == "4":  # Use item
+    if action is None:
+        print_slow("Choose an action (1-5).")
+        display_combat(game_state, items)
+        return
+    
+    if action == combat_engine.USE_ITEM:
+        item_id = None
+        if target:
+            item_id = inventory_index(game_state, items).resolve(target)
+        elif len(combat.potions) == 1:
+            item_id = next(iter(combat.potions))
+        elif combat.potions:
+            # Several kinds of potion: ask which one, without spending the turn
             print_slow("Your inventory:")
-            usable_items = []
-            
-            for i, item_id in enumerate(game_state.player['inventory']):
-                if item_id in items and items[item_id].item_type == "potion":
-                    print(f"{i+1}. {items[item_id].name}")
-                    usable_items.append(item_id)
-            
-            if not usable_items:
-                print_slow("You don't have any usable items!")
-            else:
-                item_choice = input("Choose an item to use (or 0 to cancel): ")
-                
-                try:
-                    item_index = int(item_choice) - 1
-                    if 0 <= item_index < len(usable_items):
-                        item_id = usable_items[item_index]
-                        game_state.player['inventory'].remove(item_id)
-                        
-                        if "health_potion" in item_id:
-                            heal_amount = items[item_id].value
-                            game_state.player['health'] = min(game_state.player['health'] + heal_amount, game_state.player['max_health'])
-                            print_slow(f"You used {items[item_id].name} and recovered {heal_amount} health points.")
-                        
-                        # Skip enemy turn this round since we used an item
-                        turn += 1
-                        continue
-                except:
-                    print_slow("Invalid choice.")
-        
-        elif choice == "5":  # Flee
-            print_slow("You attempt to flee from combat!")
-            
-            # Calculate flee chance (higher at lower health)
-            flee_chance = 0.4 + (1 - game_state.player['health'] / game_state.player['max_health']) * 0.3
-            
-            if random.random() < flee_chance:
-                print_slow("You successfully escape!")
-                game_state.game_time += 5
-                return
-            else:
-                print_slow("You failed to escape!")
-        
-        # Check if enemy is defeated after player action
-        if enemy_instance.health <= 0:
-            handle_enemy_defeat(game_state, enemy_instance, location, enemy_id, items)
+            for item_id in combat.potions:
+                say(f"- {items[item_id].name}")
+            print_slow("Use which item? (e.g. 'use health potion')")
             return
-        
-        # Enemy's turn
-        print_slow(f"\n{enemy_instance.name} attacks you!")
-        
-        # Calculate enemy damage
-        enemy_damage = max(1, enemy_instance.damage + random.randint(-2, 2) - player_armor)
-        
-        # Reduce damage if defending
-        if defending:
-            enemy_damage = max(1, int(enemy_damage * 0.5))
-            print_slow("Your defensive stance reduces the damage!")
-        
-        # Apply damage
-        game_state.player['health'] -= enemy_damage
-        print_slow(f"{enemy_instance.name} deals {enemy_damage} damage to you.")
-        
-        # Special enemy effects
-        if random.random() < 0.15:  # 15% chance for status effect
-            effect = random.choice(["bleeding", "poisoned"])
-            player_status[effect] = 3
-            print_slow(f"The attack causes you to be {effect}!")
-        
-        # Check if player is defeated
-        if game_state.player['health'] <= 0:
-            print_slow("You have been defeated!")
+        if item_id is not None and item_id not in combat.potions:
+            print_slow(f"You can't use {items[item_id].name if item_id in items else item_id} in combat.")
             return
-        
-        # Wait for player to continue
-        input("\nPress Enter to continue...")
-        turn += 1
+        action = (action, item_id)
+    
+    combat, events = combat_engine.step(combat, action, turn_rng(game_state))
+    game_state.player['health'] = combat.player_health
+    for event in events:
+        if event[0] == "potion":
+            remove_from_inventory(game_state, event[1])
+    for line in combat_engine.describe_events(combat, events, items):
+        print_slow(line)
+    
+    if combat.outcome is None:
+        game_state.combat = combat
+        display_combat(game_state, items)
+        return
+    
+    game_state.combat = None
+    if combat.outcome == combat_engine.VICTORY:
+        handle_enemy_defeat(game_state, enemies_dict[combat.enemy_id], world, combat.enemy_id, items)
+    elif combat.outcome == combat_engine.FLED:
+        game_state.game_time += 5
 
 # Handle enemy defeat
-def handle_enemy_defeat(game_state, enemy, location, enemy_id, items):
+def handle_enemy_defeat(game_state, enemy, world, enemy_id, items):
     print_slow(f"You defeated {enemy.name}!")
     
     # Give rewards
     if enemy.loot:
         print_slow("You found:")
         for loot_item in enemy.loot:
-            game_state.player['inventory'].append(loot_item)
+            add_to_inventory(game_state, loot_item)
             if loot_item in items:
                 print_slow(f"- {items[loot_item].name}")
             else:
                 print_slow(f"- {loot_item.replace('_', ' ')}")
+        for loot_item in enemy.loot:
+            publish(game_state, ITEM_ACQUIRED, loot_item)
     
     # Remove enemy from location
-    if enemy_id in location['enemies']:
-        location['enemies'].remove(enemy_id)
+    if enemy_id in world[game_state.current_location]['enemies']:
+        world.remove(game_state.current_location, 'enemies', enemy_id)
+        if enemy.respawn is not None:
+            schedule(game_state, game_state.game_time + enemy.respawn, "respawn", game_state.current_location, enemy_id)
     
-    # Update quest progress if applicable
-    if enemy_id == "wolf" and "forest_cleared" in game_state.quest_progress:
-        game_state.quest_progress["forest_cleared"] = True
-    
-    if enemy_id == "mine_guardian" and "mines_cleared" in game_state.quest_progress:
-        game_state.quest_progress["mines_cleared"] = True
+    publish(game_state, ENEMY_DEFEATED, enemy_id)
     
     game_state.enemies_defeated += 1
     game_state.game_time += 5  # Combat takes time
 
 # Main game loop
-def main_game_loop():
-    game_state = new_game()
-    world = create_game_world()
-    items = create_game_items()
-    npcs = create_game_npcs()
-    enemies_dict = create_game_enemies()
+def main_game_loop(game_state=None, world=None):
+    content = builtin_content()
+    if game_state is None:
+        game_state = new_game()
+        world = content.new_world()
+    game_state.save_path = SAVE_PATH
+    items = content.items
+    npcs = content.npcs
+    enemies_dict = content.enemies
     
     running = True
     while running:
-        display_location(game_state, world, npcs, enemies_dict)
+        if game_state.combat is None:
+            display_location(game_state, world, npcs, enemies_dict)
         
         command = input("> ")
         result = process_command(command, game_state, world, items, npcs, enemies_dict)
@@ -667,6 +1138,7 @@ def main_game_loop():
             choice = input("Would you like to play again? (y/n): ")
             if choice.lower() == 'y':
                 game_state = new_game()
+                world = content.new_world()
             else:
                 print_slow("Thank you for playing Adventure Quest!")
                 running = False
@@ -677,53 +1149,72 @@ def main_game_loop():
             choice = input("Would you like to play again? (y/n): ")
             if choice.lower() == 'y':
                 game_state = new_game()
+                world = content.new_world()
             else:
                 print_slow("Thank you for playing Adventure Quest!")
                 running = False
         
-        # Advance game time
+        # Advance game time; health regeneration and respawns catch up
         game_state.game_time += 1
+        if game_state.player['health'] > 0:
+            run_timers(game_state, world)
         
-        # Auto-heal slightly over time
-        if game_state.game_time % 10 == 0 and game_state.player['health'] < game_state.player['max_health']:
-            game_state.player['health'] = min(game_state.player['health'] + 1, game_state.player['max_health'])
+        # Autosave after every command; usually this appends a few bytes
+        if running and game_state.player['health'] > 0 and game_state.combat is None:
+            save_game(game_state, world, quiet=True)
 
 # Display victory message
 def display_victory(game_state):
     clear_screen()
-    print("=" * 80)
-    print("VICTORY!")
-    print("=" * 80)
+    say("=" * 80)
+    say("VICTORY!")
+    say("=" * 80)
     print_slow(f"Congratulations, {game_state.player['name']}! You have defeated the Dark Knight and saved the kingdom!", 0.05)
     print_slow("The people celebrate your heroism, and the king awards you with the highest honor.", 0.03)
-    print()
-    print(f"Final stats:")
-    print(f"- Enemies defeated: {game_state.enemies_defeated}")
-    print(f"- Game time: {game_state.game_time // 60}h {game_state.game_time % 60}m")
-    print(f"- Locations visited: {len(game_state.visited_locations)}")
-    print()
+    say()
+    say(f"Final stats:")
+    say(f"- Enemies defeated: {game_state.enemies_defeated}")
+    say(f"- Game time: {game_state.game_time // 60}h {game_state.game_time % 60}m")
+    say(f"- Locations visited: {len(game_state.visited_locations)}")
+    say()
     print_slow("The End", 0.1)
-    print()
+    say()
+
+# Default save slot for the terminal game
+SAVE_PATH = "adventure_quest.sav"
+
+# Open save slots, so later saves can append deltas to the same file
+save_files = {}
 
-# Save game function (simplified)
-def save_game(game_state):
+# Save game function
+def save_game(game_state, world, path=None, quiet=False):
+    path = path or game_state.save_path or SAVE_PATH
     try:
-        # In a real game, you'd serialize the game state to a file
-        print_slow("Game saved successfully!")
+        save_file = save_files.get(path)
+        if save_file is None:
+            save_file = save_files[path] = SaveFile(path)
+        save_file.save(game_state, world)
+        if not quiet:
+            print_slow("Game saved successfully!")
         return True
-    except:
+    except (OSError, SaveError):
         print_slow("Failed to save game.")
         return False
 
-# Load game function (simplified)
-def load_game():
-    try:
-        # In a real game, you'd deserialize from a file
+# Load game function: returns (game_state, world), or (None, None)
+def load_game(path=SAVE_PATH):
+    if not os.path.exists(path):
         print_slow("No saved game found.")
-        return None
-    except:
+        return None, None
+    try:
+        save_file = SaveFile(path)
+        game_state, world = save_file.load(GameState(), builtin_content().new_world())
+        save_files[path] = save_file
+        game_state.save_path = path
+        return game_state, world
+    except (OSError, SaveError, KeyError, ValueError):
         print_slow("Failed to load game.")
-        return None
+        return None, None
 
 # Title screen
 def title_screen():
@@ -744,9 +1235,9 @@ def title_screen():
     if choice == "1":
         return main_game_loop()
     elif choice == "2":
-        game_state = load_game()
+        game_state, world = load_game()
         if game_state:
-            return main_game_loop(game_state)
+            return main_game_loop(game_state, world)
         else:
             return title_screen()
     elif choice == "3":
@@ -778,60 +1269,28 @@ def about_screen():
     print_slow("Press Enter to return to the title screen...", 0.03)
     input()
 
-# Class for quests
-class Quest:
-    def __init__(self, name, description, objectives, reward):
-        self.name = name
-        self.description = description
-        self.objectives = objectives  # List of objectives
-        self.completed_objectives = []
-        self.reward = reward
-        self.completed = False
-    
-    def update_objective(self, objective):
-        if objective in self.objectives and objective not in self.completed_objectives:
-            self.completed_objectives.append(objective)
-            return True
-        return False
-    
-    def check_completion(self):
-        if set(self.objectives) <= set(self.completed_objectives) and not self.completed:
-            self.completed = True
-            return True
-        return False
-
-# Create game quests
-def create_game_quests():
-    quests = {
-        "village_troubles": Quest(
-            "Village Troubles",
-            "Investigate the forest and abandoned mines to discover what's causing problems for the village.",
-            ["clear_forest", "clear_mines"],
-            "greater_health_potion"
-        ),
-        "royal_amulet": Quest(
-            "The Royal Amulet",
-            "Find the ancient amulet and bring it to the castle to help stop the darkness.",
-            ["find_amulet", "deliver_amulet"],
-            "enchanted_blade"
-        )
-    }
-    return quests
-
 # Handle specific quest updates based on player actions
 def update_quests(game_state, quest_id, objective):
-    if quest_id in game_state.quests and objective in game_state.quests[quest_id].objectives:
-        if game_state.quests[quest_id].update_objective(objective):
-            print_slow(f"Quest objective completed: {objective.replace('_', ' ').title()}")
-            
-            if game_state.quests[quest_id].check_completion():
-                print_slow(f"Quest completed: {game_state.quests[quest_id].name}")
-                reward = game_state.quests[quest_id].reward
-                game_state.player['inventory'].append(reward)
-                print_slow(f"You received: {reward.replace('_', ' ').title()}")
-                return True
+    quest = QUESTS.progress(game_state, quest_id)
+    if quest is None or not quest.update_objective(objective):
+        return False
+    print_slow(f"Quest objective completed: {objective.replace('_', ' ').title()}")
+    
+    if quest.check_completion():
+        print_slow(f"Quest completed: {quest.name}")
+        add_to_inventory(game_state, quest.reward)
+        print_slow(f"You received: {quest.reward.replace('_', ' ').title()}")
+        publish(game_state, ITEM_ACQUIRED, quest.reward)
+        return True
     return False
 
+# Tell the quests something happened (ENEMY_DEFEATED, ITEM_ACQUIRED or
+# LOCATION_ENTERED, with the id it happened to). Only the objectives
+# waiting for exactly this event are touched.
+def publish(game_state, event, key):
+    for quest_id, objective in QUESTS.subscribers(event, key):
+        update_quests(game_state, quest_id, objective)
+
 # Main function
 if __name__ == "__main__":
     try:
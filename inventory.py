@@ -0,0 +1,61 @@
+# A multiset of item ids: one stack per kind of item, with a count.
+# has, count, add and remove are single dict operations however much the
+# player carries. Iterating yields each kind of item once, in the order the
+# player first picked it up, which is the order the inventory is displayed in.
+class Inventory:
+    __slots__ = ("_counts",)
+
+    def __init__(self, item_ids=()):
+        self._counts = {}  # item_id -> count, in display order
+        for item_id in item_ids:
+            self.add(item_id)
+
+    def has(self, item_id):
+        return item_id in self._counts
+
+    def __contains__(self, item_id):
+        return item_id in self._counts
+
+    def count(self, item_id):
+        return self._counts.get(item_id, 0)
+
+    def add(self, item_id, count=1):
+        self._counts[item_id] = self._counts.get(item_id, 0) + count
+
+    # Take count of an item out. Raises ValueError if there aren't that many,
+    # like list.remove does for a missing item.
+    def remove(self, item_id, count=1):
+        held = self._counts.get(item_id, 0)
+        if held < count:
+            raise ValueError(f"{item_id!r} is not in the inventory")
+        if held == count:
+            del self._counts[item_id]
+        else:
+            self._counts[item_id] = held - count
+
+    # Each kind of item once, in display order
+    def __iter__(self):
+        return iter(self._counts)
+
+    # Number of different items carried
+    def __len__(self):
+        return len(self._counts)
+
+    # (item_id, count) pairs in display order
+    def items(self):
+        return self._counts.items()
+
+    def total(self):
+        return sum(self._counts.values())
+
+    # Every item carried, one entry per copy, as saves store it
+    def to_list(self):
+        return [item_id for item_id, count in self._counts.items() for _ in range(count)]
+
+    def __eq__(self, other):
+        if isinstance(other, Inventory):
+            return self._counts == other._counts
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Inventory({self._counts!r})"
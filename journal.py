@@ -0,0 +1,125 @@
+import os
+import re
+import random
+import struct
+from game_logic import NullSink, capture_output
+from savegame import (header, check_header, record, raw_record, iter_records, decode,
+                      snapshot, restore, SaveError)
+
+# Journal file layout: the save-file framing with its own magic.
+# The file holds the latest snapshot followed by every command accepted
+# since then, each with the seed its turn used. Taking a snapshot rewrites
+# the file, so recovery only ever replays a short tail. Command records are
+# a raw 8-byte seed plus the UTF-8 command, which is cheap to parse in bulk.
+JOURNAL_MAGIC = b"AQJL"
+SNAPSHOT = ord("S")
+COMMAND = ord("C")
+_SEED = struct.Struct("<Q")
+
+# Session ids arrive from clients, so only these can become file names
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Per-session command journals with periodic snapshots.
+# After a worker restart a session is rebuilt from its latest snapshot plus
+# a headless replay of the commands after it.
+class CommandJournal:
+    def __init__(self, directory, snapshot_every=100):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.new_game = None  # encoded snapshot every new session starts from, see start()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, session_id):
+        if not SESSION_ID.match(session_id):
+            raise ValueError(f"Invalid session id {session_id!r}")
+        return os.path.join(self.directory, session_id + ".journal")
+
+    # Seed for the next turn's randomness
+    @staticmethod
+    def new_seed():
+        return random.getrandbits(64)
+
+    # Start the journal over from the session's current state
+    def snapshot(self, session):
+        path = self.path(session.session_id)
+        data = header(JOURNAL_MAGIC)
+        data += record(SNAPSHOT, snapshot(session.game_state, session.world))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        session.journal_length = 0
+
+    # Encode the state every new session starts in, once per process
+    def set_new_game(self, game_state, world):
+        self.new_game = bytes(record(SNAPSHOT, snapshot(game_state, world)))
+
+    # Begin the journal of a session created in the new-game state. Nothing
+    # is written yet: the first append writes the shared snapshot and the
+    # command together, so creating a session costs no encoding or I/O.
+    def start(self, session):
+        if self.new_game is None:
+            self.snapshot(session)
+            return
+        session.journal_length = None  # no file yet
+
+    # Record a command that has just been applied to the session.
+    # Once the tail is long enough it is folded into a fresh snapshot,
+    # except mid-fight, since snapshots don't hold combat state.
+    def append(self, session, command, seed):
+        entry = raw_record(COMMAND, _SEED.pack(seed) + command.encode("utf-8"))
+        if session.journal_length is None:
+            with open(self.path(session.session_id), "wb") as f:
+                f.write(header(JOURNAL_MAGIC) + self.new_game + entry)
+            session.journal_length = 1
+            return
+        if session.journal_length >= self.snapshot_every and session.game_state.combat is None:
+            self.snapshot(session)
+            return
+        with open(self.path(session.session_id), "ab") as f:
+            f.write(entry)
+        session.journal_length += 1
+
+    # Rebuild a session. session must hold a fresh GameState and world;
+    # run(command, game_state, world) applies one command.
+    # Returns False if the session has no journal.
+    def load(self, session, run):
+        if not SESSION_ID.match(session.session_id):
+            return False
+        path = self.path(session.session_id)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        check_header(data, JOURNAL_MAGIC)
+
+        fields = None
+        commands = []
+        end = 5
+        for kind, payload, end in iter_records(data):
+            if kind == SNAPSHOT:
+                fields, _ = decode(payload)
+                commands = []
+            elif kind == COMMAND:
+                commands.append(payload)
+        if fields is None:
+            raise SaveError("Journal has no snapshot")
+        if end < len(data):
+            # Drop a torn record so new commands don't land behind it
+            with open(path, "r+b") as f:
+                f.truncate(end)
+
+        game_state, world = restore(fields, session.game_state, session.world)
+        with capture_output(NullSink()):
+            for payload in commands:
+                (game_state.rng_seed,) = _SEED.unpack_from(payload)
+                run(bytes(payload[8:]).decode("utf-8"), game_state, world)
+        session.journal_length = len(commands)
+        return True
+
+    def discard(self, session_id):
+        try:
+            os.remove(self.path(session_id))
+        except (FileNotFoundError, ValueError):
+            pass
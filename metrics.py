@@ -0,0 +1,122 @@
+import bisect
+import threading
+
+# Server metrics in the Prometheus text format, kept cheap enough to leave on
+# under full load: recording a command is one dict lookup and a bisect over
+# fixed buckets under one lock. Values are plain dicts so a worker
+# process can hand a snapshot to the front process, which merges them.
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+           0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+_BUCKETS_NS = tuple(int(bound * 1e9) for bound in BUCKETS)
+
+# Add one observation to a histogram: per-bucket counts, the last one for
+# observations above every bound, then the sum in nanoseconds
+def _observe(histogram, ns):
+    histogram[bisect.bisect_left(_BUCKETS_NS, ns)] += 1
+    histogram[-1] += ns
+
+def _new_histogram():
+    return [0] * (len(BUCKETS) + 2)
+
+class Metrics:
+    def __init__(self):
+        self.latency = {}  # verb -> histogram of time in game logic; its count is the command count
+        self.errors = {}  # verb -> commands that raised
+        self.responses = {}  # response mode -> histogram of time spent building the response
+        self.combat_turns = 0
+        self.world_mutations = 0
+        self._lock = threading.Lock()
+
+    # One command through the game logic
+    def command(self, verb, ns, combat_turns=0, world_mutations=0):
+        with self._lock:
+            histogram = self.latency.get(verb)
+            if histogram is None:
+                histogram = self.latency[verb] = _new_histogram()
+            histogram[bisect.bisect_left(_BUCKETS_NS, ns)] += 1
+            histogram[-1] += ns
+            if combat_turns:
+                self.combat_turns += combat_turns
+            if world_mutations:
+                self.world_mutations += world_mutations
+
+    # A command that raised, after its command() was recorded
+    def error(self, verb):
+        with self._lock:
+            self.errors[verb] = self.errors.get(verb, 0) + 1
+
+    # Serializing one answer (JSON, an event stream or a WebSocket frame)
+    def response(self, mode, ns):
+        with self._lock:
+            histogram = self.responses.get(mode)
+            if histogram is None:
+                histogram = self.responses[mode] = _new_histogram()
+            _observe(histogram, ns)
+
+    # Plain values; sessions is the number of active sessions to report
+    def snapshot(self, sessions=0):
+        with self._lock:
+            return {
+                "commands": {verb: sum(h[:-1]) for verb, h in self.latency.items()},
+                "errors": dict(self.errors),
+                "latency": {verb: list(h) for verb, h in self.latency.items()},
+                "responses": {mode: list(h) for mode, h in self.responses.items()},
+                "combat_turns": self.combat_turns,
+                "world_mutations": self.world_mutations,
+                "sessions": sessions
+            }
+
+# Add snapshots together (from several worker processes)
+def merge(snapshots):
+    total = Metrics().snapshot()
+    for snapshot in snapshots:
+        for key in ("commands", "errors"):
+            for label, count in snapshot[key].items():
+                total[key][label] = total[key].get(label, 0) + count
+        for key in ("latency", "responses"):
+            for label, histogram in snapshot[key].items():
+                into = total[key].setdefault(label, _new_histogram())
+                for n, value in enumerate(histogram):
+                    into[n] += value
+        for key in ("combat_turns", "world_mutations", "sessions"):
+            total[key] += snapshot[key]
+    return total
+
+def _histogram_lines(name, label, value, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{label}="{value}",le="{bound}"}} {cumulative}')
+    cumulative += histogram[len(BUCKETS)]
+    lines.append(f'{name}_bucket{{{label}="{value}",le="+Inf"}} {cumulative}')
+    lines.append(f'{name}_sum{{{label}="{value}"}} {histogram[-1] / 1e9}')
+    lines.append(f'{name}_count{{{label}="{value}"}} {cumulative}')
+    return lines
+
+# A snapshot in the Prometheus text exposition format
+def render(snapshot):
+    lines = ["# HELP aq_commands_total Commands run, by verb.", "# TYPE aq_commands_total counter"]
+    lines += [f'aq_commands_total{{verb="{verb}"}} {count}' for verb, count in sorted(snapshot["commands"].items())]
+    lines += ["# HELP aq_command_errors_total Commands that raised an error, by verb.",
+              "# TYPE aq_command_errors_total counter"]
+    lines += [f'aq_command_errors_total{{verb="{verb}"}} {count}'
+              for verb, count in sorted(snapshot["errors"].items())]
+    lines += ["# HELP aq_command_seconds Time spent in game logic per command, by verb.",
+              "# TYPE aq_command_seconds histogram"]
+    for verb, histogram in sorted(snapshot["latency"].items()):
+        lines += _histogram_lines("aq_command_seconds", "verb", verb, histogram)
+    lines += ["# HELP aq_response_seconds Time spent serializing a command's answer, by response mode.",
+              "# TYPE aq_response_seconds histogram"]
+    for mode, histogram in sorted(snapshot["responses"].items()):
+        lines += _histogram_lines("aq_response_seconds", "mode", mode, histogram)
+    lines += ["# HELP aq_combat_turns_total Combat turns resolved.", "# TYPE aq_combat_turns_total counter",
+              f"aq_combat_turns_total {snapshot['combat_turns']}",
+              "# HELP aq_world_mutations_total Changes made to players' worlds.",
+              "# TYPE aq_world_mutations_total counter",
+              f"aq_world_mutations_total {snapshot['world_mutations']}",
+              "# HELP aq_active_sessions Sessions held in memory.", "# TYPE aq_active_sessions gauge",
+              f"aq_active_sessions {snapshot['sessions']}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,107 @@
+# Game events quests listen for. Each is published with a key: the enemy,
+# item or location it is about.
+ENEMY_DEFEATED = "enemy_defeated"
+ITEM_ACQUIRED = "item_acquired"
+LOCATION_ENTERED = "location_entered"
+
+# Class for quests. The quests from create_game_quests are shared templates;
+# each player's progress is a copy made by QuestBus.progress.
+class Quest:
+    __slots__ = ("name", "description", "objectives", "completed_objectives", "reward", "completed", "triggers",
+                 "prerequisites")
+
+    def __init__(self, name, description, objectives, reward, triggers=None, prerequisites=None):
+        self.name = name
+        self.description = description
+        self.objectives = objectives  # List of objectives
+        self.completed_objectives = []
+        self.reward = reward
+        self.completed = False
+        self.triggers = triggers if triggers else {}  # objective -> (event, key) that completes it
+        self.prerequisites = prerequisites if prerequisites else {}  # objective -> objective that must be done first
+
+    # An objective whose prerequisite isn't done yet stays open; its event
+    # has to happen again once the prerequisite is done
+    def update_objective(self, objective):
+        required = self.prerequisites.get(objective)
+        if required is not None and required not in self.completed_objectives:
+            return False
+        if objective in self.objectives and objective not in self.completed_objectives:
+            self.completed_objectives.append(objective)
+            return True
+        return False
+
+    # completed_objectives only ever holds distinct objectives of this quest,
+    # so comparing lengths is enough
+    def check_completion(self):
+        if not self.completed and len(self.completed_objectives) == len(self.objectives):
+            self.completed = True
+            return True
+        return False
+
+# Create game quests
+def create_game_quests():
+    quests = {
+        "village_troubles": Quest(
+            "Village Troubles",
+            "Investigate the forest and abandoned mines to discover what's causing problems for the village.",
+            ["clear_forest", "clear_mines"],
+            "greater_health_potion",
+            triggers={
+                "clear_forest": (ENEMY_DEFEATED, "wolf"),
+                "clear_mines": (ENEMY_DEFEATED, "mine_guardian")
+            }
+        ),
+        "royal_amulet": Quest(
+            "The Royal Amulet",
+            "Find the ancient amulet and bring it to the castle to help stop the darkness.",
+            ["find_amulet", "deliver_amulet"],
+            "enchanted_blade",
+            triggers={
+                "find_amulet": (ITEM_ACQUIRED, "ancient_amulet"),
+                "deliver_amulet": (LOCATION_ENTERED, "castle_hall")
+            },
+            prerequisites={"deliver_amulet": "find_amulet"}
+        )
+    }
+    return quests
+
+# Routes game events to the quest objectives waiting for them. Objectives
+# are indexed by (event, key), so publishing an event costs one dict lookup
+# plus the objectives it actually completes, however many quests exist.
+class QuestBus:
+    def __init__(self, quests=None):
+        self.reset(quests)
+
+    # Listen for these quests only, in place of whatever the bus had
+    def reset(self, quests=None):
+        self.quests = {}  # quest_id -> template Quest
+        self._subscribers = {}  # (event, key) -> [(quest_id, objective)]
+        for quest_id, quest in (quests or {}).items():
+            self.add_quest(quest_id, quest)
+
+    def add_quest(self, quest_id, quest):
+        self.quests[quest_id] = quest
+        for objective, (event, key) in quest.triggers.items():
+            self._subscribers.setdefault((event, key), []).append((quest_id, objective))
+
+    # The (quest_id, objective) pairs an event completes
+    def subscribers(self, event, key):
+        return self._subscribers.get((event, key), ())
+
+    # A player's progress on a quest, started the first time it is needed.
+    # Returns None for a quest the bus doesn't know.
+    def progress(self, game_state, quest_id):
+        quest = game_state.quests.get(quest_id)
+        if quest is None:
+            template = self.quests.get(quest_id)
+            if template is None:
+                return None
+            quest = Quest(template.name, template.description, template.objectives, template.reward, template.triggers,
+                          template.prerequisites)
+            game_state.quests[quest_id] = quest
+        return quest
+
+# The quests the game runs: the built-in ones unless the server loads other
+# content. Modules hold on to this object, so it is reset rather than replaced.
+QUESTS = QuestBus(create_game_quests())
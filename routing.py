@@ -0,0 +1,258 @@
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+
+# One direction of the world graph in compressed rows: the location numbers
+# listed for location n are targets[offsets[n]:offsets[n + 1]]. Both columns
+# are flat uint32 arrays, or views of them in a content pack.
+class Adjacency(Sequence):
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, number):
+        return self.targets[self.offsets[number]:self.offsets[number + 1]]
+
+    @classmethod
+    def from_lists(cls, lists):
+        offsets = array("I", [0])
+        targets = array("I")
+        for numbers in lists:
+            targets.extend(numbers)
+            offsets.append(len(targets))
+        return cls(offsets, targets)
+
+    # The same edges the other way round: who connects to each location
+    def reversed(self):
+        count = len(self)
+        offsets = array("I", [0]) * (count + 1)
+        for target in self.targets:
+            offsets[target + 1] += 1
+        for number in range(count):
+            offsets[number + 1] += offsets[number]
+        fill = offsets[:-1]
+        targets = array("I", [0]) * len(self.targets)
+        for number in range(count):
+            for target in self[number]:
+                targets[fill[target]] = number
+                fill[target] += 1
+        return Adjacency(offsets, targets)
+
+# Shortest routes over the world graph for multi-hop travel.
+# Locations are numbered once per base world and the graph is kept as flat
+# int columns, so a search never hashes location ids and a large world
+# costs a few bytes per location and connection. Which locations a player
+# can enter depends only on the gate items they hold, so everything computed
+# here is keyed by a bitmask of those items and shared by every session
+# holding the same keys.
+class RouteGraph:
+    # ids: location id by number; numbers: location id -> number;
+    # forward/backward: Adjacency of the numbers each location connects
+    # to and is connected from; gates: per location, 0 if ungated or k if
+    # it requires gate_items[k - 1]. Gate k is bit k of a key.
+    def __init__(self, ids, numbers, forward, backward, gates, gate_items,
+                 max_routes=10000, max_masks=32):
+        self.ids = ids
+        self.numbers = numbers
+        self.forward = forward
+        self.backward = backward
+        self.gates = gates
+        self.gate_bits = {item_id: 1 << gate for gate, item_id in enumerate(gate_items, 1)}  # gate item -> bit
+
+        self.max_routes = max_routes
+        self.max_masks = max_masks
+        self._routes = OrderedDict()  # (mask, source, destination) -> path or None
+        self._components = OrderedDict()  # mask -> component label per location
+        self._lock = threading.Lock()
+
+    # Bitmask of the gates a player can pass. A gate the player has already
+    # opened counts as holding its item.
+    def key(self, inventory, unlocked=()):
+        gate_bits = self.gate_bits
+        mask = 0
+        for item_id in inventory:
+            mask |= gate_bits.get(item_id, 0)
+        for location_id in unlocked:
+            number = self.numbers.get(location_id)
+            if number is not None and self.gates[number]:
+                mask |= 1 << self.gates[number]
+        return mask
+
+    # Location ids from source to destination inclusive, or None if the
+    # player can't get there with these keys
+    def route(self, source, destination, mask):
+        src = self.numbers[source]
+        dst = self.numbers[destination]
+        cache_key = (mask, src, dst)
+        with self._lock:
+            if cache_key in self._routes:
+                self._routes.move_to_end(cache_key)
+                path = self._routes[cache_key]
+                return [self.ids[n] for n in path] if path is not None else None
+
+        path = self._search(src, dst, mask)
+        with self._lock:
+            self._routes[cache_key] = path
+            while len(self._routes) > self.max_routes:
+                self._routes.popitem(last=False)
+        return [self.ids[n] for n in path] if path is not None else None
+
+    def _passable(self, number, mask):
+        gate = self.gates[number]
+        return not gate or mask >> gate & 1
+
+    # Bidirectional breadth-first search, a level at a time from whichever
+    # side has the smaller frontier
+    def _search(self, src, dst, mask):
+        if src == dst:
+            return (src,)
+        gates = self.gates
+        if not self._passable(dst, mask):
+            return None
+        # Locations in different components can't reach each other; this
+        # rejects hopeless queries without a search of the whole component
+        if self._passable(src, mask):
+            components = self.components(mask)
+            if components[src] != components[dst]:
+                return None
+
+        forward, backward = self.forward, self.backward
+        parents = {src: None}  # reached from src: number -> previous number
+        children = {dst: None}  # reaches dst: number -> next number
+        depth = {src: 0, dst: 0}
+        forward_frontier, backward_frontier = [src], [dst]
+        forward_depth = backward_depth = 0
+        best, meet = None, None
+
+        while forward_frontier and backward_frontier:
+            if best is not None and best <= forward_depth + backward_depth + 1:
+                break
+            if len(forward_frontier) <= len(backward_frontier):
+                next_frontier = []
+                for number in forward_frontier:
+                    for neighbour in forward[number]:
+                        if neighbour in parents:
+                            continue
+                        gate = gates[neighbour]
+                        if gate and not mask >> gate & 1:
+                            continue
+                        parents[neighbour] = number
+                        if neighbour in children:
+                            length = forward_depth + 1 + depth[neighbour]
+                            if best is None or length < best:
+                                best, meet = length, neighbour
+                        else:
+                            depth[neighbour] = forward_depth + 1
+                        next_frontier.append(neighbour)
+                forward_frontier = next_frontier
+                forward_depth += 1
+            else:
+                next_frontier = []
+                for number in backward_frontier:
+                    for neighbour in backward[number]:
+                        if neighbour in children:
+                            continue
+                        # Walking backwards the neighbour is where we would
+                        # leave from, so it must be enterable unless it's src
+                        gate = gates[neighbour]
+                        if gate and not mask >> gate & 1 and neighbour != src:
+                            continue
+                        children[neighbour] = number
+                        if neighbour in parents:
+                            length = backward_depth + 1 + depth[neighbour]
+                            if best is None or length < best:
+                                best, meet = length, neighbour
+                        else:
+                            depth[neighbour] = backward_depth + 1
+                        next_frontier.append(neighbour)
+                backward_frontier = next_frontier
+                backward_depth += 1
+
+        if meet is None:
+            return None
+        path = []
+        number = meet
+        while number is not None:
+            path.append(number)
+            number = parents[number]
+        path.reverse()
+        number = children[meet]
+        while number is not None:
+            path.append(number)
+            number = children[number]
+        return tuple(path)
+
+    # Connected-component label of every location, ignoring edge direction,
+    # over the locations these keys can enter. Computed once per mask.
+    def components(self, mask):
+        with self._lock:
+            labels = self._components.get(mask)
+            if labels is not None:
+                self._components.move_to_end(mask)
+                return labels
+
+        gates, forward, backward = self.gates, self.forward, self.backward
+        labels = array("i", [-1]) * len(self.ids)
+        label = 0
+        for start in range(len(labels)):
+            if labels[start] != -1 or not self._passable(start, mask):
+                continue
+            labels[start] = label
+            stack = [start]
+            while stack:
+                number = stack.pop()
+                for neighbours in (forward[number], backward[number]):
+                    for neighbour in neighbours:
+                        if labels[neighbour] == -1:
+                            gate = gates[neighbour]
+                            if gate and not mask >> gate & 1:
+                                continue
+                            labels[neighbour] = label
+                            stack.append(neighbour)
+            label += 1
+
+        with self._lock:
+            self._components[mask] = labels
+            while len(self._components) > self.max_masks:
+                self._components.popitem(last=False)
+        return labels
+
+    # Number a world's locations in iteration order. Connections to
+    # locations the world doesn't have are left out, since nobody can
+    # travel through them.
+    @classmethod
+    def from_world(cls, world, **limits):
+        ids = list(world)
+        numbers = {location_id: number for number, location_id in enumerate(ids)}
+        connections, gates, gate_items = route_columns(world, ids, numbers)
+        forward = Adjacency.from_lists(connections)
+        return cls(ids, numbers, forward, forward.reversed(), gates, gate_items, **limits)
+
+# The columns a RouteGraph is built from, for the locations ids in that
+# order: their connection lists as numbers, their gate numbers and the
+# gate items those stand for
+def route_columns(world, ids, numbers):
+    connections = []
+    gates = array("I")
+    gate_numbers = {}
+    for location_id in ids:
+        location = world[location_id]
+        connections.append([numbers[c] for c in location['connections'] if c in numbers])
+        required_item = location.get('requires_item')
+        gates.append(0 if required_item is None else gate_numbers.setdefault(required_item, len(gate_numbers) + 1))
+    return connections, gates, list(gate_numbers)
+
+# The route graph for a world, built on first use and shared through the
+# base world's derived cache. A world that stores its own graph (a content
+# pack) provides it through a route_graph() method.
+def route_graph(world):
+    base = getattr(world, "base", world)
+    graph = base.derived.get("routes")
+    if graph is None:
+        build = getattr(base, "route_graph", None)
+        graph = base.derived["routes"] = build() if build is not None else RouteGraph.from_world(base)
+    return graph
@@ -0,0 +1,303 @@
+import os
+import struct
+import zlib
+from inventory import Inventory
+from quests import QUESTS
+from scheduler import TimerWheel
+
+# Save file layout:
+#   MAGIC, one version byte, then a sequence of records
+#   record = kind (1 byte) | payload length (varint) | payload | crc32 of payload (4 bytes)
+# The first record is a full snapshot. Each later record is a delta holding
+# only the fields that changed since the previous record. A record cut short
+# by a crash fails its checksum and is ignored with everything after it.
+MAGIC = b"AQSV"
+VERSION = 1
+
+SNAPSHOT = ord("S")
+DELTA = ord("D")
+
+# Value tags
+_NONE, _FALSE, _TRUE, _INT, _STR, _LIST, _DICT = range(7)
+
+class SaveError(Exception):
+    pass
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+# Compact tagged encoding for None, bools, ints, strings, lists/tuples and dicts
+def encode(value, out=None):
+    out = out if out is not None else bytearray()
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        _write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif isinstance(value, str):
+        raw = value.encode("utf-8")
+        out.append(_STR)
+        _write_varint(out, len(raw))
+        out += raw
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            encode(item, out)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            encode(key, out)
+            encode(item, out)
+    else:
+        raise SaveError(f"Can't save a value of type {type(value).__name__}")
+    return out
+
+def decode(data, pos=0):
+    tag = data[pos]
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _INT:
+        raw, pos = _read_varint(data, pos)
+        return (raw >> 1) ^ -(raw & 1), pos
+    if tag == _STR:
+        length, pos = _read_varint(data, pos)
+        return bytes(data[pos:pos + length]).decode("utf-8"), pos + length
+    if tag == _LIST:
+        length, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(length):
+            item, pos = decode(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == _DICT:
+        length, pos = _read_varint(data, pos)
+        result = {}
+        for _ in range(length):
+            key, pos = decode(data, pos)
+            result[key], pos = decode(data, pos)
+        return result, pos
+    raise SaveError(f"Unknown value tag {tag}")
+
+# Everything about a game that a save has to restore, as plain values.
+# Sets and append-only lists are kept as lists so deltas can append to them.
+def snapshot(game_state, world):
+    player = game_state.player
+    removed = []
+    for location_id, keys in world.removed.items():
+        for key, ids in keys.items():
+            for entry_id in ids:
+                removed.append([location_id, key, entry_id])
+    return {
+        "name": player['name'],
+        "health": player['health'],
+        "max_health": player['max_health'],
+        "inventory": player['inventory'].to_list(),
+        "equipped_weapon": player['equipped_weapon'],
+        "equipped_armor": player['equipped_armor'],
+        "current_location": game_state.current_location,
+        "visited_locations": sorted(game_state.visited_locations),
+        "quest_progress": dict(game_state.quest_progress),
+        "game_time": game_state.game_time,
+        "enemies_defeated": game_state.enemies_defeated,
+        "quests": {quest_id: list(quest.completed_objectives) for quest_id, quest in game_state.quests.items()},
+        "world_removed": removed,
+        "world_unlocked": sorted(world.unlocked),
+        "timers": [[due] + list(event) for due, event in game_state.timers.entries()] if game_state.timers else []
+    }
+
+# Fields that only ever grow: deltas store just the new entries
+APPEND_ONLY = ("world_removed",)
+GROWING_SETS = ("visited_locations", "world_unlocked")
+
+# Fill a fresh GameState and WorldOverlay from snapshot values
+def restore(fields, game_state, world):
+    player = game_state.player
+    for key in ("name", "health", "max_health", "equipped_weapon", "equipped_armor"):
+        player[key] = fields[key]
+    player['inventory'] = Inventory(fields["inventory"])
+    game_state.current_location = fields["current_location"]
+    game_state.visited_locations = set(fields["visited_locations"])
+    # Older saves also carry flags the game no longer keeps
+    game_state.quest_progress = {key: fields["quest_progress"].get(key, value)
+                                 for key, value in game_state.quest_progress.items()}
+    game_state.game_time = fields["game_time"]
+    game_state.enemies_defeated = fields["enemies_defeated"]
+    # Saves from before quests were tracked have no quest field
+    for quest_id, objectives in fields.get("quests", {}).items():
+        quest = QUESTS.progress(game_state, quest_id)
+        if quest is not None:
+            for objective in objectives:
+                quest.update_objective(objective)
+            quest.check_completion()
+    for location_id, key, entry_id in fields["world_removed"]:
+        world.remove(location_id, key, entry_id)
+    for location_id in fields["world_unlocked"]:
+        world.unlock(location_id)
+    # Saves from before the timer wheel have no pending timers
+    if fields.get("timers"):
+        game_state.timers = TimerWheel(game_state.game_time)
+        for due, *event in fields["timers"]:
+            game_state.timers.schedule(due, tuple(event))
+    return game_state, world
+
+# Work out what changed between two snapshots.
+# Returns {field: value} for replaced fields and {field: new entries} for growing ones.
+def diff(previous, current):
+    changes = {}
+    extended = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if old == value:
+            continue
+        if key in APPEND_ONLY and old is not None and value[:len(old)] == old:
+            extended[key] = value[len(old):]
+        elif key in GROWING_SETS and old is not None and set(old) <= set(value):
+            old_set = set(old)
+            extended[key] = [entry for entry in value if entry not in old_set]
+        else:
+            changes[key] = value
+    return changes, extended
+
+def apply_diff(fields, changes, extended):
+    fields.update(changes)
+    for key, entries in extended.items():
+        if key in GROWING_SETS:
+            fields[key] = sorted(set(fields[key]) | set(entries))
+        else:
+            fields[key] = fields[key] + entries
+
+# File header: four magic bytes and the format version
+def header(magic=MAGIC):
+    return bytearray(magic) + bytes([VERSION])
+
+def check_header(data, magic=MAGIC):
+    if len(data) < 5 or data[:4] != magic:
+        raise SaveError("Not a save file")
+    if data[4] != VERSION:
+        raise SaveError(f"Unsupported save version {data[4]}")
+
+# Frame an encoded value as a checksummed record
+def record(kind, value):
+    return raw_record(kind, encode(value))
+
+# Frame raw payload bytes as a checksummed record
+def raw_record(kind, payload):
+    out = bytearray([kind])
+    _write_varint(out, len(payload))
+    out += payload
+    out += struct.pack("<I", zlib.crc32(payload))
+    return out
+
+# Yield (kind, payload, end) for every intact record after the header,
+# stopping at the first truncated or corrupt one. Payloads are left encoded.
+def iter_records(data, pos=5):
+    while pos < len(data):
+        try:
+            kind = data[pos]
+            length, start = _read_varint(data, pos + 1)
+            end = start + length
+            if end + 4 > len(data):
+                return
+            payload = data[start:end]
+            (crc,) = struct.unpack_from("<I", data, end)
+        except IndexError:
+            return
+        if zlib.crc32(payload) != crc:
+            return
+        pos = end + 4
+        yield kind, payload, pos
+
+# Read every intact record of a save file. Returns the snapshot fields with
+# all deltas applied, how many deltas there were, and where the intact part ends.
+def read_records(data):
+    check_header(data)
+    fields = None
+    deltas = 0
+    pos = 5
+    for kind, payload, pos in iter_records(data):
+        if kind == SNAPSHOT:
+            fields, _ = decode(payload)
+        elif kind == DELTA and fields is not None:
+            (changes, extended), _ = decode(payload)
+            apply_diff(fields, changes, extended)
+            deltas += 1
+
+    if fields is None:
+        raise SaveError("Save file has no snapshot")
+    return fields, deltas, pos
+
+# A save slot on disk. save() appends a delta when only a few things changed
+# and rewrites a full snapshot every compact_every saves, so files stay small
+# and loading never has to replay a long chain.
+class SaveFile:
+    def __init__(self, path, compact_every=200):
+        self.path = path
+        self.compact_every = compact_every
+        self._last = None  # snapshot fields as of the last record written
+        self._deltas = 0
+
+    # Write a full snapshot, replacing the file atomically
+    def checkpoint(self, game_state, world):
+        fields = snapshot(game_state, world)
+        data = header()
+        data += record(SNAPSHOT, fields)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._last = fields
+        self._deltas = 0
+
+    # Save the game, appending only what changed since the last save
+    def save(self, game_state, world):
+        if self._last is None or self._deltas >= self.compact_every or not os.path.exists(self.path):
+            self.checkpoint(game_state, world)
+            return
+        fields = snapshot(game_state, world)
+        changes, extended = diff(self._last, fields)
+        if not changes and not extended:
+            return
+        with open(self.path, "ab") as f:
+            f.write(record(DELTA, [changes, extended]))
+        self._last = fields
+        self._deltas += 1
+
+    # Load into a fresh GameState and WorldOverlay. Later saves continue
+    # appending to this file.
+    def load(self, game_state, world):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        fields, self._deltas, end = read_records(data)
+        if end < len(data):
+            # Drop a torn record so new deltas don't land behind it
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        self._last = fields
+        return restore(fields, game_state, world)
@@ -0,0 +1,116 @@
+# Hierarchical timer wheel over game time (minutes).
+#
+# Level 0 has one slot per minute for the next 64 minutes, level 1 one slot
+# per 64 minutes for the next 64 * 64, and so on; timers further out than
+# the top level wait in an overflow list. A timer sits in the lowest level
+# whose window still contains it and drops a level each time the clock
+# reaches its slot. Slots are dict entries, so an empty wheel is a few empty
+# dicts and only occupied slots cost anything.
+#
+# Nothing runs on its own: the owner calls advance() when it touches the
+# session, and the wheel jumps straight from one occupied slot to the next.
+# A session nobody touches does no work however many timers it holds.
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+LEVELS = 4
+
+class TimerWheel:
+    __slots__ = ("now", "_levels", "_overflow", "_kinds", "_seq")
+
+    def __init__(self, now=0):
+        self.now = now
+        self._levels = [{} for _ in range(LEVELS)]  # slot -> [(due, seq, event)]
+        self._overflow = []  # timers beyond the top level's window
+        self._kinds = {}  # event kind -> number pending
+        self._seq = 0  # keeps timers due at the same minute in scheduling order
+
+    def __len__(self):
+        return sum(self._kinds.values())
+
+    # Schedule event (a tuple whose first item is its kind) at game time due.
+    # Times already past fire on the next advance.
+    def schedule(self, due, event):
+        self._seq += 1
+        self._place((max(due, self.now), self._seq, event))
+        self._kinds[event[0]] = self._kinds.get(event[0], 0) + 1
+
+    # Whether any event of this kind is pending
+    def scheduled(self, kind):
+        return kind in self._kinds
+
+    # Move the clock to `to`, yielding (due, event) for every timer that
+    # comes due, in order. Events may schedule new timers while this runs.
+    def advance(self, to):
+        while True:
+            stop = self._next_stop()
+            if stop is None or stop > to:
+                break
+            self.now = stop
+            if self._cascade(stop):
+                continue
+            for due, seq, event in sorted(self._levels[0].pop(stop & (SLOTS - 1))):
+                count = self._kinds[event[0]] - 1
+                if count:
+                    self._kinds[event[0]] = count
+                else:
+                    del self._kinds[event[0]]
+                yield due, event
+        self.now = max(self.now, to)
+
+    # Pending timers as (due, event), for saving
+    def entries(self):
+        pending = list(self._overflow)
+        for level in self._levels:
+            for slot_entries in level.values():
+                pending.extend(slot_entries)
+        return [(due, event) for due, seq, event in sorted(pending)]
+
+    def _place(self, entry):
+        due = entry[0]
+        for level in range(LEVELS):
+            shift = SLOT_BITS * (level + 1)
+            if due >> shift == self.now >> shift:
+                slot = (due >> (SLOT_BITS * level)) & (SLOTS - 1)
+                self._levels[level].setdefault(slot, []).append(entry)
+                return
+        self._overflow.append(entry)
+
+    # Start time of a slot in the current window of a level
+    def _slot_start(self, level, slot):
+        shift = SLOT_BITS * (level + 1)
+        return ((self.now >> shift) << shift) + (slot << (SLOT_BITS * level))
+
+    # The next time something has to happen: a level 0 slot firing, a higher
+    # slot dropping its timers a level, or an overflow timer coming due.
+    # Every timer in a lower level is due before any in a higher one, but the
+    # overflow is unsorted and can hold timers the clock has since caught up on.
+    def _next_stop(self):
+        stop = None
+        for level, slots in enumerate(self._levels):
+            if slots:
+                stop = self._slot_start(level, min(slots))
+                break
+        if self._overflow:
+            earliest = min(entry[0] for entry in self._overflow)
+            if stop is None or earliest < stop:
+                stop = earliest
+        return stop
+
+    # Spread the timers waiting for this moment over the lower levels: the
+    # overflow if one of its timers is due, else a higher-level slot that
+    # starts now. Returns False once only level 0 is left to fire.
+    def _cascade(self, stop):
+        if self._overflow and min(entry[0] for entry in self._overflow) <= stop:
+            overflow = self._overflow
+            self._overflow = []
+            for entry in overflow:
+                self._place(entry)
+            return True
+        for level in range(LEVELS - 1, 0, -1):
+            slot = (stop >> (SLOT_BITS * level)) & (SLOTS - 1)
+            slots = self._levels[level]
+            if slot in slots and self._slot_start(level, slot) == stop:
+                for entry in slots.pop(slot):
+                    self._place(entry)
+                return True
+        return False
@@ -0,0 +1,162 @@
+import time
+import secrets
+import threading
+from collections import OrderedDict
+
+# One player's game: their GameState plus the world they are mutating
+class Session:
+    __slots__ = ("session_id", "game_state", "world", "created_at", "last_seen", "journal_length", "lock")
+    
+    def __init__(self, session_id, game_state, world):
+        self.session_id = session_id
+        self.game_state = game_state
+        self.world = world
+        self.created_at = time.monotonic()
+        self.last_seen = self.created_at
+        self.journal_length = 0  # commands journaled since the last snapshot
+        # Held while a command runs and is journaled, so commands on one
+        # session apply and reach the journal one at a time, in one order
+        self.lock = threading.Lock()
+
+# A request named a session this store handed to another worker
+class SessionMoved(Exception):
+    pass
+
+# Bounded session store with LRU eviction and an idle TTL.
+# max_sessions is the memory budget: every session costs roughly the same,
+# so capping the count caps the worker's RSS.
+class SessionStore:
+    def __init__(self, factory, max_sessions=5000, ttl=30 * 60, clock=time.monotonic, loader=None, new_id=None):
+        self.factory = factory  # called as factory(session_id) -> Session
+        self.loader = loader  # called as loader(session_id) -> Session or None, to recover a session we don't hold
+        self.new_id = new_id if new_id is not None else new_session_id  # id for a session being created
+        self.max_sessions = max_sessions
+        self.ttl = ttl  # idle seconds before a session expires
+        self.clock = clock
+        self._sessions = OrderedDict()  # least recently used first
+        self._handed_off = OrderedDict()  # session_id -> time it left, oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.restored = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    # Return (session, created) for session_id, creating a session if needed
+    def get_or_create(self, session_id=None):
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None:
+                self.hits += 1
+                session.last_seen = now
+                self._sessions.move_to_end(session_id)
+                return session, False
+            # Its journal is still here, but restoring it would make a second copy
+            if session_id in self._handed_off:
+                raise SessionMoved(session_id)
+            self.misses += 1
+
+        # Recovering can mean replaying a journal, so it runs outside the lock
+        if session_id and self.loader is not None:
+            session = self.loader(session_id)
+            if session is not None:
+                with self._lock:
+                    # Another request may have recovered it meanwhile
+                    existing = self._sessions.get(session_id)
+                    if existing is not None:
+                        return existing, False
+                    self.restored += 1
+                    self._add(session, now)
+                return session, False
+
+        session = self.factory(self.new_id())
+        with self._lock:
+            self._add(session, now)
+        return session, True
+
+    def _add(self, session, now):
+        session.created_at = session.last_seen = now
+        self._sessions[session.session_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    # Take in a session built elsewhere (handed over by another worker)
+    def add(self, session):
+        with self._lock:
+            self._handed_off.pop(session.session_id, None)
+            self._add(session, self.clock())
+
+    # Drop a session that is being handed to another worker. Until it is
+    # handed back or the mark is cleared, asking for it raises SessionMoved
+    # instead of restoring it from the journal.
+    def hand_off(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._handed_off[session_id] = self.clock()
+
+    # Let a handed-off session be restored here again
+    def clear_handoff(self, session_id):
+        with self._lock:
+            self._handed_off.pop(session_id, None)
+
+    # Ids of the sessions held, least recently used first
+    def session_ids(self):
+        with self._lock:
+            return list(self._sessions)
+
+    # Look up a session without creating one or counting a hit/miss
+    def peek(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def discard(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    # Drop idle sessions. Entries are ordered by last use, so we only
+    # ever look at the stale head of the queue.
+    def _expire(self, now):
+        cutoff = now - self.ttl
+        sessions = self._sessions
+        while sessions:
+            session_id, session = next(iter(sessions.items()))
+            if session.last_seen > cutoff:
+                break
+            del sessions[session_id]
+            self.expirations += 1
+        # Handoff marks are kept as long as an idle session would be
+        handed_off = self._handed_off
+        while handed_off:
+            session_id, left = next(iter(handed_off.items()))
+            if left > cutoff:
+                break
+            del handed_off[session_id]
+
+    def expire(self):
+        with self._lock:
+            self._expire(self.clock())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "restored": self.restored
+            }
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
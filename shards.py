@@ -0,0 +1,291 @@
+import multiprocessing
+import threading
+import zlib
+from savegame import header, check_header, record, iter_records, decode, snapshot, restore, SaveError
+from sessions import Session, SessionMoved, new_session_id
+
+# Sessions spread over worker processes so gameplay isn't bound to one core.
+# Each worker owns the sessions whose id hashes to it; the router in the
+# front process sends every request for a session to that worker. A session
+# can be handed to another worker as bytes (its GameState and world overlay
+# in the save encoding), and the router remembers where it went.
+HANDOFF_MAGIC = b"AQHO"
+HANDOFF = ord("H")
+
+# Answer status for a request about a session the worker has handed off
+MOVED = "moved"
+
+# A worker failed to answer, or answered with an error
+class ShardError(Exception):
+    pass
+
+def shard_of(session_id, count):
+    return zlib.crc32(session_id.encode("utf-8")) % count
+
+# A fresh session id that hashes to shard `index`, so sessions a worker
+# creates are already where the router will look for them
+def session_id_for(index, count):
+    while True:
+        session_id = new_session_id()
+        if shard_of(session_id, count) == index:
+            return session_id
+
+# A session as handoff bytes. Snapshots don't hold combat state, so a
+# session in the middle of a fight can't be handed off.
+def pack_session(session):
+    if session.game_state.combat is not None:
+        raise ShardError(f"Session {session.session_id} is in combat")
+    data = header(HANDOFF_MAGIC)
+    data += record(HANDOFF, {"session_id": session.session_id,
+                             "state": snapshot(session.game_state, session.world)})
+    return bytes(data)
+
+# Rebuild a handed-off session; game_state and world must be fresh
+def unpack_session(data, game_state, world):
+    check_header(data, HANDOFF_MAGIC)
+    for kind, payload, end in iter_records(data):
+        if kind == HANDOFF:
+            fields, _ = decode(payload)
+            game_state, world = restore(fields["state"], game_state, world)
+            return Session(fields["session_id"], game_state, world)
+    raise SaveError("Session handoff is damaged")
+
+# Worker process main loop: answer (op, args) requests with (ok, value).
+# setup(index, count) runs in the worker and returns its handlers by op.
+def serve(conn, setup, index, count):
+    handlers = setup(index, count)
+    while True:
+        try:
+            op, args = conn.recv()
+        except EOFError:
+            break
+        if op == "stop":
+            conn.send((True, None))
+            break
+        try:
+            conn.send((True, handlers[op](*args)))
+        except SessionMoved as e:
+            conn.send((MOVED, str(e)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+# Front-process handle on one worker. A worker handles one request at a
+# time, so callers take turns on its pipe.
+class ShardWorker:
+    def __init__(self, context, setup, index, count):
+        self.index = index
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=serve, args=(child, setup, index, count), daemon=True)
+        self.process.start()
+        child.close()
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def call(self, op, *args):
+        with self.lock:
+            try:
+                self.conn.send((op, args))
+                ok, value = self.conn.recv()
+            except (EOFError, OSError) as e:
+                raise ShardError(f"Worker {self.index} is not answering: {e}")
+            self.requests += 1
+        if ok == MOVED:
+            raise SessionMoved(value)
+        if not ok:
+            raise ShardError(value)
+        return value
+
+    def stop(self):
+        try:
+            self.call("stop")
+        except ShardError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+# Routes sessions to worker processes by hash of their id.
+# setup(index, count) is called in each new worker and must return a dict
+# of handlers; the router relies on "export" (session_id -> handoff bytes,
+# or None if the worker doesn't hold it), "import" (handoff bytes) and
+# "sessions" (-> ids held). Workers are forked, so they start with
+# everything the front process loaded, content included.
+class ShardRouter:
+    def __init__(self, setup, workers, context=None, prune_every=10000):
+        self.setup = setup
+        self.context = context if context is not None else multiprocessing.get_context("fork")
+        self.workers = [ShardWorker(self.context, setup, index, workers) for index in range(workers)]
+        self.moved = {}  # session_id -> worker index, for sessions living off their hash shard
+        self.prune_every = prune_every  # requests between checks for moved sessions that have ended
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)  # a move, restart or request finished
+        self._migrate_lock = threading.RLock()  # held while sessions move, moved entries are pruned or a worker restarts
+        self._moving = set()  # sessions being handed between workers
+        self._restarting = set()  # indexes of workers being replaced
+        self._in_flight = {}  # session_id -> requests sent for it and not yet answered
+        self._busy = [0] * workers  # requests in flight per worker
+        self._next_new = 0
+        self._since_prune = 0
+
+    def owner(self, session_id):
+        with self._lock:
+            return self._owner(session_id)
+
+    def _owner(self, session_id):
+        index = self.moved.get(session_id)
+        return index if index is not None else shard_of(session_id, len(self.workers))
+
+    # Send a request about a session to the worker that owns it. Without a
+    # session id the request goes to the next worker in turn, which creates
+    # the session under an id that hashes back to itself. A request for a
+    # session that is moving, or whose worker is restarting, waits for that
+    # to finish, so it always reaches the one worker holding the session.
+    def call(self, session_id, op, *args):
+        with self._lock:
+            self._since_prune += 1
+            prune = self._since_prune >= self.prune_every and bool(self.moved)
+            if prune:
+                self._since_prune = 0
+        if prune:
+            self.prune()
+        while True:
+            index = self._enter(session_id)
+            try:
+                return self.workers[index].call(op, session_id, *args)
+            except SessionMoved:
+                # The worker handed the session off. If it has been routed
+                # back here since (its moved entry was pruned), let the
+                # worker restore it; otherwise ask its new owner.
+                with self._lock:
+                    stale = session_id not in self._moving and self._owner(session_id) == index
+                if stale:
+                    self.workers[index].call("clear_handoff", session_id)
+            finally:
+                self._leave(session_id, index)
+
+    # Pick the worker for a request and count it as in flight
+    def _enter(self, session_id):
+        with self._lock:
+            while True:
+                if session_id:
+                    index = self._owner(session_id)
+                    ready = session_id not in self._moving and index not in self._restarting
+                else:
+                    index = self._next_new
+                    self._next_new = (index + 1) % len(self.workers)
+                    ready = index not in self._restarting
+                if ready:
+                    break
+                # A new session can go to the next worker instead of waiting
+                if session_id or len(self._restarting) == len(self.workers):
+                    self._changed.wait()
+            if session_id:
+                self._in_flight[session_id] = self._in_flight.get(session_id, 0) + 1
+            self._busy[index] += 1
+            return index
+
+    def _leave(self, session_id, index):
+        with self._lock:
+            if session_id:
+                count = self._in_flight.pop(session_id) - 1
+                if count:
+                    self._in_flight[session_id] = count
+            self._busy[index] -= 1
+            self._changed.notify_all()
+
+    # Hand a session to another worker. Returns False if its owner doesn't
+    # hold it (it will be restored from the journal wherever it is routed).
+    # Requests for the session wait while it moves, and the move waits for
+    # the ones already sent, so neither worker sees a request mid-move.
+    def migrate(self, session_id, target):
+        with self._migrate_lock:
+            with self._lock:
+                self._moving.add(session_id)
+                while self._in_flight.get(session_id):
+                    self._changed.wait()
+                source = self._owner(session_id)
+            try:
+                if source == target:
+                    return True
+                data = self.workers[source].call("export", session_id)
+                if data is None:
+                    return False
+                self.workers[target].call("import", data)
+                with self._lock:
+                    if target == shard_of(session_id, len(self.workers)):
+                        self.moved.pop(session_id, None)
+                    else:
+                        self.moved[session_id] = target
+                return True
+            finally:
+                with self._lock:
+                    self._moving.discard(session_id)
+                    self._changed.notify_all()
+
+    # Forget moved sessions their worker no longer holds: ones that quit,
+    # died, expired or were evicted. If such a session comes back, its hash
+    # shard restores it from the journal like any other session it doesn't
+    # hold. Returns how many entries were dropped.
+    def prune(self):
+        with self._migrate_lock:
+            with self._lock:
+                moved = dict(self.moved)
+            held = {}
+            for index in set(moved.values()):
+                try:
+                    held[index] = set(self.workers[index].call("sessions"))
+                except ShardError:
+                    pass
+            gone = [session_id for session_id, index in moved.items()
+                    if index in held and session_id not in held[index]]
+            with self._lock:
+                for session_id in gone:
+                    self.moved.pop(session_id, None)
+            return len(gone)
+
+    # Replace a worker process without losing its sessions: hand them to
+    # the other workers, swap in a fresh process, then hand them back.
+    # Sessions that can't be handed off (mid-fight) are rebuilt from their
+    # journal by the new process on their next request. Requests for the
+    # worker wait from before its sessions are listed until the new process
+    # is up, so none is created or restored on a process about to stop.
+    # Other migrations wait for the whole restart.
+    def restart(self, index):
+        count = len(self.workers)
+        parked = []
+        with self._migrate_lock:
+            with self._lock:
+                self._restarting.add(index)
+                while self._busy[index]:
+                    self._changed.wait()
+            try:
+                session_ids = self.workers[index].call("sessions") if count > 1 else []
+                for n, session_id in enumerate(session_ids):
+                    target = (index + 1 + n % (count - 1)) % count
+                    try:
+                        if self.migrate(session_id, target):
+                            parked.append(session_id)
+                    except ShardError:
+                        pass
+                self.workers[index].stop()
+                self.workers[index] = ShardWorker(self.context, self.setup, index, count)
+            finally:
+                with self._lock:
+                    self._restarting.discard(index)
+                    self._changed.notify_all()
+            for session_id in parked:
+                self.migrate(session_id, index)
+        return len(parked)
+
+    def stats(self):
+        with self._lock:
+            moved = len(self.moved)
+        return {
+            "workers": [dict(self.workers[index].call("stats"), requests=worker.requests, pid=worker.process.pid)
+                        for index, worker in enumerate(self.workers)],
+            "moved_sessions": moved
+        }
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
@@ -0,0 +1,160 @@
+// Lines waiting to be typed out, as {text, delay}: delay is seconds per
+// character, 0 for lines that appear at once
+let pending = [];
+// The line being typed: {element, text, timer}
+let typing = null;
+// Lines kept on screen; older ones are dropped so long sessions stay fast
+const MAX_TRANSCRIPT_LINES = 1000;
+// Open WebSocket to the server, or null while commands go over POST
+let socket = null;
+
+// Keep the session the server gave us. The stored token is only replaced
+// when the server started a new session in place of it (the old one was
+// unknown or had ended), not by whichever answer arrives last.
+function rememberSession(session, created) {
+  if (created || localStorage.getItem("aq_session") === null) {
+    localStorage.setItem("aq_session", session);
+  }
+}
+
+// Keep one channel open for commands and their output. Until it is open
+// (or if the server has no WebSocket support) commands go over POST.
+function connect() {
+  if (!("WebSocket" in window)) return;
+  let url = (location.protocol === "https:" ? "wss://" : "ws://") + location.host + "/ws";
+  let ws = new WebSocket(url);
+  ws.onopen = () => {
+    // The token goes in the first message rather than the URL, which ends
+    // up in server and proxy logs
+    ws.send(JSON.stringify({ session: localStorage.getItem("aq_session") }));
+    socket = ws;
+  };
+  ws.onmessage = (message) => {
+    let event = JSON.parse(message.data);
+    let outputDiv = document.getElementById("game-output");
+    if (event.type === "output") {
+      rememberSession(event.session, event.created);
+      for (let [text, delay] of event.lines) pending.push({ text: text, delay: delay });
+      typeNext(outputDiv);
+    } else if (event.type === "error") {
+      appendLine(outputDiv, event.message).className = "error";
+    }
+  };
+  ws.onclose = () => {
+    // Only reconnect a channel that worked; a server without one refuses it
+    if (socket === ws) {
+      socket = null;
+      setTimeout(connect, 2000);
+    }
+  };
+}
+
+connect();
+
+function sendCommand() {
+  let inputField = document.getElementById("command-input");
+  let outputDiv = document.getElementById("game-output");
+  let command = inputField.value.trim();
+
+  if (command === "") return;
+
+  // A new command skips the rest of the previous answer's animation
+  finishTyping(outputDiv);
+  inputField.value = "";
+  appendLine(outputDiv, "> " + command);
+
+  if (socket !== null) {
+    socket.send(JSON.stringify({ command: command }));
+    return;
+  }
+
+  let headers = { "Content-Type": "application/json", Accept: "text/event-stream" };
+  let session = localStorage.getItem("aq_session");
+  if (session !== null) headers["X-Session-Token"] = session;
+  fetch("/command", {
+    method: "POST",
+    headers: headers,
+    body: JSON.stringify({ command: command }),
+  })
+    .then((response) =>
+      readEvents(response, (event, data) => {
+        if (event === "line") {
+          pending.push(data);
+          typeNext(outputDiv);
+        } else if (event === "done") {
+          rememberSession(data.session, data.created);
+        }
+      })
+    )
+    .catch((error) => console.error("Error:", error));
+}
+
+// Read a server-sent event stream, calling onEvent(name, data) per event
+async function readEvents(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let end;
+    while ((end = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let name = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) name = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      onEvent(name, JSON.parse(data));
+    }
+  }
+}
+
+function appendLine(outputDiv, text) {
+  let p = document.createElement("p");
+  p.textContent = text;
+  outputDiv.appendChild(p);
+  while (outputDiv.childElementCount > MAX_TRANSCRIPT_LINES) {
+    outputDiv.removeChild(outputDiv.firstElementChild);
+  }
+  outputDiv.scrollTop = outputDiv.scrollHeight;
+  return p;
+}
+
+// Type out the next pending line, one character per delay
+function typeNext(outputDiv) {
+  while (typing === null && pending.length > 0) {
+    let line = pending.shift();
+    if (!line.delay || line.text === "") {
+      appendLine(outputDiv, line.text);
+      continue;
+    }
+    let element = appendLine(outputDiv, "");
+    let shown = 0;
+    typing = { element: element, text: line.text, timer: null };
+    typing.timer = setInterval(() => {
+      shown += 1;
+      element.textContent = line.text.slice(0, shown);
+      outputDiv.scrollTop = outputDiv.scrollHeight;
+      if (shown >= line.text.length) {
+        clearInterval(typing.timer);
+        typing = null;
+        typeNext(outputDiv);
+      }
+    }, line.delay * 1000);
+  }
+}
+
+// Show everything still being typed or waiting, without animation
+function finishTyping(outputDiv) {
+  if (typing !== null) {
+    clearInterval(typing.timer);
+    typing.element.textContent = typing.text;
+    typing = null;
+  }
+  for (let line of pending) appendLine(outputDiv, line.text);
+  pending = [];
+}
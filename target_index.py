@@ -0,0 +1,105 @@
+# Lowercase words an entity can be referred to by: its id, its id with spaces,
+# its display name, and every word of those
+def alias_keys(entity_id, name=None):
+    entity_id = entity_id.lower()
+    keys = {entity_id, entity_id.replace("_", " ")}
+    keys.update(entity_id.split("_"))
+    if name:
+        name = name.lower()
+        keys.add(name)
+        keys.update(name.split())
+    return keys
+
+# Maps what a player might type to the entities of one list (a location's
+# items, the player's inventory, ...). Exact names and words resolve with one
+# dict lookup, word prefixes ("pot" -> potion) with another. Anything else
+# falls back to the substring match the game has always done, over
+# precomputed lowercase strings.
+#
+# When several entities match, exact matches beat prefix matches, which beat
+# substring matches, and within a tier the entity that has been in the list
+# longest wins - the same one the old linear scan would have picked.
+class TargetIndex:
+    def __init__(self, entity_ids=(), catalog=None):
+        self.catalog = catalog if catalog is not None else {}
+        self._entries = {}  # entity_id -> [position, count]
+        self._exact = {}  # alias -> set of entity_ids
+        self._prefix = {}  # word prefix -> set of entity_ids
+        self._search = {}  # entity_id -> (lowercase id, lowercase name)
+        self._next_position = 0
+        for entity_id in entity_ids:
+            self.add(entity_id)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, entity_id):
+        return entity_id in self._entries
+
+    def add(self, entity_id):
+        entry = self._entries.get(entity_id)
+        if entry is not None:
+            entry[1] += 1
+            return
+        self._entries[entity_id] = [self._next_position, 1]
+        self._next_position += 1
+
+        entity = self.catalog.get(entity_id)
+        name = entity.name if entity is not None else None
+        keys = alias_keys(entity_id, name)
+        for key in keys:
+            self._exact.setdefault(key, set()).add(entity_id)
+        for prefix in _prefixes(keys):
+            self._prefix.setdefault(prefix, set()).add(entity_id)
+        self._search[entity_id] = (entity_id.lower(), name.lower() if name else "")
+
+    def remove(self, entity_id):
+        entry = self._entries.get(entity_id)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del self._entries[entity_id]
+        del self._search[entity_id]
+
+        entity = self.catalog.get(entity_id)
+        keys = alias_keys(entity_id, entity.name if entity is not None else None)
+        for key in keys:
+            _discard(self._exact, key, entity_id)
+        for prefix in _prefixes(keys):
+            _discard(self._prefix, prefix, entity_id)
+
+    # The entity id target refers to, or None
+    def resolve(self, target):
+        target = target.strip().lower()
+        if not target:
+            # An empty target matches anything, like it always has.
+            # Entries are kept in position order, so that is the first one.
+            return next(iter(self._entries), None)
+        matches = self._exact.get(target) or self._prefix.get(target)
+        if matches:
+            return self._first(matches)
+        # _search is in position order too, so the first hit is the oldest
+        for entity_id, (lower_id, lower_name) in self._search.items():
+            if target in lower_id or target in lower_name:
+                return entity_id
+        return None
+
+    def _first(self, entity_ids):
+        entries = self._entries
+        return min(entity_ids, key=lambda entity_id: entries[entity_id][0], default=None)
+
+def _prefixes(keys):
+    prefixes = set()
+    for key in keys:
+        for end in range(1, len(key)):
+            prefixes.add(key[:end])
+    return prefixes
+
+def _discard(index, key, entity_id):
+    ids = index.get(key)
+    if ids is not None:
+        ids.discard(entity_id)
+        if not ids:
+            del index[key]
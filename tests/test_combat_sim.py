@@ -0,0 +1,63 @@
+import random
+import pytest
+import combat_engine
+from game_logic import create_game_items, create_game_enemies
+
+np = pytest.importorskip("numpy")
+import combat_sim
+
+FIGHTS = 4000
+
+# Fight with the engine, one step at a time, choosing actions the way a
+# combat_sim Policy does
+def engine_fights(state, policy, rng, fights):
+    outcomes = {combat_engine.VICTORY: 0, combat_engine.DEFEAT: 0, combat_engine.FLED: 0}
+    turns = []
+    for _ in range(fights):
+        fight = state.copy()
+        fight.player_status = dict(state.player_status)
+        fight.enemy_status = dict(state.enemy_status)
+        while fight.outcome is None:
+            draw = rng.random()
+            if fight.player_health < policy.flee_below * fight.player_max_health:
+                action = combat_engine.FLEE
+            elif draw < policy.special_rate:
+                action = combat_engine.SPECIAL
+            elif draw < policy.special_rate + policy.defend_rate:
+                action = combat_engine.DEFEND
+            else:
+                action = combat_engine.ATTACK
+            fight, events = combat_engine.step(fight, action, rng)
+        outcomes[fight.outcome] += 1
+        if fight.outcome == combat_engine.VICTORY:
+            turns.append(fight.turn)
+    return outcomes, turns
+
+# The simulator is a vectorised copy of the engine's rules, so the same
+# policy has to give the same win and flee rates and fight lengths, within
+# sampling error. The matchups are ones the player often loses or flees.
+@pytest.mark.parametrize("weapon, armor, enemy_id", [
+    (None, None, "bandit"),
+    ("rusty_sword", None, "castle_guard"),
+    ("rusty_sword", "leather_armor", "skeleton_mage")
+])
+@pytest.mark.parametrize("policy", [combat_sim.Policy(), combat_sim.Policy(0.3, 0.3, 0.3)],
+                         ids=["attack only", "mixed"])
+def test_simulator_agrees_with_engine(weapon, armor, enemy_id, policy):
+    items = create_game_items()
+    enemy = create_game_enemies()[enemy_id]
+    player = {"health": 100, "max_health": 100, "equipped_weapon": weapon, "equipped_armor": armor,
+              "inventory": {}}
+    state = combat_engine.new_combat(player, enemy_id, enemy, items)
+
+    outcomes, turns = engine_fights(state, policy, random.Random(1), FIGHTS)
+    n = 4 * FIGHTS
+    summary = combat_sim.summarize(*combat_sim.simulate(
+        np.full(n, state.weapon_damage), np.full(n, state.armor), np.full(n, enemy.health),
+        np.full(n, enemy.damage), policy, np.random.default_rng(1)))
+
+    assert summary["timeout_rate"] == 0
+    assert summary["win_rate"] == pytest.approx(outcomes[combat_engine.VICTORY] / FIGHTS, abs=0.035)
+    assert summary["flee_rate"] == pytest.approx(outcomes[combat_engine.FLED] / FIGHTS, abs=0.035)
+    if len(turns) >= 100:
+        assert summary["turns_to_kill"]["mean"] == pytest.approx(sum(turns) / len(turns), rel=0.05, abs=0.2)
@@ -0,0 +1,83 @@
+import random
+import pytest
+from game_logic import (GameState, start_game_state, play_command, capture_output, NullSink,
+                        create_game_world, create_game_items, create_game_npcs, create_game_enemies)
+from journal import CommandJournal
+from savegame import snapshot
+from sessions import Session
+from world_overlay import FrozenWorld, WorldOverlay
+
+# A walk with a fight in it, so replay has to reproduce combat rolls and
+# the loot and quest progress that follow from them
+SCRIPT = ["look", "go blacksmith", "take iron sword", "equip iron sword", "go village", "go forest_path",
+          "attack wolf", "1", "2", "1", "3", "1", "1", "1", "1", "1", "1", "1", "1",
+          "go village", "travel forest_path", "inventory", "go forest_clearing", "go hermit_hut",
+          "take ancient amulet"]
+
+@pytest.fixture(scope="module")
+def content():
+    return FrozenWorld(create_game_world()), create_game_items(), create_game_npcs(), create_game_enemies()
+
+def run(content):
+    base_world, items, npcs, enemies = content
+    return lambda command, game_state, world: play_command(command, game_state, world, items, npcs, enemies)
+
+# Everything replay has to get right: the save fields, plus a fight in
+# progress, which snapshots don't hold
+def state_of(session):
+    combat = session.game_state.combat
+    fight = None if combat is None else {field: getattr(combat, field) for field in type(combat).__slots__}
+    return snapshot(session.game_state, session.world), fight
+
+# Play the script the way the server does: a fresh seed per command, then
+# the command is journaled. The seeds are fixed so the fight always ends
+# within the script. After every command the session rebuilt from
+# the journal must match the live one.
+@pytest.mark.parametrize("snapshot_every", [100, 4])
+def test_replay_matches_live_play(tmp_path, content, snapshot_every):
+    journal = CommandJournal(str(tmp_path), snapshot_every=snapshot_every)
+    live = Session("player", start_game_state("Tester"), WorldOverlay(content[0]))
+    journal.snapshot(live)
+    play = run(content)
+    seeds = random.Random(7)
+
+    fought = False
+    for command in SCRIPT:
+        seed = seeds.getrandbits(64)
+        live.game_state.rng_seed = seed
+        with capture_output(NullSink()):
+            play(command, live.game_state, live.world)
+        journal.append(live, command, seed)
+        fought = fought or live.game_state.combat is not None
+
+        replayed = Session("player", GameState(), WorldOverlay(content[0]))
+        assert journal.load(replayed, play)
+        assert state_of(replayed) == state_of(live), command
+        assert replayed.journal_length == live.journal_length
+    assert fought
+    assert live.game_state.enemies_defeated == 1
+
+def test_torn_tail_is_dropped(tmp_path, content):
+    journal = CommandJournal(str(tmp_path))
+    live = Session("player", start_game_state("Tester"), WorldOverlay(content[0]))
+    journal.snapshot(live)
+    play = run(content)
+    for command in SCRIPT[:4]:
+        seed = journal.new_seed()
+        live.game_state.rng_seed = seed
+        with capture_output(NullSink()):
+            play(command, live.game_state, live.world)
+        journal.append(live, command, seed)
+    with open(journal.path("player"), "ab") as f:
+        f.write(b"C\x20torn")
+
+    replayed = Session("player", GameState(), WorldOverlay(content[0]))
+    assert journal.load(replayed, play)
+    assert state_of(replayed) == state_of(live)
+    assert replayed.journal_length == 4
+
+def test_unknown_sessions_have_no_journal(tmp_path, content):
+    journal = CommandJournal(str(tmp_path))
+    session = Session("nobody", GameState(), WorldOverlay(content[0]))
+    assert not journal.load(session, run(content))
+    assert not journal.load(Session("../etc/passwd", GameState(), WorldOverlay(content[0])), run(content))
@@ -0,0 +1,105 @@
+import pytest
+from game_logic import (start_game_state, play_command, capture_output, NullSink, GameState,
+                        create_game_world, create_game_items, create_game_npcs, create_game_enemies)
+from savegame import SaveFile, SaveError, encode, decode, snapshot, read_records
+from world_overlay import FrozenWorld, WorldOverlay
+
+# Commands that change most of what a save holds: moves, items taken and
+# equipped, a key and the gate it opens
+SCRIPT = ["go blacksmith", "take iron sword", "take leather armor", "equip iron sword", "equip leather armor",
+          "go village", "go village_square", "go east_road", "go abandoned_mines", "take mine key",
+          "go mine_depths", "look", "inventory"]
+
+@pytest.fixture(scope="module")
+def content():
+    return FrozenWorld(create_game_world()), create_game_items(), create_game_npcs(), create_game_enemies()
+
+def new_game(content):
+    return start_game_state("Tester"), WorldOverlay(content[0])
+
+def play(command, game_state, world, content):
+    base_world, items, npcs, enemies = content
+    game_state.rng_seed = 1
+    with capture_output(NullSink()):
+        play_command(command, game_state, world, items, npcs, enemies)
+
+@pytest.mark.parametrize("value", [
+    None, True, False, 0, 1, -1, 63, 64, -65, 2 ** 70, -(2 ** 70), "", "hello", "héllo ✓",
+    [], [1, "two", None], {}, {"a": [1, {"b": False}], "c": -3}
+])
+def test_encode_round_trip(value):
+    data = encode(value)
+    decoded, end = decode(data)
+    assert decoded == value
+    assert end == len(data)
+
+def test_encode_rejects_unknown_types():
+    with pytest.raises(SaveError):
+        encode(1.5)
+
+def test_save_and_load_round_trip(tmp_path, content):
+    game_state, world = new_game(content)
+    save = SaveFile(str(tmp_path / "slot.sav"))
+    for command in SCRIPT:
+        play(command, game_state, world, content)
+        save.save(game_state, world)
+
+    loaded_state, loaded_world = SaveFile(save.path).load(GameState(), WorldOverlay(content[0]))
+    assert snapshot(loaded_state, loaded_world) == snapshot(game_state, world)
+    assert loaded_world.removed == world.removed
+
+def test_saves_after_the_first_are_deltas(tmp_path, content):
+    game_state, world = new_game(content)
+    save = SaveFile(str(tmp_path / "slot.sav"))
+    save.save(game_state, world)
+    size = (tmp_path / "slot.sav").stat().st_size
+    for command in SCRIPT:
+        play(command, game_state, world, content)
+        save.save(game_state, world)
+
+    with open(save.path, "rb") as f:
+        fields, deltas, end = read_records(f.read())
+    assert deltas > 0
+    assert fields == snapshot(game_state, world)
+    # Each delta is much smaller than the snapshot it applies to
+    assert end - size < deltas * size / 2
+
+def test_compaction_rewrites_a_snapshot(tmp_path, content):
+    game_state, world = new_game(content)
+    save = SaveFile(str(tmp_path / "slot.sav"), compact_every=3)
+    for command in SCRIPT:
+        play(command, game_state, world, content)
+        save.save(game_state, world)
+
+    with open(save.path, "rb") as f:
+        fields, deltas, end = read_records(f.read())
+    assert deltas <= 3
+    assert fields == snapshot(game_state, world)
+
+def test_load_drops_a_torn_delta(tmp_path, content):
+    game_state, world = new_game(content)
+    save = SaveFile(str(tmp_path / "slot.sav"))
+    for command in SCRIPT[:3]:
+        play(command, game_state, world, content)
+        save.save(game_state, world)
+    expected = snapshot(game_state, world)
+    intact = (tmp_path / "slot.sav").stat().st_size
+    with open(save.path, "ab") as f:
+        f.write(b"D\x40partial")
+
+    resumed = SaveFile(save.path)
+    loaded_state, loaded_world = resumed.load(GameState(), WorldOverlay(content[0]))
+    assert snapshot(loaded_state, loaded_world) == expected
+    assert (tmp_path / "slot.sav").stat().st_size == intact
+
+    # Saving after the load appends behind the intact part
+    play(SCRIPT[3], loaded_state, loaded_world, content)
+    resumed.save(loaded_state, loaded_world)
+    reloaded = SaveFile(save.path).load(GameState(), WorldOverlay(content[0]))
+    assert snapshot(*reloaded) == snapshot(loaded_state, loaded_world)
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.sav"
+    path.write_bytes(b"not a save file")
+    with pytest.raises(SaveError):
+        SaveFile(str(path)).load(GameState(), None)
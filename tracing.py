@@ -0,0 +1,166 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+import combat_engine
+import game_logic
+
+# Optional span tracing of player turns. enable() wraps the engine's main
+# functions so each command records nested spans (command -> handler ->
+# combat -> defeat handling -> quest updates) with their timings and a few
+# attributes, and writes sampled traces to a file in the Chrome trace event
+# format, which chrome://tracing, Perfetto and speedscope open as flame
+# graphs. Until enable() is called nothing is wrapped, so tracing that is
+# off costs nothing at all.
+
+# Spans of the trace being recorded in this context: a list, UNSAMPLED for
+# a command that wasn't picked, or None outside any traced command
+_trace = contextvars.ContextVar("trace", default=None)
+UNSAMPLED = ()
+
+def _combat_enemy(game_state):
+    return game_state.combat.enemy_id if game_state.combat is not None else None
+
+# Functions to wrap, as (module, name, attributes), where attributes takes
+# the function's arguments and returns the span's attributes
+TARGETS = [
+    (game_logic, "play_command", lambda command, game_state, *rest: {
+        "verb": game_logic.command_verb(command, game_state), "location": game_state.current_location}),
+    (game_logic, "process_command", lambda command, game_state, *rest: {
+        "command": command, "location": game_state.current_location}),
+    (game_logic, "combat_command", lambda command, game_state, *rest: {
+        "action": command, "enemy_id": _combat_enemy(game_state)}),
+    (game_logic, "enhanced_combat", lambda game_state, enemy, world, enemy_id, items: {"enemy_id": enemy_id}),
+    (game_logic, "handle_enemy_defeat", lambda game_state, enemy, world, enemy_id, items: {
+        "enemy_id": enemy_id, "location": game_state.current_location}),
+    (game_logic, "display_location", lambda game_state, *rest: {"location": game_state.current_location}),
+    (game_logic, "run_timers", lambda game_state, world: {"game_time": game_state.game_time}),
+    (game_logic, "publish", lambda game_state, event, key: {"event": event, "key": key}),
+    (game_logic, "update_quests", lambda game_state, quest_id, objective: {
+        "quest_id": quest_id, "objective": objective}),
+    (combat_engine, "step", lambda state, action, rng: {"enemy_id": state.enemy_id, "turn": state.turn})
+]
+
+# Writes finished traces to a file as a JSON array of trace events. The
+# closing bracket is optional in that format, so events are appended as
+# they come and the file can be opened at any point.
+class TraceWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self.traces = 0
+
+    def write(self, spans):
+        pid = os.getpid()
+        tid = threading.get_ident()
+        lines = []
+        for name, start, end, attributes in spans:
+            event = {"name": name, "cat": "game", "ph": "X", "ts": start / 1000, "dur": (end - start) / 1000,
+                     "pid": pid, "tid": tid}
+            if attributes:
+                event["args"] = attributes
+            lines.append(json.dumps(event, default=str) + ",\n")
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+                if self._file.tell() == 0:
+                    self._file.write("[\n")
+            self._file.write("".join(lines))
+            self._file.flush()
+            self.traces += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+# The active tracer, if any
+_tracer = None
+
+class Tracer:
+    def __init__(self, writer, sample_rate=1.0, min_duration_ms=0.0, rng=random.random):
+        self.writer = writer
+        self.sample_rate = sample_rate  # share of commands traced
+        self.min_duration_ns = int(min_duration_ms * 1e6)  # only keep traces at least this slow
+        self.rng = rng
+        self.originals = []  # (owner, name, original) for everything wrapped
+
+    # Wrap function so each call records a span. The outermost traced call
+    # in a context starts a trace, decides whether it is sampled and writes
+    # it out when it returns.
+    def wrap(self, name, function, attributes):
+        @functools.wraps(function)
+        def traced(*args, **kwargs):
+            trace = _trace.get()
+            if trace is UNSAMPLED:
+                return function(*args, **kwargs)
+            root = trace is None
+            if root:
+                if self.rng() >= self.sample_rate:
+                    token = _trace.set(UNSAMPLED)
+                    try:
+                        return function(*args, **kwargs)
+                    finally:
+                        _trace.reset(token)
+                trace = []
+                token = _trace.set(trace)
+            span_attributes = attributes(*args, **kwargs) if attributes else None
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = time.perf_counter_ns()
+                trace.append((name, start, end, span_attributes))
+                if root:
+                    _trace.reset(token)
+                    if end - start >= self.min_duration_ns:
+                        self.writer.write(trace)
+        traced.untraced = function
+        return traced
+
+    def _replace(self, owner, name, wrapped, original):
+        self.originals.append((owner, name, original))
+        if isinstance(owner, dict):
+            owner[name] = wrapped
+        else:
+            setattr(owner, name, wrapped)
+
+    def install(self):
+        for module, name, attributes in TARGETS:
+            original = getattr(module, name)
+            self._replace(module, name, self.wrap(name, original, attributes), original)
+        # Commands and timers are called through their registries
+        for verb, handler in list(game_logic.COMMANDS.handlers.items()):
+            self._replace(game_logic.COMMANDS.handlers, verb, self.wrap(handler.__name__, handler, None), handler)
+        for kind, handler in list(game_logic.TIMERS.items()):
+            self._replace(game_logic.TIMERS, kind, self.wrap(handler.__name__, handler, None), handler)
+
+    def uninstall(self):
+        for owner, name, original in reversed(self.originals):
+            if isinstance(owner, dict):
+                owner[name] = original
+            else:
+                setattr(owner, name, original)
+        self.originals = []
+
+# Start tracing commands into path. sample_rate is the share of commands
+# traced; with min_duration_ms set, only traces at least that slow are kept.
+def enable(path, sample_rate=1.0, min_duration_ms=0.0):
+    global _tracer
+    disable()
+    _tracer = Tracer(TraceWriter(path), sample_rate, min_duration_ms)
+    _tracer.install()
+    return _tracer
+
+# Put the untraced functions back
+def disable():
+    global _tracer
+    if _tracer is not None:
+        _tracer.uninstall()
+        _tracer.writer.close()
+        _tracer = None
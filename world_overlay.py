@@ -0,0 +1,128 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+from target_index import TargetIndex
+
+# Make a location read-only: lists become tuples, the dict becomes a proxy
+def freeze_location(location):
+    return MappingProxyType({
+        key: tuple(value) if isinstance(value, list) else value
+        for key, value in location.items()
+    })
+
+# Immutable world built once and shared by every session
+class FrozenWorld(Mapping):
+    def __init__(self, world):
+        self._locations = {location_id: freeze_location(location) for location_id, location in world.items()}
+        self.derived = {}  # caches computed from the base world, shared by all overlays
+
+    def __getitem__(self, location_id):
+        return self._locations[location_id]
+
+    def __contains__(self, location_id):
+        return location_id in self._locations
+
+    def __iter__(self):
+        return iter(self._locations)
+
+    def __len__(self):
+        return len(self._locations)
+
+# A player's view of a shared FrozenWorld. Only the changes are stored:
+# ids removed from a location's lists and gates that have been unlocked.
+# Locations the player never touched are read straight from the base.
+class WorldOverlay(Mapping):
+    __slots__ = ("base", "removed", "unlocked", "mutations", "_views", "_indexes")
+    
+    def __init__(self, base):
+        self.base = base
+        self.removed = {}  # location_id -> {key: [removed ids]}
+        self.unlocked = set()  # location_ids whose requires_item gate is open
+        self.mutations = 0
+        self._views = {}  # location_id -> merged location for changed locations
+        self._indexes = {}  # (location_id, key) -> TargetIndex for changed locations
+
+    def __getitem__(self, location_id):
+        view = self._views.get(location_id)
+        if view is not None:
+            return view
+        return self.base[location_id]
+
+    def __contains__(self, location_id):
+        return location_id in self.base
+
+    def __iter__(self):
+        return iter(self.base)
+
+    def __len__(self):
+        return len(self.base)
+
+    # Take one id out of a location list (an item picked up, an enemy defeated)
+    def remove(self, location_id, key, entry_id):
+        view = self._edit(location_id)
+        entries = list(view[key])
+        entries.remove(entry_id)
+        view[key] = tuple(entries)
+        index = self._indexes.get((location_id, key))
+        if index is not None:
+            index.remove(entry_id)
+        self.removed.setdefault(location_id, {}).setdefault(key, []).append(entry_id)
+        self.mutations += 1
+
+    # Put a removed id back (an enemy respawning)
+    def restore(self, location_id, key, entry_id):
+        removed = self.removed.get(location_id, {}).get(key)
+        if not removed or entry_id not in removed:
+            return
+        removed.remove(entry_id)
+        view = self._edit(location_id)
+        view[key] = view[key] + (entry_id,)
+        index = self._indexes.get((location_id, key))
+        if index is not None:
+            index.add(entry_id)
+        self.mutations += 1
+
+    # Open a requires_item gate for good
+    def unlock(self, location_id):
+        if location_id in self.unlocked or "requires_item" not in self[location_id]:
+            return
+        view = self._edit(location_id)
+        del view["requires_item"]
+        self.unlocked.add(location_id)
+        self.mutations += 1
+
+    # Target index over one list of a location. Untouched locations share the
+    # base world's index; changed ones get their own, kept up to date by remove().
+    def index(self, location_id, key, catalog):
+        if location_id in self._views:
+            cache = self._indexes
+        else:
+            cache = self.base.derived.setdefault("targets", {})
+        index = cache.get((location_id, key))
+        if index is None:
+            index = TargetIndex(self[location_id][key], catalog)
+            cache[(location_id, key)] = index
+        return index
+
+    def _edit(self, location_id):
+        view = self._views.get(location_id)
+        if view is None:
+            view = dict(self.base[location_id])
+            self._views[location_id] = view
+        return view
+
+    # Deltas in a plain form suitable for saving
+    def deltas(self):
+        return {
+            "removed": {location_id: {key: list(ids) for key, ids in keys.items()}
+                        for location_id, keys in self.removed.items()},
+            "unlocked": sorted(self.unlocked)
+        }
+
+    # Replay saved deltas onto a fresh overlay
+    def apply_deltas(self, deltas):
+        for location_id, keys in deltas.get("removed", {}).items():
+            for key, ids in keys.items():
+                for entry_id in ids:
+                    self.remove(location_id, key, entry_id)
+        for location_id in deltas.get("unlocked", []):
+            self.unlock(location_id)
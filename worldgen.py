@@ -0,0 +1,97 @@
+import argparse
+import json
+import random
+from game_logic import create_game_items, create_game_npcs, create_game_enemies
+
+# Seeded procedural worlds in the same schema as create_game_world, for
+# testing the engine at sizes the hand-written world never reaches.
+#
+# Locations are added one at a time, each connected to an earlier location
+# close to it in creation order, so the world is one connected piece with
+# local structure. Extra connections, mostly local and occasionally long
+# range, then raise the average number of exits to `branching`. A share
+# `gate_density` of locations require a key item to enter, and every key
+# used as a gate is placed in some location that needs no key.
+# Connections always go both ways.
+
+ADJECTIVES = ("Misty", "Silent", "Crooked", "Sunken", "Golden", "Ashen", "Frozen", "Verdant",
+              "Hollow", "Broken", "Whispering", "Ancient", "Shadowed", "Windswept", "Quiet", "Burning")
+PLACES = (("Glade", "A sunlit glade ringed by tall trees."),
+          ("Hollow", "A damp hollow where the air hangs still."),
+          ("Crossing", "A ford where an old road crosses a stream."),
+          ("Ruins", "Tumbled stones from a forgotten age."),
+          ("Outpost", "An abandoned outpost, its palisade half rotten."),
+          ("Cavern", "A cold cavern echoing with dripping water."),
+          ("Meadow", "A wide meadow of tall grass and wildflowers."),
+          ("Ridge", "A rocky ridge with a view over the valley."),
+          ("Hamlet", "A handful of cottages huddled together."),
+          ("Marsh", "Sucking mud and reeds as far as the eye can see."))
+
+# How far back in creation order a location looks for its neighbours
+LOCALITY = 64
+
+def generate_world(size, seed=None, branching=3.0, gate_density=0.02, enemy_rate=0.3,
+                   npc_rate=0.1, item_rate=0.2):
+    rng = random.Random(seed)
+    items = create_game_items()
+    npc_ids = list(create_game_npcs())
+    enemy_ids = list(create_game_enemies())
+    loot_ids = [item_id for item_id, item in items.items() if item.item_type != "key_item"]
+    key_ids = [item_id for item_id, item in items.items() if item.item_type == "key_item"]
+
+    ids = ["village"] + [f"loc_{n}" for n in range(1, size)]
+    connections = [[] for _ in range(size)]
+
+    def connect(a, b):
+        if a != b and b not in connections[a]:
+            connections[a].append(b)
+            connections[b].append(a)
+
+    # A spanning tree with local structure keeps everything reachable
+    for n in range(1, size):
+        connect(n, rng.randrange(max(0, n - LOCALITY), n))
+
+    # Extra connections up to the requested average number of exits
+    extra = max(0, int(size * (branching - 2) / 2))
+    for _ in range(extra):
+        a = rng.randrange(size)
+        if rng.random() < 0.9:
+            b = min(size - 1, max(0, a + rng.randint(-LOCALITY, LOCALITY)))
+        else:
+            b = rng.randrange(size)
+        connect(a, b)
+
+    world = {}
+    for n, location_id in enumerate(ids):
+        place, description = PLACES[rng.randrange(len(PLACES))]
+        location = {
+            "name": f"{ADJECTIVES[rng.randrange(len(ADJECTIVES))]} {place} {n}",
+            "description": description,
+            "connections": [ids[c] for c in connections[n]],
+            "enemies": [rng.choice(enemy_ids)] if n and rng.random() < enemy_rate else [],
+            "npcs": [rng.choice(npc_ids)] if rng.random() < npc_rate else [],
+            "items": [rng.choice(loot_ids)] if rng.random() < item_rate else []
+        }
+        if n and key_ids and rng.random() < gate_density:
+            location["requires_item"] = rng.choice(key_ids)
+        world[location_id] = location
+
+    # Hide every key that gates something in an ungated location
+    gates = {location["requires_item"] for location in world.values() if "requires_item" in location}
+    open_ids = [location_id for location_id, location in world.items() if "requires_item" not in location]
+    for key_id in sorted(gates):
+        world[rng.choice(open_ids)]["items"].append(key_id)
+    return world
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a random world and print it as JSON")
+    parser.add_argument("size", type=int, help="number of locations")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--branching", type=float, default=3.0, help="average exits per location")
+    parser.add_argument("--gate-density", type=float, default=0.02, help="share of locations needing a key")
+    args = parser.parse_args()
+    world = generate_world(args.size, args.seed, args.branching, args.gate_density)
+    print(json.dumps(world, indent=1))
+
+if __name__ == "__main__":
+    main()